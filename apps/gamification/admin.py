@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.gamification.models import UserProfile, TrashReport, ReportComment, Badge
+from apps.gamification.models import UserProfile, TrashReport, ReportComment, Badge, HeatmapCell
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -34,3 +34,10 @@ class BadgeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description', 'category')
     list_filter = ('category',)
     ordering = ('points_required',)
+
+@admin.register(HeatmapCell)
+class HeatmapCellAdmin(admin.ModelAdmin):
+    list_display = ('cell_x', 'cell_y', 'date', 'reports', 'weight')
+    list_filter = ('date',)
+    ordering = ('-date', '-weight')
+    readonly_fields = ('cell_x', 'cell_y', 'date', 'reports', 'weight')
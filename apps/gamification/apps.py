@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class GamificationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.gamification'
+
+    def ready(self):
+        from apps.gamification import signals
+
+        post_migrate.connect(signals.create_search_index, sender=self)
@@ -0,0 +1,358 @@
+"""
+Hierarchical clusters of open reports for the map, one index per process,
+updated incrementally from report changes and tombstones.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+
+from apps.gamification.models import ReportTombstone, TrashReport
+
+CLUSTERS_VERSION_KEY = 'gamification:clusters_version'
+DEFAULT_STATUSES = ('pending', 'in_review', 'verified')
+SEVERITIES = [value for value, _ in TrashReport.SEVERITY_CHOICES]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def bump_clusters_version():
+    cache.set(CLUSTERS_VERSION_KEY, uuid4().hex, None)
+
+
+def project(lats, lngs) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator coordinates in [0, 1] (x grows east, y grows south)."""
+    sin = np.sin(np.radians(np.asarray(lats, dtype=np.float64)))
+    x = np.asarray(lngs, dtype=np.float64) / 360 + 0.5
+    with np.errstate(divide='ignore'):
+        y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / np.pi
+    return x, np.clip(y, 0, 1)
+
+
+def unproject(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    lngs = (np.asarray(x) - 0.5) * 360
+    lats = np.degrees(2 * np.arctan(np.exp((180 - np.asarray(y) * 360) * np.pi / 180)) - np.pi / 2)
+    return lats, lngs
+
+
+class _Level:
+    """Clusters of one zoom level, in arrays that grow by doubling."""
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        self.sum_x = np.zeros(capacity)
+        self.sum_y = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.histogram = np.zeros((capacity, len(SEVERITIES)), dtype=np.int64)
+        # Con un solo reporte en el grupo, la suma de ids es su id
+        self.id_sum = np.zeros(capacity, dtype=np.int64)
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, sum_x, sum_y, count, histogram, id_sum):
+        level = cls(max(len(count), 16))
+        level.size = len(count)
+        level.sum_x[:level.size] = sum_x
+        level.sum_y[:level.size] = sum_y
+        level.count[:level.size] = count
+        level.histogram[:level.size] = histogram
+        level.id_sum[:level.size] = id_sum
+        return level
+
+    def append(self) -> int:
+        if self.size == len(self.count):
+            capacity = 2 * len(self.count)
+            for name in ('sum_x', 'sum_y', 'count', 'id_sum'):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+            self.histogram = np.concatenate([self.histogram, np.zeros_like(self.histogram)])
+            self.parent = np.concatenate([self.parent, np.full(capacity - len(self.parent), -1, dtype=np.int64)])
+        self.size += 1
+        return self.size - 1
+
+    def change(self, index, x, y, severity, report_id, sign):
+        self.sum_x[index] += sign * x
+        self.sum_y[index] += sign * y
+        self.count[index] += sign
+        self.histogram[index, severity] += sign
+        self.id_sum[index] += sign * report_id
+
+    def centroids(self):
+        count = np.maximum(self.count[:self.size], 1)
+        return self.sum_x[:self.size] / count, self.sum_y[:self.size] / count
+
+    def nearest_within(self, x, y, radius) -> Optional[int]:
+        if not self.size:
+            return None
+        cx, cy = self.centroids()
+        distances = (cx - x) ** 2 + (cy - y) ** 2
+        distances[self.count[:self.size] == 0] = np.inf
+        index = int(np.argmin(distances))
+        return index if distances[index] <= radius ** 2 else None
+
+
+def greedy_clusters(x, y, radius) -> np.ndarray:
+    """Cluster id of each element: in order, every free element seeds a cluster with the free ones within ``radius``."""
+    from scipy.spatial import cKDTree
+
+    size = len(x)
+    assigned = np.full(size, -1, dtype=np.int64)
+    if not size:
+        return assigned
+    points = np.column_stack((x, y))
+    tree = cKDTree(points)
+    # Un elemento sin vecinos no puede ser absorbido por nadie: grupo propio sin recorrerlo
+    lonely = tree.query_ball_point(points, radius, return_length=True) == 1
+    next_id = 0
+    for seed in range(size):
+        if assigned[seed] >= 0:
+            continue
+        if lonely[seed]:
+            assigned[seed] = next_id
+        else:
+            members = np.asarray(tree.query_ball_point(points[seed], radius), dtype=np.int64)
+            assigned[members[assigned[members] < 0]] = next_id
+        next_id += 1
+    return assigned
+
+
+class ReportClusterIndex:
+    # Algoritmo de supercluster: desde leaf_zoom hacia min_zoom, cada nivel agrupa
+    # de forma voraz los grupos del nivel siguiente a menos de REPORT_CLUSTERS_RADIUS
+    # píxeles de una semilla. Los grupos guardan sumas (coordenadas, recuento,
+    # histograma, ids) y no valores derivados, así que un reporte se añade o se
+    # quita recorriendo su cadena de padres sin reconstruir el índice.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levels: List[_Level] = []
+        self._leaves: Dict[int, Tuple[float, float, int, int]] = {}  # id -> (x, y, severidad, posición en leaf_zoom)
+        self._version = None
+        self._built_at = 0.0
+        self._changes = 0
+        self._cursor = (None, 0)
+        self._last_tombstone = 0
+
+    @property
+    def min_zoom(self):
+        return _setting('REPORT_CLUSTERS_MIN_ZOOM', 0)
+
+    @property
+    def max_zoom(self):
+        return _setting('REPORT_CLUSTERS_MAX_ZOOM', 16)
+
+    @property
+    def statuses(self):
+        return _setting('REPORT_CLUSTERS_STATUSES', DEFAULT_STATUSES)
+
+    @property
+    def leaf_zoom(self):
+        """Level of the individual reports, one per cluster, just above ``max_zoom``."""
+        return self.max_zoom + 1
+
+    def radius(self, zoom) -> float:
+        """Clustering radius for ``zoom``, in projected map units."""
+        return _setting('REPORT_CLUSTERS_RADIUS', 40) / (_setting('REPORT_CLUSTERS_EXTENT', 512) * 2 ** zoom)
+
+    def level(self, zoom) -> _Level:
+        return self._levels[zoom - self.min_zoom]
+
+    # Construcción
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        version = cache.get(CLUSTERS_VERSION_KEY)
+        if version is None:
+            version = uuid4().hex
+            cache.add(CLUSTERS_VERSION_KEY, version, None)
+            version = cache.get(CLUSTERS_VERSION_KEY, version)
+        # El cursor se toma antes de leer: lo que cambie entremedias se vuelve a aplicar, sin efecto
+        cursor = TrashReport.objects.order_by('-updated_at', '-id').values_list('updated_at', 'id').first() or (None, 0)
+        last_tombstone = ReportTombstone.objects.aggregate(last=Max('id'))['last'] or 0
+
+        rows = TrashReport.objects.filter(status__in=self.statuses).order_by('id').values_list(
+            'id', 'latitude', 'longitude', 'severity'
+        )
+        rows = [row for row in rows if row[3] in SEVERITIES]
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        x, y = project([float(row[1]) for row in rows], [float(row[2]) for row in rows])
+        severities = np.array([SEVERITIES.index(row[3]) for row in rows], dtype=np.int64)
+
+        # Cada reporte entra como un elemento de peso 1
+        sum_x, sum_y, count = x, y, np.ones(len(ids), dtype=np.int64)
+        histogram = np.zeros((len(ids), len(SEVERITIES)), dtype=np.int64)
+        histogram[np.arange(len(ids)), severities] = 1
+        id_sum = ids
+        levels = []
+        child = None
+        for zoom in range(self.leaf_zoom, self.min_zoom - 1, -1):
+            if zoom == self.leaf_zoom:
+                assigned = np.arange(len(ids), dtype=np.int64)
+            else:
+                assigned = greedy_clusters(sum_x / count, sum_y / count, self.radius(zoom))
+            size = int(assigned.max()) + 1 if len(assigned) else 0
+            # Forma fija (size, severidades), también con la tabla vacía
+            histogram_sums = np.zeros((size, len(SEVERITIES)), dtype=np.int64)
+            for column in range(len(SEVERITIES)):
+                histogram_sums[:, column] = np.bincount(assigned, weights=histogram[:, column], minlength=size)
+            level = _Level.from_arrays(
+                np.bincount(assigned, weights=sum_x, minlength=size),
+                np.bincount(assigned, weights=sum_y, minlength=size),
+                np.bincount(assigned, weights=count, minlength=size).astype(np.int64),
+                histogram_sums,
+                np.bincount(assigned, weights=id_sum, minlength=size).astype(np.int64),
+            )
+            if child is None:
+                leaf_owner = assigned
+            else:
+                child.parent[:child.size] = assigned
+            levels.append(level)
+            child = level
+            sum_x, sum_y, count = level.sum_x[:size], level.sum_y[:size], level.count[:size]
+            histogram, id_sum = level.histogram[:size], level.id_sum[:size]
+
+        self._levels = levels[::-1]
+        self._leaves = {
+            int(report_id): (float(x[i]), float(y[i]), int(severities[i]), int(leaf_owner[i]))
+            for i, report_id in enumerate(ids)
+        }
+        self._version = version
+        self._cursor = cursor
+        self._last_tombstone = last_tombstone
+        self._built_at = time.monotonic()
+        self._changes = 0
+
+    # Cambios incrementales
+
+    def _insert(self, report_id, lat, lng, severity):
+        if severity not in SEVERITIES:
+            return
+        x, y = project([lat], [lng])
+        x, y, severity = float(x[0]), float(y[0]), SEVERITIES.index(severity)
+        child, child_is_new, owner = None, True, None
+        for zoom in range(self.leaf_zoom, self.min_zoom - 1, -1):
+            level = self.level(zoom)
+            if zoom == self.leaf_zoom:
+                cluster, is_new = level.append(), True
+            elif not child_is_new:
+                cluster, is_new = int(self.level(zoom + 1).parent[child]), False
+            else:
+                cluster = level.nearest_within(x, y, self.radius(zoom))
+                is_new = cluster is None
+                if is_new:
+                    cluster = level.append()
+                if child is not None:
+                    self.level(zoom + 1).parent[child] = cluster
+            level.change(cluster, x, y, severity, report_id, 1)
+            if owner is None:
+                owner = cluster
+            child, child_is_new = cluster, is_new
+        self._leaves[report_id] = (x, y, severity, owner)
+
+    def _remove(self, report_id):
+        leaf = self._leaves.pop(report_id, None)
+        if leaf is None:
+            return
+        x, y, severity, cluster = leaf
+        for zoom in range(self.leaf_zoom, self.min_zoom - 1, -1):
+            level = self.level(zoom)
+            level.change(cluster, x, y, severity, report_id, -1)
+            cluster = int(level.parent[cluster])
+
+    def apply(self, report_id, lat, lng, severity, status):
+        """Mirror the current state of a report (created, changed or deleted)."""
+        self._remove(report_id)
+        if status in self.statuses:
+            self._insert(report_id, lat, lng, severity)
+        self._changes += 1
+
+    def _sync(self, version):
+        updated_at, last_id = self._cursor
+        reports = TrashReport.objects.order_by('updated_at', 'id')
+        if updated_at is not None:
+            reports = reports.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id))
+        limit = _setting('REPORT_CLUSTERS_REBUILD_AFTER', 1000)
+        rows = list(reports.values_list('id', 'latitude', 'longitude', 'severity', 'status', 'updated_at')[:limit + 1])
+        tombstones = list(ReportTombstone.objects.filter(id__gt=self._last_tombstone).order_by('id').values_list(
+            'id', 'report_id'
+        )[:limit + 1])
+        # Tras muchos cambios sale más barato reconstruir, y de paso se corrige la deriva
+        if len(rows) > limit or len(tombstones) > limit or self._changes + len(rows) + len(tombstones) > limit:
+            self._rebuild()
+            return
+        for report_id, lat, lng, severity, status, _ in rows:
+            self.apply(report_id, float(lat), float(lng), severity, status)
+        for _, report_id in tombstones:
+            self._remove(report_id)
+            self._changes += 1
+        if rows:
+            self._cursor = (rows[-1][5], rows[-1][0])
+        if tombstones:
+            self._last_tombstone = tombstones[-1][0]
+        self._version = version
+
+    def _ensure_current(self):
+        # Los cambios reemplazan el token de la caché al confirmarse; con un token nuevo se leen
+        # solo los reportes posteriores al cursor y las bajas. La reconstrucción periódica
+        # (REPORT_CLUSTERS_REBUILD_INTERVAL) corrige la deriva de los centroides.
+        version = cache.get(CLUSTERS_VERSION_KEY)
+        expired = time.monotonic() - self._built_at > _setting('REPORT_CLUSTERS_REBUILD_INTERVAL', 60 * 60)
+        if self._levels and not expired and version is not None and version == self._version:
+            return
+        with self._lock:
+            if not self._levels or expired or version is None:
+                self._rebuild()
+            elif version != self._version:
+                self._sync(version)
+
+    # Consultas
+
+    def clusters(self, zoom: int, west: float, south: float, east: float, north: float) -> List[dict]:
+        """
+        Clusters inside the box at ``zoom`` with centroid, count and severity
+        histogram; single-report clusters carry its id. Above ``max_zoom`` the
+        reports come back one by one.
+        """
+        self._ensure_current()
+        zoom = min(max(int(zoom), self.min_zoom), self.leaf_zoom)
+        (min_x, max_x), (max_y, min_y) = (
+            (west / 360 + 0.5, east / 360 + 0.5), project([south, north], [0, 0])[1]
+        )
+        with self._lock:
+            level = self.level(zoom)
+            x, y = level.centroids()
+            inside = (level.count[:level.size] > 0) & (y >= min_y) & (y <= max_y)
+            if min_x <= max_x:
+                inside &= (x >= min_x) & (x <= max_x)
+            else:  # el recuadro cruza el antimeridiano
+                inside &= (x >= min_x) | (x <= max_x)
+            indexes = np.flatnonzero(inside)
+            lats, lngs = unproject(x[indexes], y[indexes])
+            return [
+                self._format(lat, lng, int(level.count[i]), level.histogram[i], int(level.id_sum[i]))
+                for i, lat, lng in zip(indexes, lats.tolist(), lngs.tolist())
+            ]
+
+    @staticmethod
+    def _format(lat, lng, count, histogram, id_sum):
+        cluster = {
+            'latitude': round(lat, 6),
+            'longitude': round(lng, 6),
+            'count': count,
+            'severity': {str(severity): int(total) for severity, total in zip(SEVERITIES, histogram)},
+        }
+        if count == 1:
+            cluster['id'] = id_sum
+        return cluster
+
+
+report_clusters = ReportClusterIndex()
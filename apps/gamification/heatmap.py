@@ -0,0 +1,238 @@
+"""
+Report heatmap on a fixed degree grid, kept per day and cell in ``HeatmapCell``.
+"""
+import math
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.gamification.models import HeatmapCell, TrashReport
+
+# Cada reporte suma a su celda, en el día de su creación, un reporte y un peso igual a su
+# severidad (por HEATMAP_RECURRING_WEIGHT si es recurrente); los rechazados no cuentan.
+# Las señales aplican la diferencia con F() en cada escritura, como apps.waste.rollups,
+# así que las ventanas de días salen de HeatmapCell sin recorrer los reportes.
+
+# Campos del reporte de los que depende su aporte
+HEAT_FIELDS = ('latitude', 'longitude', 'severity', 'is_recurring', 'status', 'created_at')
+BUCKET_FIELDS = ('cell_x', 'cell_y', 'date')
+TOTAL_FIELDS = ('reports', 'weight')
+
+# (cell_x, cell_y, date, weight)
+Bucket = Tuple[int, int, date, int]
+
+
+def cell_degrees() -> float:
+    return getattr(settings, 'HEATMAP_CELL_DEGREES', 0.002)
+
+
+def recurring_weight() -> int:
+    return getattr(settings, 'HEATMAP_RECURRING_WEIGHT', 2)
+
+
+def excluded_statuses():
+    return getattr(settings, 'HEATMAP_EXCLUDED_STATUSES', ('rejected',))
+
+
+def max_raster_cells() -> int:
+    return getattr(settings, 'HEATMAP_MAX_RASTER_CELLS', 256 * 256)
+
+
+def cell_of(latitude: float, longitude: float) -> Tuple[int, int]:
+    # Mismas operaciones que raw_buckets, para que ambos caminos coincidan en los bordes
+    size = cell_degrees()
+    return math.floor((longitude + 180) / size), math.floor((latitude + 90) / size)
+
+
+def bucket_for(row) -> Optional[Bucket]:
+    """Cell, day and weight a report counts for (``row`` holds ``HEAT_FIELDS``), or ``None``."""
+    if row['status'] in excluded_statuses() or row['created_at'] is None:
+        return None
+    cell_x, cell_y = cell_of(float(row['latitude']), float(row['longitude']))
+    weight = row['severity'] * (recurring_weight() if row['is_recurring'] else 1)
+    return cell_x, cell_y, timezone.localdate(row['created_at']), weight
+
+
+def instance_bucket(report) -> Optional[Bucket]:
+    return bucket_for({field: getattr(report, field) for field in HEAT_FIELDS})
+
+
+def stored_bucket(report_id) -> Optional[Bucket]:
+    """Bucket of the report as currently stored in the database."""
+    row = TrashReport._base_manager.filter(pk=report_id).values(*HEAT_FIELDS).first()
+    return bucket_for(row) if row else None
+
+
+def apply_delta(cell_x, cell_y, day, reports, weight):
+    """Add to a cell, creating it on first use and deleting it once empty."""
+    cell = HeatmapCell.objects.filter(cell_x=cell_x, cell_y=cell_y, date=day)
+    increments = {'reports': F('reports') + reports, 'weight': F('weight') + weight}
+    with transaction.atomic():
+        if not cell.update(**increments):
+            if reports <= 0:
+                return
+            try:
+                with transaction.atomic():
+                    HeatmapCell.objects.create(cell_x=cell_x, cell_y=cell_y, date=day, reports=reports, weight=weight)
+            except IntegrityError:
+                # Otro proceso creó la celda entre el update y el insert
+                cell.update(**increments)
+        if reports < 0:
+            cell.filter(reports__lte=0).delete()
+
+
+def move(previous: Optional[Bucket], current: Optional[Bucket]):
+    """Move a report from bucket ``previous`` to ``current`` (``None`` when it does not count)."""
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            cell_x, cell_y, day, weight = previous
+            apply_delta(cell_x, cell_y, day, -1, -weight)
+        if current is not None:
+            cell_x, cell_y, day, weight = current
+            apply_delta(cell_x, cell_y, day, 1, weight)
+
+
+def raw_buckets(reports=None) -> Dict[Tuple[int, int, date], dict]:
+    """Per-cell totals computed from ``TrashReport`` with NumPy, keyed by (cell_x, cell_y, date)."""
+    reports = TrashReport.objects.all() if reports is None else reports
+    rows = list(reports.exclude(status__in=excluded_statuses()).filter(created_at__isnull=False).annotate(
+        day=TruncDate('created_at')
+    ).order_by().values_list('latitude', 'longitude', 'severity', 'is_recurring', 'day'))
+    if not rows:
+        return {}
+
+    latitudes, longitudes, severities, recurring, days = zip(*rows)
+    size = cell_degrees()
+    keys = np.column_stack((
+        np.floor((np.array(longitudes, dtype=np.float64) + 180) / size).astype(np.int64),
+        np.floor((np.array(latitudes, dtype=np.float64) + 90) / size).astype(np.int64),
+        np.array([day.toordinal() for day in days], dtype=np.int64),
+    ))
+    weights = np.array(severities, dtype=np.int64) * np.where(np.array(recurring, dtype=bool), recurring_weight(), 1)
+
+    cells, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    counts = np.bincount(inverse, minlength=len(cells))
+    totals = np.bincount(inverse, weights=weights, minlength=len(cells))
+    buckets = {}
+    for (cell_x, cell_y, ordinal), reports_count, weight in zip(cells.tolist(), counts.tolist(), totals.tolist()):
+        key = (cell_x, cell_y, date.fromordinal(ordinal))
+        buckets[key] = {'cell_x': cell_x, 'cell_y': cell_y, 'date': key[2], 'reports': reports_count, 'weight': int(weight)}
+    return buckets
+
+
+def stored_buckets(cells=None):
+    cells = HeatmapCell.objects.all() if cells is None else cells
+    rows = cells.values(*BUCKET_FIELDS, *TOTAL_FIELDS)
+    return {tuple(row[field] for field in BUCKET_FIELDS): row for row in rows}
+
+
+def diff(reports=None, cells=None):
+    """
+    Cells where the heatmap disagrees with the reports, as
+    ``(key, expected, stored)`` with ``None`` on the missing side.
+    """
+    expected = raw_buckets(reports)
+    stored = stored_buckets(cells)
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key)
+        have = stored.get(key)
+        if want is None or have is None or any(want[field] != have[field] for field in TOTAL_FIELDS):
+            mismatches.append((key, want, have))
+    return mismatches
+
+
+def rebuild(reports=None, cells=None, batch_size=1000):
+    """Replace ``cells`` with the totals recomputed from ``reports``."""
+    cells = HeatmapCell.objects.all() if cells is None else cells
+    buckets = raw_buckets(reports)
+    with transaction.atomic():
+        cells.delete()
+        HeatmapCell.objects.bulk_create([HeatmapCell(**row) for row in buckets.values()], batch_size=batch_size)
+    return len(buckets)
+
+
+def window(cells=None, days=None, since=None, until=None):
+    """Cells of the last ``days`` days, or between ``since`` and ``until`` inclusive."""
+    cells = HeatmapCell.objects.all() if cells is None else cells
+    if days is not None:
+        since = timezone.localdate() - timedelta(days=days)
+    if since is not None:
+        cells = cells.filter(date__gte=since)
+    if until is not None:
+        cells = cells.filter(date__lte=until)
+    return cells
+
+
+def _cell_range(west, south, east, north):
+    (x0, y0), (x1, y1) = cell_of(south, west), cell_of(north, east)
+    return x0, y0, x1, y1
+
+
+def _cell_bounds(cell_x, cell_y):
+    size = cell_degrees()
+    west, south = cell_x * size - 180, cell_y * size - 90
+    return round(west, 6), round(south, 6), round(west + size, 6), round(south + size, 6)
+
+
+def hotspots(limit=10, bbox=None, **period) -> List[dict]:
+    """The ``limit`` heaviest cells, optionally inside ``bbox`` (west, south, east, north)."""
+    cells = window(**period)
+    if bbox is not None:
+        x0, y0, x1, y1 = _cell_range(*bbox)
+        cells = cells.filter(cell_x__range=(x0, x1), cell_y__range=(y0, y1))
+    rows = cells.values('cell_x', 'cell_y').annotate(
+        total_reports=Sum('reports'), total_weight=Sum('weight')
+    ).order_by('-total_weight', '-total_reports', 'cell_y', 'cell_x')[:limit]
+
+    spots = []
+    for row in rows:
+        west, south, east, north = _cell_bounds(row['cell_x'], row['cell_y'])
+        spots.append({
+            'latitude': round((south + north) / 2, 6),
+            'longitude': round((west + east) / 2, 6),
+            'bounds': [west, south, east, north],
+            'reports': row['total_reports'],
+            'weight': row['total_weight'],
+        })
+    return spots
+
+
+def density(west, south, east, north, **period) -> dict:
+    """
+    Weight raster over the box, rows from north to south. Above
+    ``HEATMAP_MAX_RASTER_CELLS`` cells are merged into ``factor`` x ``factor`` blocks.
+    """
+    x0, y0, x1, y1 = _cell_range(west, south, east, north)
+    columns, rows = x1 - x0 + 1, y1 - y0 + 1
+    factor = max(1, math.ceil(math.sqrt(columns * rows / max_raster_cells())))
+    width, height = math.ceil(columns / factor), math.ceil(rows / factor)
+
+    totals = list(window(**period).filter(cell_x__range=(x0, x1), cell_y__range=(y0, y1)).values(
+        'cell_x', 'cell_y'
+    ).annotate(total_weight=Sum('weight')).order_by().values_list('cell_x', 'cell_y', 'total_weight'))
+    raster = np.zeros((height, width), dtype=np.int64)
+    if totals:
+        cell_x, cell_y, weight = (np.array(column, dtype=np.int64) for column in zip(*totals))
+        np.add.at(raster, ((y1 - cell_y) // factor, (cell_x - x0) // factor), weight)
+
+    size = cell_degrees() * factor
+    west_edge = round(x0 * cell_degrees() - 180, 6)
+    north_edge = round((y1 + 1) * cell_degrees() - 90, 6)
+    return {
+        'bounds': [west_edge, round(north_edge - height * size, 6), round(west_edge + width * size, 6), north_edge],
+        'cell_size': round(size, 6),
+        'width': width,
+        'height': height,
+        'max': int(raster.max()),
+        'values': raster.tolist(),
+    }
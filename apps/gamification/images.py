@@ -0,0 +1,150 @@
+"""
+Procesamiento en segundo plano de las fotos de los reportes.
+
+Tras la subida se generan una miniatura y una versión mediana en WebP, se
+eliminan los metadatos EXIF (incluida la ubicación GPS del teléfono) y se
+registran las dimensiones de la imagen original. También se calcula un hash
+perceptual de la foto: si otro reporte cercano tiene una foto casi idéntica,
+el nuevo se marca automáticamente como recurrente. Los puntos del reporte se
+conceden al terminar, una vez se sabe si la foto es repetida.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from apps.gamification.heatmap import move as move_heat, stored_bucket
+from apps.gamification.models import TrashReport
+from apps.gamification.points import award_reports
+from apps.utils.geo import geohash_range
+from apps.utils.imagehash import CellHashIndex, phash, to_signed
+from apps.utils.jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+MEDIUM_SIZE = (1280, 1280)
+WEBP_QUALITY = 80
+
+
+def _load_report_cell(cell):
+    start, end = geohash_range(cell)
+    return TrashReport.objects.filter(
+        geohash__gte=start, geohash__lt=end, image_hash__isnull=False
+    ).values_list('id', 'image_hash', 'latitude', 'longitude')
+
+
+report_hash_index = CellHashIndex('gamification:report_hashes', _load_report_cell)
+
+image_queue = JobQueue(
+    'report-images',
+    max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+    run_async=getattr(settings, 'IMAGE_PIPELINE_ASYNC', True),
+)
+
+
+def render_webp(image, size):
+    """Reduce ``image`` para que quepa en ``size`` y lo codifica como WebP."""
+    rendition = image.copy()
+    rendition.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    rendition.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def encode_without_metadata(image, image_format):
+    """Codifica ``image`` en su formato original sin EXIF ni XMP."""
+    clean = image.copy()
+    for key in ('exif', 'xmp', 'XML:com.adobe.xmp'):
+        clean.info.pop(key, None)
+    options = {}
+    if image_format == 'JPEG':
+        options['quality'] = 95
+    if clean.info.get('icc_profile'):
+        options['icc_profile'] = clean.info['icc_profile']
+    buffer = BytesIO()
+    clean.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def find_recurring_reports(report, image_hash):
+    """Ids de otros reportes cercanos cuya foto es casi idéntica."""
+    matches = report_hash_index.near_duplicates(
+        float(report.latitude), float(report.longitude), image_hash,
+        max_distance=settings.IMAGE_DEDUP_MAX_DISTANCE,
+        radius_km=settings.IMAGE_DEDUP_RADIUS_M / 1000,
+        exclude=report.id,
+    )
+    return [report_id for report_id, _, _ in matches]
+
+
+def process_report_image(report_id):
+    """Genera las versiones reducidas de la foto de un reporte."""
+    report = TrashReport.objects.filter(pk=report_id).first()
+    if report is None:
+        return
+    if not report.image:
+        award_reports(TrashReport.objects.filter(pk=report_id))
+        return
+
+    with report.image.open('rb') as source:
+        original = Image.open(source)
+        original.load()
+    image_format = original.format or 'JPEG'
+
+    # Aplicar la orientación EXIF antes de descartar los metadatos
+    upright = ImageOps.exif_transpose(original)
+    if upright.mode not in ('RGB', 'RGBA'):
+        upright = upright.convert('RGBA' if 'A' in upright.getbands() else 'RGB')
+
+    storage = report.image.storage
+    replaced = [name for name in (report.thumbnail.name, report.image_medium.name) if name]
+
+    base_name = os.path.splitext(os.path.basename(report.image.name))[0]
+    report.thumbnail.save(f'{base_name}.webp', ContentFile(render_webp(upright, THUMBNAIL_SIZE)), save=False)
+    report.image_medium.save(f'{base_name}.webp', ContentFile(render_webp(upright, MEDIUM_SIZE)), save=False)
+
+    fields = {
+        'thumbnail': report.thumbnail.name,
+        'image_medium': report.image_medium.name,
+        'image_width': upright.width,
+        'image_height': upright.height,
+        'image_hash': to_signed(phash(upright)),
+        'updated_at': timezone.now(),
+    }
+
+    recurring = find_recurring_reports(report, fields['image_hash'])
+    if recurring:
+        fields['is_recurring'] = True
+        logger.info('Report %s looks like a repeat of %s', report_id, recurring[:5])
+
+    # Reemplazar el original por una copia sin EXIF y ya orientada
+    if original.getexif():
+        stripped = encode_without_metadata(upright, image_format)
+        fields['image'] = storage.save(report.image.name, ContentFile(stripped))
+        replaced.append(report.image.name)
+
+    # update() evita volver a disparar las señales de guardado del reporte,
+    # así que el cambio de is_recurring se lleva aquí al mapa de calor
+    with transaction.atomic():
+        previous_heat = stored_bucket(report_id) if recurring else None
+        TrashReport.objects.filter(pk=report_id).update(**fields)
+        if recurring:
+            move_heat(previous_heat, stored_bucket(report_id))
+    report_hash_index.invalidate(float(report.latitude), float(report.longitude))
+    # Si falla, el reporte queda pendiente para award_points_backlog
+    award_reports(TrashReport.objects.filter(pk=report_id))
+
+    # Liberar los archivos anteriores solo cuando el reporte ya apunta a los nuevos
+    for name in replaced:
+        storage.delete(name)
+
+
+def schedule_report_image(report_id):
+    """Encola el procesamiento una vez confirmada la transacción actual."""
+    transaction.on_commit(lambda: image_queue.submit(process_report_image, report_id))
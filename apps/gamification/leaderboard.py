@@ -0,0 +1,437 @@
+"""
+Tablas de clasificación sobre conjuntos ordenados.
+
+Cada tabla (global, semanal y por categoría de residuo) es un conjunto
+ordenado usuario -> puntos. Con la caché de Redis configurada se usan sus
+sorted sets (ZINCRBY/ZREVRANK/ZREVRANGE); en otro caso, o en pruebas, una
+skip list indexada en memoria del proceso. Ambas responden la posición de un
+usuario y el top N en O(log n) sin ordenar la tabla de perfiles.
+
+Una tabla vacía (proceso recién arrancado, clave expulsada de Redis) se
+siembra desde la base de datos antes de leerla o de sumarle puntos, con un
+candado en la caché para que un solo proceso la reconstruya a la vez.
+"""
+import random
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db.models import Count
+from django.utils import timezone
+
+GLOBAL_BOARD = 'global'
+WEEKLY_TTL = 60 * 60 * 24 * 7 * 5  # se conservan las últimas semanas para consultarlas
+SEED_LOCK_TIMEOUT = 60  # segundos; libera el candado si el proceso que siembra muere
+SEED_WAIT = 5  # segundos que se espera a otro proceso antes de sembrar igualmente
+
+SKIPLIST_MAX_LEVEL = 32
+SKIPLIST_P = 0.25
+
+
+def weekly_board(day: Optional[date] = None) -> str:
+    year, week, _ = (day or timezone.localdate()).isocalendar()
+    return f'weekly:{year}-W{week:02d}'
+
+
+def category_board(category_id) -> str:
+    return f'category:{category_id}'
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        self.span = [0] * level
+
+
+class SkipList:
+    """
+    Skip list indexada: cada enlace guarda cuántos nodos salta (``span``),
+    de modo que la posición de una clave y el acceso por posición cuestan
+    O(log n) esperado, igual que los sorted sets de Redis.
+    """
+
+    def __init__(self):
+        self.head = _Node(None, SKIPLIST_MAX_LEVEL)
+        self.level = 1
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @staticmethod
+    def _random_level():
+        level = 1
+        while level < SKIPLIST_MAX_LEVEL and random.random() < SKIPLIST_P:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self.head] * SKIPLIST_MAX_LEVEL
+        rank = [0] * SKIPLIST_MAX_LEVEL
+        node = self.head
+        for i in reversed(range(self.level)):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.head
+                self.head.span[i] = self.length
+            self.level = level
+
+        new = _Node(key, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        self.length += 1
+
+    def remove(self, key) -> bool:
+        update = [self.head] * SKIPLIST_MAX_LEVEL
+        node = self.head
+        for i in reversed(range(self.level)):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+
+        target = node.forward[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(self.level):
+            if update[i].forward[i] is target:
+                update[i].span[i] += target.span[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def rank(self, key) -> Optional[int]:
+        """Posición de ``key`` empezando en 0, o None si no está."""
+        traversed = 0
+        node = self.head
+        for i in reversed(range(self.level)):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node is not self.head and node.key == key:
+                return traversed - 1
+        return None
+
+    def slice(self, start: int, count: int) -> list:
+        """Hasta ``count`` claves a partir de la posición ``start``."""
+        if start < 0 or start >= self.length or count <= 0:
+            return []
+        traversed = 0
+        node = self.head
+        for i in reversed(range(self.level)):
+            while node.forward[i] is not None and traversed + node.span[i] <= start + 1:
+                traversed += node.span[i]
+                node = node.forward[i]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.forward[0]
+        return keys
+
+
+class SortedSet:
+    """Miembro -> puntuación, ordenado de mayor a menor puntuación."""
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.index = SkipList()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def incr(self, member: str, delta: float) -> float:
+        old = self.scores.get(member)
+        if old is not None:
+            self.index.remove((-old, member))
+        score = (old or 0) + delta
+        self.scores[member] = score
+        self.index.insert((-score, member))
+        return score
+
+    def rank(self, member: str) -> Optional[int]:
+        score = self.scores.get(member)
+        return None if score is None else self.index.rank((-score, member))
+
+    def top(self, count: int, offset: int = 0) -> List[Tuple[str, float]]:
+        return [(member, -score) for score, member in self.index.slice(offset, count)]
+
+
+class MemoryBackend:
+    """Tablas en memoria del proceso, para un solo nodo y para las pruebas."""
+
+    def __init__(self):
+        self._boards: Dict[str, SortedSet] = {}
+        self._lock = threading.Lock()
+
+    def incr(self, updates):
+        with self._lock:
+            for board, member, delta, _ttl in updates:
+                self._boards.setdefault(board, SortedSet()).incr(member, delta)
+
+    def replace(self, board, scores, ttl=None):
+        sorted_set = SortedSet()
+        for member, score in scores:
+            sorted_set.incr(member, score)
+        with self._lock:
+            self._boards[board] = sorted_set
+
+    def top(self, board, count, offset=0):
+        with self._lock:
+            sorted_set = self._boards.get(board)
+            return sorted_set.top(count, offset) if sorted_set else []
+
+    def position(self, board, member):
+        with self._lock:
+            sorted_set = self._boards.get(board)
+            if sorted_set is None:
+                return None, None
+            return sorted_set.rank(member), sorted_set.scores.get(member)
+
+    def size(self, board):
+        with self._lock:
+            sorted_set = self._boards.get(board)
+            return len(sorted_set) if sorted_set else 0
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+
+class RedisBackend:
+    """Sorted sets de Redis; las actualizaciones de varias tablas van en un MULTI/EXEC."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def key(board):
+        return cache.make_key(f'leaderboard:{board}')
+
+    def incr(self, updates):
+        pipe = self.client.pipeline(transaction=True)
+        for board, member, delta, ttl in updates:
+            pipe.zincrby(self.key(board), delta, member)
+            if ttl:
+                pipe.expire(self.key(board), ttl)
+        pipe.execute()
+
+    def replace(self, board, scores, ttl=None, chunk_size=1000):
+        key = self.key(board)
+        # Clave propia por reconstrucción: dos procesos no mezclan sus puntuaciones
+        staging = f'{key}:rebuild:{uuid4().hex}'
+        scores = list(scores)
+        try:
+            for start in range(0, len(scores), chunk_size):
+                self.client.zadd(staging, dict(scores[start:start + chunk_size]))
+            if scores:
+                self.client.rename(staging, key)
+                if ttl:
+                    self.client.expire(key, ttl)
+            else:
+                self.client.delete(key)
+        finally:
+            # Tras el rename ya no existe; si algo falló antes, no se deja huérfana
+            self.client.delete(staging)
+
+    def top(self, board, count, offset=0):
+        rows = self.client.zrevrange(self.key(board), offset, offset + count - 1, withscores=True)
+        return [(member.decode(), score) for member, score in rows]
+
+    def position(self, board, member):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrank(self.key(board), member)
+        pipe.zscore(self.key(board), member)
+        return tuple(pipe.execute())
+
+    def size(self, board):
+        return self.client.zcard(self.key(board))
+
+    def clear(self):
+        pass
+
+
+class Leaderboard:
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    @staticmethod
+    def _create_backend():
+        choice = getattr(settings, 'LEADERBOARD_BACKEND', 'auto')
+        if choice in ('auto', 'redis'):
+            from django.core.cache.backends.redis import RedisCache
+
+            # ``cache`` es un proxy de conexión: isinstance necesita el backend real
+            default_cache = caches['default']
+            if isinstance(default_cache, RedisCache):
+                return RedisBackend(default_cache._cache.get_client(write=True))
+            if choice == 'redis':
+                raise RuntimeError('LEADERBOARD_BACKEND = "redis" requires a RedisCache default cache')
+        return MemoryBackend()
+
+    def reset(self):
+        """Vuelve a elegir backend (tras cambiar la configuración en pruebas)."""
+        with self._lock:
+            self._backend = None
+
+    def record(self, user_id, points, category_id=None, manual=False, day=None):
+        """Suma ``points`` al usuario en la tabla global, la semanal y la de su categoría."""
+        self.record_many([(user_id, points, category_id, day)], manual)
+
+    def record_many(self, entries, manual=False):
+        """
+        Suma varios ``(user_id, points, category_id, day)`` ya confirmados en la
+        base de datos; ``day`` es la fecha del evento y elige la tabla semanal
+        (``None`` para la semana actual). Las tablas vacías (proceso nuevo, clave
+        expulsada de Redis) se siembran antes desde la base de datos, que ya
+        incluye estos puntos, así que a esas tablas no se les vuelven a sumar.
+        Los puntos ``manual`` de ``award_points`` solo figuran en la fuente de
+        la tabla global.
+        """
+        entries = [
+            (user_id, points, category_id, weekly_board(day))
+            for user_id, points, category_id, day in entries
+        ]
+        boards = {GLOBAL_BOARD}
+        for _, _, category_id, week in entries:
+            boards.add(week)
+            if category_id is not None:
+                boards.add(category_board(category_id))
+        seeded = {board for board in boards if self._ensure_seeded(board)}
+        if manual:
+            seeded &= {GLOBAL_BOARD}
+
+        updates = []
+        for user_id, points, category_id, week in entries:
+            targets = [(GLOBAL_BOARD, None), (week, WEEKLY_TTL)]
+            if category_id is not None:
+                targets.append((category_board(category_id), None))
+            updates.extend((board, str(user_id), points, ttl) for board, ttl in targets if board not in seeded)
+        if updates:
+            self.backend.incr(updates)
+
+    @staticmethod
+    def _source_scores(board):
+        """
+        Puntuaciones de ``board`` recalculadas desde la base de datos. La global
+        sale de ``UserProfile.points``; la semanal y las de categoría, de las
+        detecciones y reportes ya premiados, así que no incluyen los puntos
+        sueltos de ``award_points``.
+        """
+        from apps.gamification.models import TrashReport, UserProfile
+        from apps.gamification.points import points_for
+        from apps.waste_history.models import WasteDetection
+
+        if board == GLOBAL_BOARD:
+            scores = UserProfile.objects.filter(points__gt=0).values_list('user_id', 'points')
+            return [(str(user_id), points) for user_id, points in scores.iterator()]
+
+        kind, _, key = board.partition(':')
+        detections = WasteDetection.objects.filter(points_awarded=True)
+        reports = TrashReport.objects.none()
+        if kind == 'category':
+            detections = detections.filter(category_id=key)
+        elif kind == 'weekly':
+            year, week = key.split('-W')
+            monday = date.fromisocalendar(int(year), int(week), 1)
+            start = timezone.make_aware(datetime.combine(monday, time.min))
+            end = timezone.make_aware(datetime.combine(monday + timedelta(days=7), time.min))
+            detections = detections.filter(created_at__gte=start, created_at__lt=end)
+            reports = TrashReport.objects.filter(points_awarded=True, created_at__gte=start, created_at__lt=end)
+        else:
+            return []
+
+        scores = defaultdict(int)
+        sources = (
+            (detections, points_for('detection')),
+            (reports.filter(is_recurring=False), points_for('report')),
+            (reports.filter(is_recurring=True), points_for('recurring_report')),
+        )
+        for events, points in sources:
+            counts = events.order_by().values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+            for user_id, count in counts:
+                scores[str(user_id)] += count * points
+        return list(scores.items())
+
+    def rebuild(self, board):
+        """Reconstruye ``board`` desde la base de datos (ver ``_source_scores``)."""
+        ttl = WEEKLY_TTL if board.startswith('weekly:') else None
+        self.backend.replace(board, self._source_scores(board), ttl)
+
+    def rebuild_global(self):
+        """Reconstruye la tabla global desde ``UserProfile.points``."""
+        self.rebuild(GLOBAL_BOARD)
+
+    def _ensure_seeded(self, board) -> bool:
+        """
+        Siembra ``board`` si está vacía; devuelve True si lo hizo. Si otro
+        proceso la está sembrando se espera a que termine, hasta ``SEED_WAIT``.
+        """
+        lock = f'leaderboard:{board}:seeding'
+        deadline = monotonic() + SEED_WAIT
+        while not self.backend.size(board):
+            if cache.add(lock, 1, SEED_LOCK_TIMEOUT):
+                try:
+                    if self.backend.size(board):
+                        return False
+                    self.rebuild(board)
+                    return True
+                finally:
+                    cache.delete(lock)
+            if monotonic() >= deadline:
+                # Reconstruir reemplaza la tabla entera, así que repetirla no duplica puntos
+                self.rebuild(board)
+                return True
+            sleep(0.05)
+        return False
+
+    def top(self, board, count=10, offset=0):
+        """Lista de ``(rank, user_id, points)`` con rank empezando en 1."""
+        self._ensure_seeded(board)
+        return [
+            (offset + position + 1, member, int(score))
+            for position, (member, score) in enumerate(self.backend.top(board, count, offset))
+        ]
+
+    def position(self, board, user_id):
+        """``(rank, points)`` del usuario, o ``(None, 0)`` si no figura en la tabla."""
+        self._ensure_seeded(board)
+        rank, score = self.backend.position(board, str(user_id))
+        if rank is None:
+            return None, 0
+        return rank + 1, int(score)
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,18 @@
+# apps/gamification/management/commands/award_points_backlog.py
+from django.core.management.base import BaseCommand
+
+from apps.gamification.points import process_backlog
+
+
+class Command(BaseCommand):
+    help = 'Award points, levels and badges for detections and reports not yet processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Events per transaction')
+        parser.add_argument('--limit', type=int, help='Maximum events of each kind to process')
+
+    def handle(self, *args, **options):
+        processed = process_backlog(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Awarded {processed['detections']} detections and {processed['reports']} reports"
+        ))
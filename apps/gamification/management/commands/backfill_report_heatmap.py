@@ -0,0 +1,24 @@
+# apps/gamification/management/commands/backfill_report_heatmap.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.gamification.heatmap import rebuild
+from apps.gamification.models import HeatmapCell, TrashReport
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the report heatmap cells from the TrashReport table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Only rebuild cells from this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        reports = TrashReport.objects.all()
+        cells = HeatmapCell.objects.all()
+        if options['since']:
+            reports = reports.filter(created_at__date__gte=options['since'])
+            cells = cells.filter(date__gte=options['since'])
+
+        buckets = rebuild(reports, cells)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} heatmap cells'))
@@ -0,0 +1,80 @@
+# apps/gamification/management/commands/benchmark_geo.py
+from time import perf_counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.utils.geo import haversine, haversine_many, haversine_matrix
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scalar haversine against the vectorized NumPy kernels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+            help='Number of points to score per run'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per size, the best one is reported')
+        parser.add_argument(
+            '--scalar-limit', type=int, default=1_000_000,
+            help='Skip the scalar version above this many points'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        origin_lat, origin_lng = -2.170998, -79.922359  # Guayaquil
+
+        self.stdout.write(f"{'points':>10} {'scalar pts/s':>15} {'numpy pts/s':>15} {'speedup':>9} {'max err km':>11}")
+        for size in options['sizes']:
+            lats = origin_lat + rng.uniform(-0.5, 0.5, size)
+            lngs = origin_lng + rng.uniform(-0.5, 0.5, size)
+
+            vector_time, distances = self.best_of(
+                options['repeat'], lambda: haversine_many(origin_lat, origin_lng, lats, lngs)
+            )
+
+            if size <= options['scalar_limit']:
+                lat_list = lats.tolist()
+                lng_list = lngs.tolist()
+                scalar_time, scalar_distances = self.best_of(
+                    options['repeat'],
+                    lambda: [haversine(origin_lat, origin_lng, a, b) for a, b in zip(lat_list, lng_list)]
+                )
+                max_error = float(np.max(np.abs(distances - np.asarray(scalar_distances))))
+                scalar_rate = f'{size / scalar_time:,.0f}'
+                speedup = f'{scalar_time / vector_time:.1f}x'
+                error = f'{max_error:.2e}'
+            else:
+                scalar_rate, speedup, error = '-', '-', '-'
+
+            self.stdout.write(
+                f'{size:>10,} {scalar_rate:>15} {size / vector_time:>15,.0f} {speedup:>9} {error:>11}'
+            )
+
+        # Many-to-many: 1k origins against 10k targets
+        origins = 1_000
+        targets = 10_000
+        matrix_time, _ = self.best_of(
+            options['repeat'],
+            lambda: haversine_matrix(
+                origin_lat + rng.uniform(-0.5, 0.5, origins), origin_lng + rng.uniform(-0.5, 0.5, origins),
+                origin_lat + rng.uniform(-0.5, 0.5, targets), origin_lng + rng.uniform(-0.5, 0.5, targets),
+            )
+        )
+        self.stdout.write(
+            f'matrix {origins:,}x{targets:,}: {origins * targets / matrix_time:,.0f} pairs/s'
+        )
+
+    @staticmethod
+    def best_of(repeat, func):
+        best = None
+        result = None
+        for _ in range(max(repeat, 1)):
+            start = perf_counter()
+            result = func()
+            elapsed = perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best, result
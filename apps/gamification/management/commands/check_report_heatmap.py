@@ -0,0 +1,47 @@
+# apps/gamification/management/commands/check_report_heatmap.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.gamification.heatmap import TOTAL_FIELDS, diff, rebuild
+from apps.gamification.models import HeatmapCell, TrashReport
+
+
+class Command(BaseCommand):
+    help = 'Compare the report heatmap cells with the TrashReport table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Only check cells from this date (YYYY-MM-DD)')
+        parser.add_argument('--fix', action='store_true', help='Rebuild every day with a mismatch')
+        parser.add_argument('--limit', type=int, default=20, help='Mismatches to print')
+
+    def handle(self, *args, **options):
+        reports = TrashReport.objects.all()
+        cells = HeatmapCell.objects.all()
+        if options['since']:
+            reports = reports.filter(created_at__date__gte=options['since'])
+            cells = cells.filter(date__gte=options['since'])
+
+        mismatches = diff(reports, cells)
+        for (cell_x, cell_y, day), expected, stored in mismatches[:options['limit']]:
+            self.stdout.write(
+                f'cell ({cell_x}, {cell_y}) {day}: '
+                f'expected {self.totals(expected)} stored {self.totals(stored)}'
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Heatmap cells match the reports'))
+            return
+
+        if not options['fix']:
+            raise CommandError(f'{len(mismatches)} heatmap cells differ from the reports')
+
+        days = {day for (_, _, day), _, _ in mismatches}
+        rebuild(reports.filter(created_at__date__in=days), cells.filter(date__in=days))
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} cells over {len(days)} days'))
+
+    @staticmethod
+    def totals(bucket):
+        if bucket is None:
+            return '-'
+        return ', '.join(f'{field}={bucket[field]}' for field in TOTAL_FIELDS)
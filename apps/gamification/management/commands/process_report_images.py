@@ -0,0 +1,29 @@
+# apps/gamification/management/commands/process_report_images.py
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from apps.gamification.images import process_report_image
+from apps.gamification.models import TrashReport
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnails, perceptual hashes and strip EXIF for trash reports not yet processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Reprocess every report, not only pending ones')
+
+    def handle(self, *args, **options):
+        reports = TrashReport.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            reports = reports.filter(Q(thumbnail='') | Q(image_hash__isnull=True))
+
+        processed = 0
+        failed = 0
+        for report_id in reports.values_list('id', flat=True).iterator():
+            try:
+                process_report_image(report_id)
+                processed += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Report {report_id}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} images ({failed} failed)'))
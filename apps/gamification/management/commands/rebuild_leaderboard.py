@@ -0,0 +1,14 @@
+# apps/gamification/management/commands/rebuild_leaderboard.py
+from django.core.management.base import BaseCommand
+
+from apps.gamification.leaderboard import GLOBAL_BOARD, leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global leaderboard from UserProfile.points'
+
+    def handle(self, *args, **options):
+        leaderboard.rebuild_global()
+        self.stdout.write(self.style.SUCCESS(
+            f'Global leaderboard rebuilt with {leaderboard.backend.size(GLOBAL_BOARD)} users'
+        ))
@@ -0,0 +1,35 @@
+# apps/gamification/management/commands/rebuild_report_geohash.py
+from django.core.management.base import BaseCommand
+from apps.gamification.models import TrashReport
+from apps.utils.geo import geohash_encode
+
+
+class Command(BaseCommand):
+    help = 'Fill the geohash spatial index column for existing trash reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every report, not only missing ones')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per bulk update')
+
+    def handle(self, *args, **options):
+        reports = TrashReport.objects.only('id', 'latitude', 'longitude', 'geohash').order_by('id')
+        if not options['all']:
+            reports = reports.filter(geohash='')
+
+        batch_size = options['batch_size']
+        batch = []
+        updated = 0
+
+        for report in reports.iterator(chunk_size=batch_size):
+            report.geohash = geohash_encode(float(report.latitude), float(report.longitude))
+            batch.append(report)
+            if len(batch) >= batch_size:
+                TrashReport.objects.bulk_update(batch, ['geohash'])
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            TrashReport.objects.bulk_update(batch, ['geohash'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated geohash for {updated} trash reports'))
@@ -0,0 +1,14 @@
+# apps/gamification/management/commands/rebuild_report_search.py
+from django.core.management.base import BaseCommand
+from apps.gamification.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for trash report descriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} trash reports'))
@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from apps.security.models import User
+from apps.utils.geo import geohash_encode
 
 # Create your models here.
 class UserProfile(models.Model):
@@ -48,16 +49,98 @@ class TrashReport(models.Model):
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     image = models.ImageField(upload_to='trash_reports/')
+    # Versiones reducidas en WebP, generadas en segundo plano tras la subida
+    thumbnail = models.ImageField(upload_to='trash_reports/thumbnails/', blank=True, editable=False)
+    image_medium = models.ImageField(upload_to='trash_reports/medium/', blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Hash perceptual de 64 bits de la foto, para detectar reportes repetidos del mismo lugar
+    image_hash = models.BigIntegerField(null=True, blank=True, editable=False)
     description = models.TextField()
     severity = models.IntegerField(choices=SEVERITY_CHOICES)
     is_recurring = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Celda geohash de la ubicación, usada como índice espacial en búsquedas por cercanía
+    geohash = models.CharField(max_length=12, db_index=True, blank=True, editable=False)
+    points_awarded = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='trashreport_lat_lng_idx'),
+            # Paginación por cursor sobre (created_at, id) y (severity, id)
+            models.Index(fields=['created_at', 'id'], name='trashreport_created_id_idx'),
+            models.Index(fields=['severity', 'id'], name='trashreport_severity_id_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='trashreport_status_created_idx'),
+            # Exportaciones incrementales (since) sobre updated_at
+            models.Index(fields=['updated_at', 'id'], name='trashreport_updated_id_idx'),
+            # Reportes pendientes de premiar, en orden de llegada
+            models.Index(fields=['points_awarded', 'created_at'], name='trashreport_awarded_idx'),
+        ]
 
     def __str__(self):
         return f"Reporte #{self.id} - {self.get_status_display()}"
 
+    @property
+    def thumbnail_url(self):
+        """URL de la miniatura, o de la imagen original si aún no se ha procesado."""
+        if self.thumbnail:
+            return self.thumbnail.url
+        return self.image.url if self.image else ''
+
+    @property
+    def medium_url(self):
+        if self.image_medium:
+            return self.image_medium.url
+        return self.image.url if self.image else ''
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'latitude', 'longitude'} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash_encode(float(self.latitude), float(self.longitude))
+            if update_fields is not None and 'geohash' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['geohash']
+        super().save(*args, **kwargs)
+
+class ReportTombstone(models.Model):
+    """Registro de reportes eliminados, para que los clientes sincronicen las bajas"""
+    report_id = models.BigIntegerField(_('report id'))
+    deleted_at = models.DateTimeField(_('deleted at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('report tombstone')
+        verbose_name_plural = _('report tombstones')
+
+    def __str__(self):
+        return f"Reporte #{self.report_id} eliminado"
+
+class HeatmapCell(models.Model):
+    """Reportes por día y celda de la cuadrícula del mapa de calor, mantenidos al escribir los reportes"""
+    cell_x = models.IntegerField(_('cell x'))
+    cell_y = models.IntegerField(_('cell y'))
+    date = models.DateField(_('date'))
+    reports = models.PositiveIntegerField(_('reports'), default=0)
+    # Suma de severidades, multiplicadas por HEATMAP_RECURRING_WEIGHT en los reportes recurrentes
+    weight = models.PositiveIntegerField(_('weight'), default=0)
+
+    class Meta:
+        verbose_name = _('heatmap cell')
+        verbose_name_plural = _('heatmap cells')
+        # La restricción única también sirve de índice por fecha para las ventanas de días
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'cell_x', 'cell_y'], name='heatmapcell_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['cell_x', 'cell_y'], name='heatmapcell_cell_idx'),
+        ]
+
+    def __str__(self):
+        return f"Celda ({self.cell_x}, {self.cell_y}) {self.date}"
+
 class ReportComment(models.Model):
     report = models.ForeignKey(TrashReport, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -0,0 +1,93 @@
+"""Paginación por cursor (keyset) para listados de reportes."""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar."""
+
+
+class KeysetPage:
+    """Página de resultados paginados por cursor, iterable como un ``Page``."""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_token(payload):
+    """Codifica un valor JSON como token opaco apto para URLs."""
+    raw = json.dumps(payload, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def encode_cursor(value, pk):
+    return encode_token([value, pk])
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = decode_token(cursor)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(pk, int):
+        raise InvalidCursor('Identificador inválido')
+    return value, pk
+
+
+def keyset_paginate(queryset, order_by, cursor, per_page):
+    """
+    Pagina ``queryset`` por ``(campo, id)`` según ``order_by`` (``'-created_at'``,
+    ``'severity'``, ...). Cada página filtra a partir del último registro de la
+    anterior en lugar de usar OFFSET, y no ejecuta ningún COUNT, por lo que
+    su costo no depende de la profundidad.
+    """
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-')
+    id_order = '-id' if descending else 'id'
+    queryset = queryset.order_by(order_by, id_order)
+
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        if field == 'created_at':
+            try:
+                value = parse_datetime(value) if isinstance(value, str) else None
+            except ValueError:
+                value = None
+            if value is None:
+                raise InvalidCursor('Fecha inválida')
+        elif not isinstance(value, int):
+            raise InvalidCursor('Valor inválido')
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+        )
+
+    objects = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(objects) > per_page:
+        objects = objects[:per_page]
+        last = objects[-1]
+        value = getattr(last, field)
+        next_cursor = encode_cursor(value.isoformat() if hasattr(value, 'isoformat') else value, last.pk)
+
+    return KeysetPage(objects, next_cursor)
@@ -0,0 +1,231 @@
+"""
+Motor de puntos, niveles e insignias.
+
+Los puntos se suman siempre en la base de datos con expresiones ``F()``: un
+solo UPDATE por lote de eventos, con un ``CASE`` por usuario, de modo que
+subidas concurrentes nunca pierden incrementos. Las insignias se evalúan
+contra una lista ordenada de umbrales (``Badge.points_required``) guardada
+en memoria y consultada con ``bisect``; solo se toca la tabla ``Badge``
+cuando cambia. Cada detección y reporte se premia una única vez, marcado con
+``points_awarded``, tanto en línea como al procesar atrasos en lote. Los
+reportes recurrentes, incluidas las fotos repetidas que detecta
+``apps.gamification.images``, reciben los puntos de ``recurring_report``.
+"""
+import bisect
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from apps.gamification.leaderboard import leaderboard
+from apps.gamification.models import Badge, TrashReport, UserProfile
+from apps.security.fragments import invalidate_profile_fragments
+from apps.waste_history.models import WasteDetection
+
+BADGES_VERSION_KEY = 'gamification:badges_version'
+DEFAULT_POINTS = {'detection': 10, 'report': 20, 'recurring_report': 5}
+POINTS_PER_LEVEL = 100
+BADGE_ICON = 'fa-medal'
+
+
+def points_for(event):
+    return getattr(settings, 'GAMIFICATION_POINTS', DEFAULT_POINTS).get(event, DEFAULT_POINTS[event])
+
+
+def bump_badges_version():
+    cache.set(BADGES_VERSION_KEY, uuid4().hex, None)
+
+
+class BadgeThresholds:
+    """Umbrales de insignias ordenados por puntos, recargados al cambiar la tabla ``Badge``."""
+
+    def __init__(self):
+        self._version = None
+        self._points: List[int] = []
+        self._badges: List[dict] = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        version = cache.get(BADGES_VERSION_KEY)
+        if version is None:
+            version = uuid4().hex
+            cache.set(BADGES_VERSION_KEY, version, None)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    rows = list(Badge.objects.order_by('points_required', 'id').values(
+                        'id', 'name', 'category', 'points_required'
+                    ))
+                    self._points = [row['points_required'] for row in rows]
+                    self._badges = rows
+                    self._version = version
+        return self._points, self._badges
+
+    def earned_count(self, points: int) -> int:
+        """Número de insignias cuyo umbral es menor o igual a ``points``."""
+        thresholds, _ = self._load()
+        return bisect.bisect_right(thresholds, points)
+
+    def earned(self, points: int) -> List[dict]:
+        thresholds, badges = self._load()
+        return badges[:bisect.bisect_right(thresholds, points)]
+
+
+badge_thresholds = BadgeThresholds()
+
+
+@dataclass
+class UserDelta:
+    points: int = 0
+    detections: int = 0
+    # Puntos por (categoría, día del evento), para las tablas de categoría y semanal
+    categories: Dict[Tuple[Optional[int], Optional[date]], int] = field(default_factory=lambda: defaultdict(int))
+
+
+def _case(deltas, attribute):
+    """``CASE user_id WHEN ... THEN <valor> ELSE 0 END`` para un UPDATE por lote."""
+    return Case(
+        *[When(user_id=user_id, then=Value(getattr(delta, attribute))) for user_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def apply_deltas(deltas: Dict[object, UserDelta], manual=False):
+    """
+    Suma puntos y detecciones a varios usuarios en un solo UPDATE, recalcula
+    el nivel en la misma sentencia y concede las insignias alcanzadas. Debe
+    llamarse dentro de una transacción. ``manual`` marca los puntos de
+    ``award_points``, que no salen de ninguna detección ni reporte.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta.points or delta.detections}
+    if not deltas:
+        return
+
+    UserProfile.objects.bulk_create(
+        [UserProfile(user_id=user_id) for user_id in deltas], ignore_conflicts=True
+    )
+    points = _case(deltas, 'points')
+    UserProfile.objects.filter(user_id__in=deltas).update(
+        points=F('points') + points,
+        total_detections=F('total_detections') + _case(deltas, 'detections'),
+        # En un UPDATE, F('points') es todavía el valor anterior de la fila
+        level=(F('points') + points) / POINTS_PER_LEVEL + 1,
+    )
+    _award_badges(deltas)
+
+    def record():
+        invalidate_profile_fragments(*deltas)
+        leaderboard.record_many([
+            (user_id, category_points, category_id, day)
+            for user_id, delta in deltas.items()
+            for (category_id, day), category_points in delta.categories.items()
+        ], manual)
+
+    transaction.on_commit(record)
+
+
+def _award_badges(deltas):
+    # Solo se leen y escriben los perfiles que cruzaron un umbral con este lote
+    crossed = [
+        user_id for user_id, total in UserProfile.objects.filter(user_id__in=deltas).values_list('user_id', 'points')
+        if badge_thresholds.earned_count(total) > badge_thresholds.earned_count(total - deltas[user_id].points)
+    ]
+    if not crossed:
+        return
+    now = timezone.now().isoformat()
+    for profile in UserProfile.objects.select_for_update().filter(user_id__in=crossed):
+        owned = {badge.get('id') for badge in profile.badges}
+        new = [
+            {'id': badge['id'], 'name': badge['name'], 'category': badge['category'], 'icon': BADGE_ICON, 'awarded_at': now}
+            for badge in badge_thresholds.earned(profile.points) if badge['id'] not in owned
+        ]
+        if new:
+            profile.badges = profile.badges + new
+            profile.save(update_fields=['badges'])
+
+
+def award_points(user, points, category=None):
+    """Suma ``points`` a un usuario fuera del flujo de eventos (ajustes manuales, premios)."""
+    if not points:
+        return
+    delta = UserDelta(points=points)
+    delta.categories[getattr(category, 'pk', category), None] = points
+    with transaction.atomic():
+        apply_deltas({user.pk: delta}, manual=True)
+
+
+def _claim(queryset, batch_size):
+    """
+    Marca como premiado un lote de pendientes y devuelve los ids que marcó
+    esta transacción; solo esos se cuentan.
+    """
+    queryset = queryset.filter(points_awarded=False).order_by('created_at')
+    if connection.features.has_select_for_update_skip_locked:
+        # Las filas quedan bloqueadas hasta el final de la transacción: nadie más las toma
+        ids = list(queryset.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+        queryset.model.objects.filter(pk__in=ids).update(points_awarded=True)
+        return ids
+    # Sin SKIP LOCKED (SQLite) dos procesos pueden leer los mismos ids: cada UPDATE
+    # condicional cambia la fila en uno solo de ellos
+    pending = queryset.model.objects.filter(points_awarded=False)
+    candidates = list(queryset.values_list('pk', flat=True)[:batch_size])
+    return [pk for pk in candidates if pending.filter(pk=pk).update(points_awarded=True)]
+
+
+def award_detections(queryset=None, batch_size=1000) -> int:
+    """Premia un lote de detecciones pendientes; devuelve cuántas se procesaron."""
+    queryset = WasteDetection.objects.all() if queryset is None else queryset
+    with transaction.atomic():
+        ids = _claim(queryset, batch_size)
+        if not ids:
+            return 0
+        deltas = defaultdict(UserDelta)
+        per_detection = points_for('detection')
+        rows = WasteDetection.objects.filter(pk__in=ids).values_list('user_id', 'category_id', 'created_at')
+        for user_id, category_id, created_at in rows:
+            delta = deltas[user_id]
+            delta.points += per_detection
+            delta.detections += 1
+            # Los atrasos cuentan en la semana en que ocurrió la detección
+            delta.categories[category_id, timezone.localdate(created_at)] += per_detection
+        apply_deltas(deltas)
+    return len(ids)
+
+
+def award_reports(queryset=None, batch_size=1000) -> int:
+    """Premia un lote de reportes pendientes; devuelve cuántos se procesaron."""
+    queryset = TrashReport.objects.all() if queryset is None else queryset
+    with transaction.atomic():
+        ids = _claim(queryset, batch_size)
+        if not ids:
+            return 0
+        deltas = defaultdict(UserDelta)
+        per_report = {False: points_for('report'), True: points_for('recurring_report')}
+        rows = TrashReport.objects.filter(pk__in=ids).values_list('user_id', 'is_recurring', 'created_at')
+        for user_id, is_recurring, created_at in rows:
+            deltas[user_id].points += per_report[is_recurring]
+            deltas[user_id].categories[None, timezone.localdate(created_at)] += per_report[is_recurring]
+        apply_deltas(deltas)
+    return len(ids)
+
+
+def process_backlog(batch_size=1000, limit=None) -> Dict[str, int]:
+    """Premia todos los eventos pendientes por lotes, con una transacción por lote."""
+    processed = {'detections': 0, 'reports': 0}
+    for key, award in (('detections', award_detections), ('reports', award_reports)):
+        while limit is None or processed[key] < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed[key])
+            count = award(batch_size=size)
+            processed[key] += count
+            if count < size:
+                break
+    return processed
@@ -0,0 +1,167 @@
+"""
+Búsqueda de texto completo sobre las descripciones de los reportes.
+
+En SQLite se mantiene una tabla virtual FTS5 con las descripciones ya
+normalizadas y reducidas a su raíz (stemming ligero en español), sincronizada
+mediante señales. En PostgreSQL se usa una columna ``tsvector`` generada con la
+configuración ``spanish`` y un índice GIN, que la base de datos mantiene sola.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from apps.gamification.models import TrashReport
+
+REPORT_TABLE = TrashReport._meta.db_table
+FTS_TABLE = f'{REPORT_TABLE}_fts'
+PG_SEARCH_COLUMN = 'search_vector'
+PG_SEARCH_INDEX = f'{REPORT_TABLE}_search_gin'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+# Palabras vacías que se ignoran en las consultas
+SPANISH_STOPWORDS = frozenset(
+    'a al con de del el en es la las lo los o para por que se sin su sus un una uno unos unas y'.split()
+)
+
+
+def fold(text):
+    """Minúsculas y sin tildes."""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in normalized if not unicodedata.combining(char))
+
+
+def spanish_stem(word):
+    """
+    Stemmer ligero para español (Savoy): elimina marcas de plural y género
+    para que "botellas" y "botella" compartan la raíz "botell".
+    """
+    if len(word) < 5:
+        return word
+    if word.endswith('eses'):
+        return word[:-2]
+    if word.endswith('ces'):
+        return word[:-3] + 'z'
+    if word.endswith(('os', 'as', 'es')):
+        return word[:-2]
+    if word.endswith(('o', 'a', 'e')):
+        return word[:-1]
+    return word
+
+
+def analyze(text):
+    """Convierte un texto en la lista de raíces que se indexan o buscan."""
+    return [spanish_stem(word) for word in _WORD_RE.findall(fold(text or ''))]
+
+
+def _is_sqlite(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def _is_postgresql(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def ensure_search_index(using='default'):
+    """Crea las estructuras de búsqueda si no existen. Devuelve True si las creó."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if _is_sqlite(using):
+            if FTS_TABLE in connection.introspection.table_names(cursor):
+                return False
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5('
+                f'description, tokenize="unicode61 remove_diacritics 2")'
+            )
+            return True
+
+        if _is_postgresql(using):
+            cursor.execute(
+                f'ALTER TABLE "{REPORT_TABLE}" ADD COLUMN IF NOT EXISTS "{PG_SEARCH_COLUMN}" tsvector '
+                f"GENERATED ALWAYS AS (to_tsvector('spanish', coalesce(description, ''))) STORED"
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{PG_SEARCH_INDEX}" '
+                f'ON "{REPORT_TABLE}" USING GIN ("{PG_SEARCH_COLUMN}")'
+            )
+    return False
+
+
+def index_reports(rows, using='default'):
+    """Indexa ``(id, description)`` en la tabla FTS5 (solo SQLite)."""
+    if not _is_sqlite(using):
+        return
+    rows = [(pk, ' '.join(analyze(description))) for pk, description in rows]
+    if not rows:
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [(pk,) for pk, _ in rows])
+        cursor.executemany(f'INSERT INTO "{FTS_TABLE}" (rowid, description) VALUES (%s, %s)', rows)
+
+
+def unindex_report(pk, using='default'):
+    if not _is_sqlite(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}" WHERE rowid = %s', [pk])
+
+
+def rebuild_search_index(using='default', chunk_size=1000):
+    """Reconstruye la tabla FTS5 completa a partir de los reportes existentes."""
+    ensure_search_index(using)
+    if not _is_sqlite(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{FTS_TABLE}"')
+
+    total = 0
+    batch = []
+    rows = TrashReport.objects.using(using).order_by('id').values_list('id', 'description')
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            index_reports(batch, using)
+            total += len(batch)
+            batch = []
+    index_reports(batch, using)
+    return total + len(batch)
+
+
+def search_reports(queryset, query):
+    """
+    Filtra ``queryset`` por ``query`` usando el índice de texto completo y lo
+    anota con ``search_rank`` (mayor es más relevante).
+    """
+    using = queryset.db
+    if _is_postgresql(using):
+        tsquery = "websearch_to_tsquery('spanish', %s)"
+        column = f'"{REPORT_TABLE}"."{PG_SEARCH_COLUMN}"'
+        return queryset.filter(
+            RawSQL(f'{column} @@ {tsquery}', (query,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'ts_rank({column}, {tsquery})', (query,), output_field=FloatField())
+        )
+
+    terms = [term for term in analyze(query) if term not in SPANISH_STOPWORDS]
+    if not _is_sqlite(using) or not terms:
+        return queryset.filter(description__icontains=query).annotate(
+            search_rank=RawSQL('0', (), output_field=FloatField())
+        )
+
+    # Cada raíz como prefijo, todas obligatorias
+    match = ' '.join(f'"{term}"*' for term in terms)
+    report_id = f'"{REPORT_TABLE}"."id"'
+    return queryset.filter(
+        RawSQL(
+            f'{report_id} IN (SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s)',
+            (match,), output_field=BooleanField()
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f'(SELECT -bm25("{FTS_TABLE}") FROM "{FTS_TABLE}" '
+            f'WHERE "{FTS_TABLE}" MATCH %s AND rowid = {report_id})',
+            (match,), output_field=FloatField()
+        )
+    )
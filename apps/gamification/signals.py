@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.gamification.clusters import bump_clusters_version
+from apps.gamification.heatmap import HEAT_FIELDS, instance_bucket, move, stored_bucket
+from apps.gamification.models import Badge, ReportTombstone, TrashReport
+from apps.gamification.points import bump_badges_version
+from apps.gamification.search import index_reports, unindex_report
+
+
+# Campos que usa el índice de agrupamiento del mapa
+CLUSTER_FIELDS = {'latitude', 'longitude', 'severity', 'status'}
+
+
+@receiver(post_save, sender=TrashReport)
+def trash_report_saved(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is None or 'description' in update_fields:
+        index_reports([(instance.pk, instance.description)], using)
+    if update_fields is None or CLUSTER_FIELDS & set(update_fields):
+        transaction.on_commit(bump_clusters_version, using=using)
+
+
+@receiver(post_delete, sender=TrashReport)
+def trash_report_deleted(sender, instance, using, **kwargs):
+    unindex_report(instance.pk, using)
+    ReportTombstone.objects.using(using).create(report_id=instance.pk)
+    transaction.on_commit(bump_clusters_version, using=using)
+
+
+def _touches_heatmap(update_fields):
+    return update_fields is None or bool(set(HEAT_FIELDS) & set(update_fields))
+
+
+@receiver(pre_save, sender=TrashReport)
+def remember_previous_heat(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or not _touches_heatmap(update_fields):
+        return
+    instance._previous_heat = stored_bucket(instance.pk)
+
+
+@receiver(post_save, sender=TrashReport)
+def update_heatmap(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _touches_heatmap(update_fields):
+        return
+    move(instance.__dict__.pop('_previous_heat', None), instance_bucket(instance))
+
+
+@receiver(post_delete, sender=TrashReport)
+def remove_from_heatmap(sender, instance, **kwargs):
+    move(instance_bucket(instance), None)
+
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def badge_changed(sender, **kwargs):
+    bump_badges_version()
+
+
+def create_search_index(sender, using='default', **kwargs):
+    """Crea el índice de texto completo tras ``migrate`` y lo llena si es nuevo."""
+    from apps.gamification.search import ensure_search_index, rebuild_search_index
+
+    if ensure_search_index(using):
+        rebuild_search_index(using)
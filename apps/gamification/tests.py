@@ -1,3 +1,746 @@
-from django.test import TestCase
+import json
+import random
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import QuerySet
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.gamification.clusters import ReportClusterIndex
+from apps.gamification.images import MEDIUM_SIZE, THUMBNAIL_SIZE, image_queue, process_report_image, schedule_report_image
+from apps.gamification.leaderboard import GLOBAL_BOARD, MemoryBackend, RedisBackend, category_board, leaderboard, weekly_board
+from apps.gamification.models import TrashReport, UserProfile
+from apps.gamification.pagination import encode_token, keyset_paginate
+from apps.gamification.points import award_detections, award_points
+from apps.gamification.search import analyze, rebuild_search_index, search_reports
+from apps.gamification.views.api_trash import REPORT_ORDERINGS
+from apps.security.models import User
+from apps.utils.geo import EARTH_RADIUS_KM, geohash_encode, haversine, haversine_many, haversine_matrix
+from apps.utils.imagehash import BKTree, CellHashIndex, hamming, to_signed
+from apps.waste.models import WasteCategory
+from apps.waste_history.models import WasteDetection
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+
+
+class FakeRedis:
+    """Lo justo de redis-py para los sorted sets que usa RedisBackend."""
+
+    def __init__(self):
+        self.sets = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def zincrby(self, key, delta, member):
+        scores = self.sets.setdefault(key, {})
+        scores[member] = scores.get(member, 0) + delta
+        return scores[member]
+
+    def zadd(self, key, mapping):
+        self.sets.setdefault(key, {}).update(mapping)
+
+    def rename(self, source, target):
+        self.sets[target] = self.sets.pop(source)
+
+    def delete(self, key):
+        self.sets.pop(key, None)
+
+    def expire(self, key, ttl):
+        pass
+
+    def zcard(self, key):
+        return len(self.sets.get(key, {}))
+
+    def _ordered(self, key):
+        return sorted(self.sets.get(key, {}).items(), key=lambda item: (-item[1], item[0]))
+
+    def zrevrange(self, key, start, end, withscores=False):
+        return [(member.encode(), score) for member, score in self._ordered(key)[start:end + 1]]
+
+    def zrevrank(self, key, member):
+        members = [name for name, _ in self._ordered(key)]
+        return members.index(member) if member in members else None
+
+    def zscore(self, key, member):
+        return self.sets.get(key, {}).get(member)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeaderboardBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+
+    def tearDown(self):
+        leaderboard.reset()
+
+    def test_memory_backend_without_redis_cache(self):
+        leaderboard.reset()
+        self.assertIsInstance(leaderboard.backend, MemoryBackend)
+
+    @override_settings(LEADERBOARD_BACKEND='redis')
+    def test_redis_backend_requires_redis_cache(self):
+        leaderboard.reset()
+        with self.assertRaises(RuntimeError):
+            leaderboard.backend
+
+    @override_settings(CACHES=REDIS_CACHES)
+    def test_redis_cache_selects_redis_backend(self):
+        client = FakeRedis()
+        with mock.patch.object(RedisCache, '_cache', new_callable=mock.PropertyMock) as redis_client:
+            redis_client.return_value.get_client.return_value = client
+            leaderboard.reset()
+            self.assertIsInstance(leaderboard.backend, RedisBackend)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                award_points(self.user, 30)
+            self.assertEqual(leaderboard.top(GLOBAL_BOARD), [(1, str(self.user.pk), 30)])
+            self.assertEqual(leaderboard.position(GLOBAL_BOARD, self.user.pk), (1, 30))
+        redis_client.return_value.get_client.assert_called_with(write=True)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEADERBOARD_BACKEND='memory', GAMIFICATION_POINTS={'detection': 10, 'report': 20})
+class LeaderboardSeedingTests(TestCase):
+    def setUp(self):
+        leaderboard.reset()
+        self.ana = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.bea = User.objects.create_user(username='bea', password='secret', email='bea@example.com')
+
+    def tearDown(self):
+        leaderboard.reset()
+
+    def set_points(self, user, points):
+        UserProfile.objects.update_or_create(user=user, defaults={'points': points})
+
+    def test_award_before_first_read_seeds_the_global_board(self):
+        self.set_points(self.ana, 500)
+        self.set_points(self.bea, 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.bea, 10)
+
+        self.assertEqual(leaderboard.top(GLOBAL_BOARD), [
+            (1, str(self.ana.pk), 500),
+            (2, str(self.bea.pk), 110),
+        ])
+
+    def test_boards_survive_a_restart(self):
+        category = WasteCategory.objects.create(name='Plástico', description='-', recycling_instructions='-')
+        for user, count in ((self.ana, 3), (self.bea, 1)):
+            for _ in range(count):
+                WasteDetection.objects.create(user=user, category=category, image='detections/x.jpg', confidence_score=0.9)
+        with self.captureOnCommitCallbacks(execute=True):
+            award_detections()
+        boards = (GLOBAL_BOARD, weekly_board(), category_board(category.pk))
+        before = {board: leaderboard.top(board) for board in boards}
+        self.assertEqual(before[category_board(category.pk)], [(1, str(self.ana.pk), 30), (2, str(self.bea.pk), 10)])
+
+        # Un proceso nuevo empieza con las tablas en memoria vacías
+        leaderboard.reset()
+        self.assertEqual({board: leaderboard.top(board) for board in boards}, before)
+
+        leaderboard.reset()
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.bea, 50, category)
+        self.assertEqual(leaderboard.position(category_board(category.pk), self.bea.pk), (1, 60))
+        self.assertEqual(leaderboard.position(weekly_board(), self.bea.pk), (1, 60))
+
+    def test_backlog_awards_land_on_the_week_of_the_event(self):
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        old = WasteDetection.objects.create(user=self.ana, category=category, image='detections/x.jpg', confidence_score=0.9)
+        three_weeks_ago = timezone.now() - timedelta(weeks=3)
+        WasteDetection.objects.filter(pk=old.pk).update(created_at=three_weeks_ago)
+        WasteDetection.objects.create(user=self.bea, category=category, image='detections/y.jpg', confidence_score=0.9)
+        # Tablas ya sembradas, para que los puntos lleguen por incremento
+        leaderboard.top(weekly_board())
+        leaderboard.top(weekly_board(timezone.localdate(three_weeks_ago)))
+        with self.captureOnCommitCallbacks(execute=True):
+            award_detections()
+        self.assertEqual(leaderboard.top(weekly_board()), [(1, str(self.bea.pk), 10)])
+        self.assertEqual(leaderboard.top(weekly_board(timezone.localdate(three_weeks_ago))), [(1, str(self.ana.pk), 10)])
+        self.assertEqual(weekly_board(), weekly_board(timezone.localdate()))
+
+    def test_a_board_being_seeded_elsewhere_is_not_rebuilt_again(self):
+        self.set_points(self.ana, 70)
+        lock = f'leaderboard:{GLOBAL_BOARD}:seeding'
+        cache.add(lock, 1)
+        self.addCleanup(cache.delete, lock)
+
+        def other_process():
+            leaderboard.backend.replace(GLOBAL_BOARD, [(str(self.ana.pk), 70)])
+            cache.delete(lock)
+
+        seeder = threading.Timer(0.2, other_process)
+        seeder.start()
+        with mock.patch.object(leaderboard, 'rebuild', wraps=leaderboard.rebuild) as rebuild:
+            self.assertFalse(leaderboard._ensure_seeded(GLOBAL_BOARD))
+        seeder.join()
+        rebuild.assert_not_called()
+        self.assertEqual(leaderboard.top(GLOBAL_BOARD), [(1, str(self.ana.pk), 70)])
+
+    def test_a_stale_seed_lock_does_not_block_forever(self):
+        self.set_points(self.ana, 70)
+        cache.add(f'leaderboard:{GLOBAL_BOARD}:seeding', 1)
+        self.addCleanup(cache.delete, f'leaderboard:{GLOBAL_BOARD}:seeding')
+        with mock.patch('apps.gamification.leaderboard.SEED_WAIT', 0.1):
+            self.assertTrue(leaderboard._ensure_seeded(GLOBAL_BOARD))
+        self.assertEqual(leaderboard.top(GLOBAL_BOARD), [(1, str(self.ana.pk), 70)])
+
+
+class RedisBackendReplaceTests(TestCase):
+    def test_rebuilds_stage_under_their_own_key(self):
+        client = FakeRedis()
+        backend = RedisBackend(client)
+        staging = []
+        zadd = client.zadd
+        client.zadd = lambda key, mapping: staging.append(key) or zadd(key, mapping)
+        backend.replace('global', [('1', 10), ('2', 5)], chunk_size=1)
+        backend.replace('global', [('3', 1)])
+        self.assertEqual(len(set(staging)), 2)
+        self.assertEqual(set(client.sets), {backend.key('global')})
+        self.assertEqual(backend.top('global', 10), [('3', 1)])
+
+    def test_failed_rebuild_keeps_the_board_and_drops_the_staging_key(self):
+        client = FakeRedis()
+        backend = RedisBackend(client)
+        backend.replace('global', [('1', 10)])
+        with mock.patch.object(client, 'rename', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                backend.replace('global', [('2', 20)])
+        self.assertEqual(set(client.sets), {backend.key('global')})
+        self.assertEqual(backend.top('global', 10), [('1', 10)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEADERBOARD_BACKEND='memory')
+class LeaderboardViewTests(TestCase):
+    def setUp(self):
+        leaderboard.reset()
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        leaderboard.reset()
+
+    def test_invalid_category_is_a_bad_request(self):
+        url = reverse('gamification:leaderboard')
+        for category in ('abc', '', '999'):
+            response = self.client.get(url, {'board': 'category', 'category': category})
+            self.assertEqual(response.status_code, 400, category)
+
+    def test_category_board(self):
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        response = self.client.get(reverse('gamification:leaderboard'), {'board': 'category', 'category': category.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['board'], category_board(category.pk))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportClusterIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.index = ReportClusterIndex()
+
+    def create_report(self, **fields):
+        values = {'latitude': -0.18, 'longitude': -78.48, 'severity': 2, 'image': 'trash_reports/x.jpg', 'description': '-'}
+        values.update(fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            return TrashReport.objects.create(user=self.user, **values)
+
+    def test_empty_index(self):
+        self.assertEqual(self.index.clusters(3, -180, -90, 180, 90), [])
+
+        self.create_report()
+        clusters = self.index.clusters(3, -180, -90, 180, 90)
+        self.assertEqual([cluster['count'] for cluster in clusters], [1])
+
+    def test_only_closed_reports(self):
+        self.create_report(status='solved')
+        self.assertEqual(self.index.clusters(3, -180, -90, 180, 90), [])
+
+    def test_view_with_no_reports(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('gamification:report-clusters'), {'bbox': '-180,-90,180,90', 'zoom': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['clusters'], [])
+
+    def test_view_rejects_infinite_zoom(self):
+        self.client.force_login(self.user)
+        url = reverse('gamification:report-clusters')
+        for zoom in ('inf', 'nan', '-1'):
+            response = self.client.get(url, {'bbox': '-180,-90,180,90', 'zoom': zoom})
+            self.assertEqual(response.status_code, 400, zoom)
+        response = self.client.get(url, {'bbox': '-180,-90,180,90', 'zoom': '1e300'})
+        self.assertEqual(response.json()['zoom'], self.index.max_zoom + 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HeatmapViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+        TrashReport.objects.create(
+            user=self.user, latitude=-0.18, longitude=-78.48, severity=3, image='trash_reports/x.jpg', description='-'
+        )
+
+    def test_huge_day_window_covers_everything(self):
+        for days in ('1000000', '999999999999'):
+            response = self.client.get(reverse('gamification:report-hotspots'), {'days': days})
+            self.assertEqual(response.status_code, 200, days)
+            self.assertEqual([spot['weight'] for spot in response.json()['hotspots']], [3])
+            response = self.client.get(
+                reverse('gamification:report-heatmap'), {'bbox': '-78.5,-0.2,-78.46,-0.16', 'days': days}
+            )
+            self.assertEqual(response.json()['max'], 3)
+
+    def test_invalid_period(self):
+        for params in ({'days': '-1'}, {'days': 'x'}, {'since': '2026-13-01'}):
+            response = self.client.get(reverse('gamification:report-hotspots'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+def create_report(user, **fields):
+    values = {'latitude': -0.18, 'longitude': -78.48, 'severity': 2, 'image': 'trash_reports/x.jpg', 'description': '-'}
+    values.update(fields)
+    return TrashReport.objects.create(user=user, **values)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class NearbyReportsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+
+    def nearby(self, lat, lng, radius):
+        response = self.client.get(reverse('gamification:nearby-reports'), {'lat': lat, 'lng': lng, 'radius': radius})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['reports']
+
+    def test_matches_a_full_scan(self):
+        rng = random.Random(7)
+        center = (-0.1758, -78.4863)
+        for _ in range(300):
+            create_report(
+                self.user,
+                latitude=round(center[0] + rng.uniform(-0.2, 0.2), 6),
+                longitude=round(center[1] + rng.uniform(-0.2, 0.2), 6),
+            )
+        rows = TrashReport.objects.values_list('id', 'latitude', 'longitude')
+        # Radios que caen en precisiones geohash distintas
+        for radius in (0.5, 2, 8, 30):
+            expected = sorted(
+                (haversine(center[0], center[1], float(lat), float(lng)), report_id)
+                for report_id, lat, lng in rows
+                if haversine(center[0], center[1], float(lat), float(lng)) <= radius
+            )
+            found = self.nearby(*center, radius)
+            self.assertEqual([report['id'] for report in found], [report_id for _, report_id in expected], radius)
+            self.assertEqual([report['distance'] for report in found], sorted(report['distance'] for report in found))
+
+    def test_geohash_is_kept_in_sync(self):
+        report = create_report(self.user)
+        self.assertEqual(report.geohash, geohash_encode(-0.18, -78.48))
+        report.latitude, report.longitude = 40.4168, -3.7038
+        report.save(update_fields=['latitude', 'longitude'])
+        report.refresh_from_db()
+        self.assertEqual(report.geohash, geohash_encode(40.4168, -3.7038))
+        self.assertEqual([row['id'] for row in self.nearby(40.4168, -3.7038, 1)], [report.pk])
+
+    def test_invalid_location(self):
+        response = self.client.get(reverse('gamification:nearby-reports'), {'lat': 'x', 'lng': '1'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HaversineKernelTests(TestCase):
+    def test_vectorized_kernels_match_the_scalar_formula(self):
+        rng = np.random.default_rng(3)
+        lats = rng.uniform(-89, 89, 50)
+        lngs = rng.uniform(-180, 180, 50)
+        expected = np.array([haversine(10.0, 20.0, lat, lng) for lat, lng in zip(lats, lngs)])
+        np.testing.assert_allclose(haversine_many(10.0, 20.0, lats, lngs), expected, rtol=1e-9, atol=1e-9)
+
+        matrix = haversine_matrix(lats[:5], lngs[:5], lats, lngs)
+        self.assertEqual(matrix.shape, (5, 50))
+        np.testing.assert_allclose(matrix[2], haversine_many(lats[2], lngs[2], lats, lngs), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(np.diag(matrix[:, :5]), 0, atol=1e-9)
+
+    def test_antipodes_do_not_produce_nan(self):
+        distance = haversine_many(0, 0, [0.0], [180.0])
+        self.assertFalse(np.isnan(distance).any())
+        self.assertAlmostEqual(float(distance[0]), np.pi * EARTH_RADIUS_KM, places=6)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+        rng = random.Random(11)
+        stamp = timezone.now()
+        for index in range(37):
+            report = create_report(self.user, severity=rng.randint(1, 4))
+            # Fechas repetidas, para que el desempate por id sea necesario
+            TrashReport.objects.filter(pk=report.pk).update(created_at=stamp - timedelta(minutes=index // 4))
+
+    def walk(self, order_by):
+        ids, cursor = [], ''
+        while cursor is not None:
+            page = keyset_paginate(TrashReport.objects.all(), order_by, cursor, 10)
+            ids.extend(report.pk for report in page)
+            cursor = page.next_cursor
+        return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for order_by in REPORT_ORDERINGS:
+            expected = list(TrashReport.objects.order_by(order_by, '-id' if order_by.startswith('-') else 'id').values_list('id', flat=True))
+            self.assertEqual(self.walk(order_by), expected, order_by)
+
+    def test_view_follows_the_next_cursor(self):
+        ids, params = [], {'cursor': '', 'order_by': '-severity'}
+        while True:
+            response = self.client.get(reverse('gamification:reports-view'), params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(report.pk for report in response.context['page_obj'])
+            if response.context['next_page_query'] is None:
+                break
+            params = QueryDict(response.context['next_page_query'])
+        self.assertEqual(sorted(ids), sorted(TrashReport.objects.values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_invalid_cursor(self):
+        for cursor in ('%%%', encode_token(['x', 1]), encode_token(['2024-01-01T00:00:00', 'a'])):
+            response = self.client.get(reverse('gamification:reports-view'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+        self.bottles = create_report(self.user, description='Botellas de plástico junto al río')
+        self.bottle = create_report(self.user, description='Una botella rota en la acera, botella de vidrio')
+        self.tires = create_report(self.user, description='Neumáticos abandonados en el parque', status='verified')
+
+    def search(self, query, reports=None):
+        reports = TrashReport.objects.all() if reports is None else reports
+        return list(search_reports(reports, query).order_by('-search_rank', 'id').values_list('id', flat=True))
+
+    def test_stemmed_and_accent_folded_matches(self):
+        self.assertEqual(analyze('Botellas PLÁSTICO'), ['botell', 'plastic'])
+        self.assertEqual(set(self.search('botella')), {self.bottles.pk, self.bottle.pk})
+        self.assertEqual(self.search('neumatico'), [self.tires.pk])
+        self.assertEqual(self.search('plasticos del rio'), [self.bottles.pk])
+        self.assertEqual(self.search('vidrio parque'), [])
+
+    def test_more_occurrences_rank_first(self):
+        self.assertEqual(self.search('botella'), [self.bottle.pk, self.bottles.pk])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.bottles.description = 'Escombros de construcción'
+        self.bottles.save()
+        self.assertEqual(self.search('botella'), [self.bottle.pk])
+        self.assertEqual(self.search('escombro'), [self.bottles.pk])
+        self.bottle.delete()
+        self.assertEqual(self.search('botella'), [])
+        self.assertEqual(rebuild_search_index(), 2)
+        self.assertEqual(self.search('escombro'), [self.bottles.pk])
+
+    def test_view_combines_search_with_filters(self):
+        response = self.client.get(reverse('gamification:reports-view'), {'search': 'abandonado', 'status': 'verified'})
+        self.assertEqual([report.pk for report in response.context['page_obj']], [self.tires.pk])
+        response = self.client.get(reverse('gamification:reports-view'), {'search': 'abandonado', 'status': 'pending'})
+        self.assertEqual(list(response.context['page_obj']), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+        stamp = timezone.now() - timedelta(hours=1)
+        for index in range(23):
+            report = create_report(self.user, description=f'Reporte {index}')
+            # Grupos de reportes con el mismo updated_at
+            TrashReport.objects.filter(pk=report.pk).update(updated_at=stamp + timedelta(seconds=index // 5))
+
+    def export(self, **params):
+        response = self.client.get(reverse('gamification:report-json'), params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        if params.get('format') == 'ndjson':
+            return [json.loads(line) for line in body.splitlines()]
+        return json.loads(body)
+
+    def test_full_export_as_json_and_ndjson(self):
+        rows = self.export()
+        self.assertEqual([row['id'] for row in rows], sorted(TrashReport.objects.values_list('id', flat=True)))
+        self.assertEqual(self.export(format='ndjson'), rows)
+
+    def test_since_and_after_id_page_through_ties(self):
+        ids, params = [], {'since': '2000-01-01T00:00:00+00:00', 'after_id': 0, 'limit': 4}
+        while True:
+            rows = self.export(**params)
+            if not rows:
+                break
+            ids.extend(row['id'] for row in rows)
+            params.update(since=rows[-1]['updated_at'], after_id=rows[-1]['id'])
+        expected = TrashReport.objects.order_by('updated_at', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_since_returns_only_later_changes(self):
+        last = self.export()[-1]
+        self.assertEqual(self.export(since=last['updated_at']), [])
+        report = TrashReport.objects.order_by('id').first()
+        report.status = 'verified'
+        report.save()
+        self.assertEqual([row['id'] for row in self.export(since=last['updated_at'])], [report.pk])
+
+    def test_invalid_parameters(self):
+        for params in ({'limit': 'x'}, {'limit': 0}, {'since': 'ayer'},
+                       {'since': '2024-01-01T00:00:00', 'limit': 5},
+                       {'since': '2024-01-01T00:00:00', 'after_id': 'x'}):
+            response = self.client.get(reverse('gamification:report-json'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REPORT_CHANGES_OVERLAP_SECONDS=30)
+class ReportChangesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+
+    def changes(self, token=''):
+        response = self.client.get(reverse('gamification:report-changes'), {'since': token})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, token=''):
+        """Pide páginas hasta que has_more es falso; devuelve ids recibidos, bajas y token."""
+        ids, deleted = set(), set()
+        while True:
+            body = self.changes(token)
+            ids.update(report['id'] for report in body['reports'])
+            deleted.update(body['deleted'])
+            token = body['token']
+            if not body['has_more']:
+                return ids, deleted, token
+
+    def test_late_commit_behind_the_watermark_is_delivered(self):
+        first = create_report(self.user)
+        ids, _, token = self.sync()
+        self.assertEqual(ids, {first.pk})
+
+        # Una transacción que guardó antes que otra ya entregada y confirmó después
+        later = create_report(self.user)
+        late = create_report(self.user)
+        TrashReport.objects.filter(pk=late.pk).update(updated_at=later.updated_at - timedelta(seconds=5))
+        ids, _, _ = self.sync(token)
+        self.assertIn(later.pk, ids)
+        self.assertIn(late.pk, ids)
+
+    def test_rows_outside_the_margin_are_not_resent(self):
+        old = create_report(self.user)
+        TrashReport.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(minutes=10))
+        recent = create_report(self.user)
+        ids, _, token = self.sync()
+        self.assertEqual(ids, {old.pk, recent.pk})
+        for _ in range(2):
+            # Sin cambios solo se repite el margen, y el token no retrocede
+            ids, _, token = self.sync(token)
+            self.assertEqual(ids, {recent.pk})
+
+    def test_pages_and_deletions(self):
+        reports = [create_report(self.user) for _ in range(7)]
+        _, _, token = self.sync()
+        deleted_id = reports[0].pk
+        reports.pop(0).delete()
+        with mock.patch('apps.gamification.views.api_trash.CHANGES_PAGE_SIZE', 2):
+            body = self.changes(token)
+            self.assertTrue(body['has_more'])
+            self.assertEqual(body['deleted'], [deleted_id])
+            ids, _, _ = self.sync(body['token'])
+        self.assertEqual(ids | {report['id'] for report in body['reports']}, {report.pk for report in reports})
+
+    def test_invalid_token(self):
+        for token in ('%%%', encode_token({'u': 'ayer'}), encode_token({'w': 'x'}), encode_token([1])):
+            response = self.client.get(reverse('gamification:report-changes'), {'since': token})
+            self.assertEqual(response.status_code, 400, token)
+
+
+def jpeg_bytes(size=(64, 48), color=(200, 30, 30), exif=None):
+    image = Image.new('RGB', size, color)
+    # Una franja oscura para que la foto tenga orientación reconocible
+    image.paste((0, 0, 0), (0, 0, size[0] // 4, size[1]))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', **({'exif': exif} if exif is not None else {}))
+    return buffer.getvalue()
+
+
+def use_temporary_media(test):
+    """MEDIA_ROOT en un directorio temporal que se borra al terminar la prueba."""
+    root = tempfile.mkdtemp()
+    media = override_settings(MEDIA_ROOT=root)
+    media.enable()
+    test.addCleanup(media.disable)
+    test.addCleanup(shutil.rmtree, root, ignore_errors=True)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReportImagePipelineTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        queue = mock.patch.object(image_queue, 'run_async', False)
+        queue.start()
+        self.addCleanup(queue.stop)
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+
+    def create_with_photo(self, content, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = create_report(self.user, image=SimpleUploadedFile('foto.jpg', content, 'image/jpeg'), **fields)
+            schedule_report_image(report.pk)
+        report.refresh_from_db()
+        return report
+
+    def test_renditions_are_generated_after_commit(self):
+        report = self.create_with_photo(jpeg_bytes())
+        self.assertEqual((report.image_width, report.image_height), (64, 48))
+        self.assertIsNotNone(report.image_hash)
+        for field, bound in ((report.thumbnail, THUMBNAIL_SIZE), (report.image_medium, MEDIUM_SIZE)):
+            with field.open('rb') as rendition:
+                image = Image.open(rendition)
+                self.assertEqual(image.format, 'WEBP')
+                self.assertLessEqual(image.size, bound)
+        self.assertEqual(report.thumbnail_url, report.thumbnail.url)
+
+    def test_exif_is_applied_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotar 90 grados al mostrar
+        exif[0x010F] = 'Telefono'
+        original = self.create_with_photo(jpeg_bytes(exif=exif.tobytes()))
+        self.assertEqual((original.image_width, original.image_height), (48, 64))
+        with original.image.open('rb') as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (48, 64))
+            self.assertEqual(dict(image.getexif()), {})
+
+    @override_settings(GAMIFICATION_POINTS={'detection': 10, 'report': 20, 'recurring_report': 5})
+    def test_repeated_photo_is_flagged_and_earns_recurring_points(self):
+        content = jpeg_bytes()
+        first = self.create_with_photo(content)
+        self.assertEqual((first.is_recurring, first.points_awarded), (False, True))
+        self.assertEqual(UserProfile.objects.get(user=self.user).points, 20)
+
+        repeat = self.create_with_photo(content, latitude=-0.1801, longitude=-78.4801)
+        self.assertEqual((repeat.is_recurring, repeat.points_awarded), (True, True))
+        elsewhere = self.create_with_photo(content, latitude=-0.25, longitude=-78.48)
+        self.assertFalse(elsewhere.is_recurring)
+        self.assertEqual(UserProfile.objects.get(user=self.user).points, 20 + 5 + 20)
+
+    def test_missing_report_or_photo_is_ignored(self):
+        process_report_image(0)
+        report = create_report(self.user, image='')
+        process_report_image(report.pk)
+        report.refresh_from_db()
+        self.assertFalse(report.thumbnail)
+
+
+class ImageHashIndexTests(TestCase):
+    def test_bk_tree_search_matches_a_full_scan(self):
+        rng = random.Random(13)
+        hashes = [rng.getrandbits(64) for _ in range(500)]
+        # Variantes cercanas para que haya resultados en radios pequeños
+        hashes += [value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value in hashes[:100]]
+        tree = BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(to_signed(value), index)
+        for query in hashes[:20]:
+            for radius in (0, 2, 8, 20):
+                expected = sorted(index for index, value in enumerate(hashes) if hamming(query, value) <= radius)
+                found = sorted(index for _, _, index in tree.search(to_signed(query), radius))
+                self.assertEqual(found, expected, radius)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_near_duplicates_respect_the_bit_and_distance_thresholds(self):
+        base = 0x0F0F_F0F0_1234_5678
+        rows = [
+            ('igual', base, -0.18, -78.48),
+            ('limite', base ^ 0xFF, -0.1802, -78.48),  # 8 bits distintos
+            ('fuera', base ^ 0x1FF, -0.18, -78.4801),  # 9 bits distintos
+            ('lejos', base, -0.1810, -78.48),  # unos 110 m
+        ]
+        index = CellHashIndex('tests:hashes', lambda cell: [row for row in rows if geohash_encode(row[2], row[3], 7) == cell])
+        matches = index.near_duplicates(-0.18, -78.48, to_signed(base), max_distance=8, radius_km=0.05, exclude='igual')
+        self.assertEqual([(item_id, bits) for item_id, bits, _ in matches], [('limite', 8)])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEADERBOARD_BACKEND='memory', GAMIFICATION_POINTS={'detection': 10, 'report': 20})
+class AwardClaimTests(TestCase):
+    def setUp(self):
+        leaderboard.reset()
+        self.addCleanup(leaderboard.reset)
+        use_temporary_media(self)
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        for _ in range(5):
+            WasteDetection.objects.create(user=self.user, category=category, image='detections/x.jpg', confidence_score=0.9)
+
+    def test_rows_taken_by_another_worker_are_not_counted_again(self):
+        values_list = QuerySet.values_list
+
+        def racing_values_list(queryset, *fields, **kwargs):
+            rows = values_list(queryset, *fields, **kwargs)
+            if queryset.model is WasteDetection and fields == ('pk',):
+                rows = list(rows)
+                # Otro proceso premia dos de los mismos ids después de leerlos aquí
+                WasteDetection.objects.filter(pk__in=rows[:2]).update(points_awarded=True)
+            return rows
+
+        with mock.patch.object(QuerySet, 'values_list', racing_values_list):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(award_detections(), 3)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.points, profile.total_detections), (30, 3))
+        self.assertFalse(WasteDetection.objects.filter(points_awarded=False).exists())
+        self.assertEqual(award_detections(), 0)
+
+    def test_failed_image_queue_does_not_fail_the_create(self):
+        upload = SimpleUploadedFile('foto.jpg', jpeg_bytes(), 'image/jpeg')
+        data = {'image': upload, 'latitude': '-0.18', 'longitude': '-78.48', 'description': '-', 'severity': '2'}
+        with mock.patch('apps.gamification.views.api_trash.schedule_report_image', side_effect=RuntimeError('cola caída')):
+            with self.assertLogs('apps.gamification.views.api_trash', 'ERROR'):
+                response = self.client.post(reverse('gamification:report-create'), data)
+        self.assertEqual(response.status_code, 200)
+        report = TrashReport.objects.get(pk=response.json()['id'])
+        self.assertFalse(report.points_awarded)
+
+    def test_invalid_report_is_a_bad_request(self):
+        upload = SimpleUploadedFile('foto.jpg', jpeg_bytes(), 'image/jpeg')
+        response = self.client.post(reverse('gamification:report-create'), {'image': upload, 'severity': '2'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TrashReport.objects.exists())
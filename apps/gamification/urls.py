@@ -1,7 +1,8 @@
 from rest_framework_nested import routers
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from apps.gamification.views.api_trash import trash_report_list, EducationView, trash_view, list_reports, trash_report_detail, trash_report_create, nearby_reports, change_report_status, add_comment
+from apps.gamification.views.leaderboard import leaderboard_view
+from apps.gamification.views.api_trash import trash_report_list, EducationView, trash_view, list_reports, trash_report_detail, trash_report_create, nearby_reports, report_clusters, report_heatmap, report_hotspots, change_report_status, add_comment, report_changes
 
 app_name = 'gamification'
 
@@ -9,11 +10,16 @@ urlpatterns = [
     path('reports/', trash_report_list, name='report-form'),
     path('reports/view/', trash_view, name="reports-view"),
     path('reports/list/', list_reports, name='report-json'),
+    path('reports/changes/', report_changes, name='report-changes'),
     path('reports/<int:pk>/', trash_report_detail, name='report-detail'),
     path('reports/create/', trash_report_create, name='report-create'),
     path('reports/nearby/',nearby_reports, name='nearby-reports'),
+    path('reports/clusters/', report_clusters, name='report-clusters'),
+    path('reports/heatmap/', report_heatmap, name='report-heatmap'),
+    path('reports/hotspots/', report_hotspots, name='report-hotspots'),
     path('reports/<int:pk>/status/', change_report_status, name='change-status'),
     path('reports/<int:report_pk>/comments/', add_comment, name='add-comment'),
     path('education/', EducationView.as_view(), name='education'),
+    path('leaderboard/', leaderboard_view, name='leaderboard'),
 
 ]
\ No newline at end of file
@@ -1,110 +1,293 @@
-import math
 import json
+import logging
+import math
+from datetime import date, timedelta, timezone as dt_timezone
+import numpy as np
 from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.paginator import Paginator
 from django.views.generic import TemplateView
 from django.views.decorators.http import require_http_methods
-from apps.gamification.models import TrashReport, ReportComment
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.gamification.clusters import report_clusters as report_clusters_index
+from apps.gamification import heatmap
+from apps.gamification.images import schedule_report_image
+from apps.gamification.models import TrashReport, ReportComment, ReportTombstone
+from apps.gamification.pagination import InvalidCursor, decode_token, encode_token, keyset_paginate
+from apps.gamification.search import search_reports
+from apps.utils.geo import (
+    haversine_many, bounding_box, geohash_neighbourhood, geohash_precision_for_radius, geohash_range
+)
 
-def haversine(lat1, lon1, lat2, lon2):
-    """Calculate the great circle distance between two points on Earth."""
-    R = 6371  # Radio de la Tierra en km
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
 
-    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+logger = logging.getLogger(__name__)
 
-    return R * c
+REPORT_ORDERINGS = ['created_at', '-created_at', 'severity', '-severity']
+REPORTS_PER_PAGE = 10
 
-@login_required
-def trash_report_list(request):
-    """Vista para listar todos los reportes de basura."""
-    reports = TrashReport.objects.all().order_by('-created_at')
+
+def _report_list_context(request):
+    """Filtra, ordena y pagina los reportes según los parámetros de la petición."""
+    reports = TrashReport.objects.select_related('user').order_by('-created_at')
     # Filtrado por estado
     status_filter = request.GET.get('status')
     if status_filter:
         reports = reports.filter(status=status_filter)
     
-    # Búsqueda por descripción
+    # Búsqueda de texto completo por descripción
     search_query = request.GET.get('search')
     if search_query:
-        reports = reports.filter(description__icontains=search_query)
+        reports = search_reports(reports, search_query)
     
-    # Ordenamiento
+    # Ordenamiento: por relevancia al buscar, salvo que se pida otro orden
     order_by = request.GET.get('order_by', '-created_at')
-    if order_by in ['created_at', '-created_at', 'severity', '-severity']:
+    if order_by in REPORT_ORDERINGS:
         reports = reports.order_by(order_by)
+    else:
+        order_by = '-created_at'
+    if search_query and 'order_by' not in request.GET and 'cursor' not in request.GET:
+        reports = reports.order_by('-search_rank', '-created_at')
     
-    # Paginación
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(reports, 10)
-    page_obj = paginator.get_page(page_number)
+    # Paginación: por cursor si se solicita (?cursor=), por número de página en otro caso
+    next_page_query = None
+    if 'cursor' in request.GET:
+        page_obj = keyset_paginate(reports, order_by, request.GET['cursor'], REPORTS_PER_PAGE)
+        if page_obj.has_next():
+            query = request.GET.copy()
+            query['cursor'] = page_obj.next_cursor
+            next_page_query = query.urlencode()
+    else:
+        page_number = request.GET.get('page', 1)
+        paginator = Paginator(reports, REPORTS_PER_PAGE)
+        page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
+        'next_page_query': next_page_query,
         'severity_choices': TrashReport.SEVERITY_CHOICES,
         'current_status': status_filter,
         'search_query': search_query,
         'order_by': order_by,
     }
     context['maptiler_key'] = "eOJz2rYdmVnQEiFjpgcP"
+    return context
+
+@login_required
+def trash_report_list(request):
+    """Vista para listar todos los reportes de basura."""
+    try:
+        context = _report_list_context(request)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor de paginación inválido')
     return render(request, 'report.html', context)
 
 @login_required
 def trash_view(request):
     """Vista para listar todos los reportes de basura."""
-    reports = TrashReport.objects.all().order_by('-created_at')
-    # Filtrado por estado
-    status_filter = request.GET.get('status')
-    if status_filter:
-        reports = reports.filter(status=status_filter)
-    
-    # Búsqueda por descripción
-    search_query = request.GET.get('search')
-    if search_query:
-        reports = reports.filter(description__icontains=search_query)
-    
-    # Ordenamiento
-    order_by = request.GET.get('order_by', '-created_at')
-    if order_by in ['created_at', '-created_at', 'severity', '-severity']:
-        reports = reports.order_by(order_by)
-    
-    # Paginación
-    page_number = request.GET.get('page', 1)
-    paginator = Paginator(reports, 10)
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'page_obj': page_obj,
-        'severity_choices': TrashReport.SEVERITY_CHOICES,
-        'current_status': status_filter,
-        'search_query': search_query,
-        'order_by': order_by,
-    }
-    context['maptiler_key'] = "eOJz2rYdmVnQEiFjpgcP"
+    try:
+        context = _report_list_context(request)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor de paginación inválido')
     return render(request, 'list_report.html', context)
 
+EXPORT_CHUNK_SIZE = 500
+
+
+def _export_rows(reports, limit=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Recorre los reportes por lotes y los proyecta al formato de exportación."""
+    storage = TrashReport._meta.get_field('image').storage
+    rows = reports.values('id', 'description', 'longitude', 'severity', 'status', 'image', 'thumbnail', 'updated_at')
+    if limit:
+        rows = rows[:limit]
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'id': row['id'],
+            'description': row['description'],
+            'location': row['longitude'],
+            'severity': row['severity'],
+            'status': row['status'],
+            'image_url': storage.url(row['image']) if row['image'] else '',
+            'thumbnail_url': storage.url(row['thumbnail'] or row['image']) if row['image'] else '',
+            # isoformat completo: DjangoJSONEncoder recorta a milisegundos y since perdería precisión
+            'updated_at': row['updated_at'].isoformat(),
+        }
+
+
+def _stream_json(rows, ndjson=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Serializa las filas de forma incremental como arreglo JSON o NDJSON."""
+    encoder = DjangoJSONEncoder()
+    buffer = [] if ndjson else ['[']
+    first = True
+
+    for row in rows:
+        encoded = encoder.encode(row)
+        if ndjson:
+            buffer.append(encoded + '\n')
+        else:
+            buffer.append(encoded if first else ',' + encoded)
+        first = False
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+
+    if not ndjson:
+        buffer.append(']')
+    if buffer:
+        yield ''.join(buffer)
+
+
 @login_required
+@require_http_methods(["GET"])
 def list_reports(request):
-    reports = TrashReport.objects.all()  # O puedes filtrar según la lógica que desees
-    report_data = []
-    
-    for report in reports:
-        report_data.append({
-            'description': report.description,
-            'location': report.longitude,  # Asegúrate de tener esta información en el modelo
-            'severity': report.severity,
-            'status': report.status,
-            'image_url': report.image.url if report.image else '',  # Ajusta el campo de imagen
-        })
-    
-    return JsonResponse(report_data, safe=False)
+    """
+    Exporta los reportes como JSON transmitido por partes.
+
+    ``format=ndjson`` devuelve un objeto por línea. ``since`` (ISO 8601) limita la
+    exportación a los reportes modificados después de esa fecha y ``limit`` al
+    número indicado, para que los mapas pidan solo los cambios. Con ``limit``,
+    ``since`` y ``after_id`` son el ``updated_at`` y el ``id`` del último
+    reporte recibido: varios reportes pueden compartir ``updated_at`` y sin el
+    id los que quedaran tras el corte se perderían.
+    """
+    reports = TrashReport.objects.order_by('id')
+
+    limit = request.GET.get('limit')
+    if limit:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return HttpResponseBadRequest('Parámetro limit inválido')
+        if limit < 1:
+            return HttpResponseBadRequest('Parámetro limit inválido')
+
+    since = request.GET.get('since')
+    if since:
+        try:
+            since_date = parse_datetime(since)
+        except ValueError:
+            since_date = None
+        if since_date is None:
+            return HttpResponseBadRequest('Parámetro since inválido')
+        if timezone.is_naive(since_date):
+            since_date = timezone.make_aware(since_date, dt_timezone.utc)
+
+        after_id = request.GET.get('after_id')
+        if after_id:
+            try:
+                after_id = int(after_id)
+            except ValueError:
+                return HttpResponseBadRequest('Parámetro after_id inválido')
+            changed = Q(updated_at__gt=since_date) | Q(updated_at=since_date, id__gt=after_id)
+        elif limit:
+            return HttpResponseBadRequest('limit junto con since requiere after_id')
+        else:
+            changed = Q(updated_at__gt=since_date)
+        reports = reports.filter(changed).order_by('updated_at', 'id')
+
+    ndjson = request.GET.get('format') == 'ndjson'
+    content_type = 'application/x-ndjson' if ndjson else 'application/json'
+    return StreamingHttpResponse(_stream_json(_export_rows(reports, limit), ndjson=ndjson), content_type=content_type)
+
+CHANGES_PAGE_SIZE = 500
+
+
+def _changes_overlap():
+    return timedelta(seconds=getattr(settings, 'REPORT_CHANGES_OVERLAP_SECONDS', 30))
+
+
+def _parse_token_date(value):
+    if value is None:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('Fecha inválida')
+    return parsed
+
+
+@login_required
+@require_http_methods(["GET"])
+def report_changes(request):
+    """
+    Sincronización incremental de reportes para los mapas.
+
+    Devuelve los reportes creados o modificados y los ids eliminados desde
+    ``since`` (token devuelto por la llamada anterior; vacío para la carga
+    inicial), junto con el token siguiente. Si ``has_more`` es verdadero el
+    cliente debe volver a pedir con el nuevo token. Un mismo reporte puede
+    llegar más de una vez: el cliente lo reemplaza por id.
+    """
+    try:
+        since = decode_token(request.GET['since']) if request.GET.get('since') else {}
+        # u/i: posición dentro de una sincronización paginada; w: updated_at más alto entregado
+        updated_at = _parse_token_date(since.get('u'))
+        last_id = int(since.get('i', 0))
+        watermark = _parse_token_date(since.get('w'))
+        last_tombstone = int(since.get('t', 0))
+    except (InvalidCursor, AttributeError, TypeError, ValueError):
+        return HttpResponseBadRequest('Token de sincronización inválido')
+
+    if not since:
+        # En la carga inicial no hay nada que borrar en el cliente
+        last_tombstone = ReportTombstone.objects.aggregate(last=Max('id'))['last'] or 0
+
+    if updated_at is None and watermark is not None:
+        # updated_at se fija al guardar, no al confirmar la transacción: una fila que confirma
+        # tarde puede quedar por detrás de otras ya entregadas. Cada sincronización vuelve a
+        # leer este margen antes de la marca para recogerlas
+        updated_at, last_id = watermark - _changes_overlap(), 0
+
+    reports = TrashReport.objects.order_by('updated_at', 'id')
+    if updated_at is not None:
+        reports = reports.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id))
+    rows = list(reports.values(
+        'id', 'latitude', 'longitude', 'description', 'severity', 'status',
+        'is_recurring', 'image', 'thumbnail', 'created_at', 'updated_at'
+    )[:CHANGES_PAGE_SIZE + 1])
+
+    tombstones = list(
+        ReportTombstone.objects.filter(id__gt=last_tombstone)
+        .order_by('id').values_list('id', 'report_id')[:CHANGES_PAGE_SIZE + 1]
+    )
+
+    more_reports = len(rows) > CHANGES_PAGE_SIZE
+    has_more = more_reports or len(tombstones) > CHANGES_PAGE_SIZE
+    rows = rows[:CHANGES_PAGE_SIZE]
+    tombstones = tombstones[:CHANGES_PAGE_SIZE]
+
+    if rows and (watermark is None or rows[-1]['updated_at'] > watermark):
+        watermark = rows[-1]['updated_at']
+    token = {'t': tombstones[-1][0] if tombstones else last_tombstone}
+    if watermark is not None:
+        token['w'] = watermark.isoformat()
+    if more_reports:
+        token['u'] = rows[-1]['updated_at'].isoformat()
+        token['i'] = rows[-1]['id']
+
+    storage = TrashReport._meta.get_field('image').storage
+    return JsonResponse({
+        'reports': [{
+            'id': row['id'],
+            'latitude': float(row['latitude']),
+            'longitude': float(row['longitude']),
+            'description': row['description'],
+            'severity': row['severity'],
+            'status': row['status'],
+            'is_recurring': row['is_recurring'],
+            'image_url': storage.url(row['image']) if row['image'] else '',
+            'thumbnail_url': storage.url(row['thumbnail'] or row['image']) if row['image'] else '',
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+        } for row in rows],
+        'deleted': [report_id for _, report_id in tombstones],
+        'token': encode_token(token),
+        'has_more': has_more,
+    })
 
 @login_required
 def trash_report_detail(request, pk):
@@ -128,23 +311,33 @@ def trash_report_create(request):
         if not image:
             return HttpResponseBadRequest('La imagen es requerida')
         
-        report = TrashReport.objects.create(
-            user=request.user,
-            latitude=request.POST.get('latitude'),
-            longitude=request.POST.get('longitude'),
-            image=image,
-            description=request.POST.get('description'),
-            severity=request.POST.get('severity'),
-            is_recurring=request.POST.get('is_recurring') == 'true'
-        )
-        
-        return JsonResponse({
-            'id': report.id,
-            'message': 'Reporte creado exitosamente'
-        })
+        # Con las escrituras de sus señales: un reporte inválido no deja nada a medias
+        with transaction.atomic():
+            report = TrashReport.objects.create(
+                user=request.user,
+                latitude=request.POST.get('latitude'),
+                longitude=request.POST.get('longitude'),
+                image=image,
+                description=request.POST.get('description'),
+                severity=request.POST.get('severity'),
+                is_recurring=request.POST.get('is_recurring') == 'true'
+            )
     except Exception as e:
         return HttpResponseBadRequest(str(e))
 
+    # Miniaturas, limpieza de EXIF y puntos fuera del ciclo de la petición. El reporte ya
+    # está guardado: si no se puede encolar, queda pendiente para process_report_images
+    # y award_points_backlog en vez de responder con un error
+    try:
+        schedule_report_image(report.id)
+    except Exception:
+        logger.exception('Could not queue image processing for report %s', report.id)
+
+    return JsonResponse({
+        'id': report.id,
+        'message': 'Reporte creado exitosamente'
+    })
+
 @login_required
 @require_http_methods(["GET"])
 def nearby_reports(request):
@@ -156,24 +349,128 @@ def nearby_reports(request):
     except (TypeError, ValueError):
         return HttpResponseBadRequest('Parámetros de ubicación inválidos')
 
-    reports = TrashReport.objects.all()
-    nearby_reports = []
+    # Prefiltro por caja envolvente sobre lat/lng indexados
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+    reports = TrashReport.objects.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lng is not None:
+        reports = reports.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+
+    # Solo las celdas geohash que pueden contener el círculo de búsqueda
+    precision = geohash_precision_for_radius(lat, radius)
+    if precision:
+        cells = Q()
+        for cell in geohash_neighbourhood(lat, lng, precision):
+            start, end = geohash_range(cell)
+            cells |= Q(geohash__gte=start, geohash__lt=end)
+        reports = reports.filter(cells)
 
-    for report in reports:
-        distance = haversine(lat, lng, float(report.latitude), float(report.longitude))
-        if distance <= radius:
-            nearby_reports.append({
-                'id': report.id,
-                'latitude': float(report.latitude),
-                'longitude': float(report.longitude),
-                'description': report.description,
-                'severity': report.severity,
-                'status': report.status,
-                'distance': round(distance, 2)
-            })
+    candidates = list(reports.values('id', 'latitude', 'longitude', 'description', 'severity', 'status'))
+    if not candidates:
+        return JsonResponse({'reports': []})
+
+    lats = np.fromiter((report['latitude'] for report in candidates), dtype=np.float64, count=len(candidates))
+    lngs = np.fromiter((report['longitude'] for report in candidates), dtype=np.float64, count=len(candidates))
+    distances = haversine_many(lat, lng, lats, lngs)
+
+    nearby_reports = []
+    for index in np.argsort(distances, kind='stable'):
+        distance = float(distances[index])
+        if distance > radius:
+            break
+        report = candidates[index]
+        nearby_reports.append({
+            'id': report['id'],
+            'latitude': float(lats[index]),
+            'longitude': float(lngs[index]),
+            'description': report['description'],
+            'severity': report['severity'],
+            'status': report['status'],
+            'distance': round(distance, 2)
+        })
 
     return JsonResponse({'reports': nearby_reports})
 
+@login_required
+@require_http_methods(["GET"])
+def report_clusters(request):
+    """
+    Grupos de reportes abiertos visibles en ``bbox`` (oeste,sur,este,norte) al
+    nivel ``zoom``, con centroide, recuento e histograma de severidad, para que
+    el mapa no tenga que agrupar miles de marcadores en el cliente.
+    """
+    try:
+        west, south, east, north = (float(value) for value in request.GET['bbox'].split(','))
+        zoom = float(request.GET['zoom'])
+    except (KeyError, TypeError, ValueError):
+        return HttpResponseBadRequest('Parámetros bbox o zoom inválidos')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180
+            and math.isfinite(zoom) and zoom >= 0):
+        return HttpResponseBadRequest('Parámetros bbox o zoom fuera de rango')
+    # Por encima de max_zoom todos los niveles devuelven los reportes sueltos
+    zoom = min(int(zoom), report_clusters_index.max_zoom + 1)
+
+    return JsonResponse({
+        'zoom': zoom,
+        'clusters': report_clusters_index.clusters(zoom, west, south, east, north),
+    })
+
+def _heatmap_period(params):
+    """Ventana de días (``days``, o ``since``/``until`` en YYYY-MM-DD) del mapa de calor."""
+    period = {}
+    for name in ('since', 'until'):
+        if params.get(name):
+            period[name] = date.fromisoformat(params[name])
+    if params.get('days'):
+        days = int(params['days'])
+        if days < 0:
+            raise ValueError('days')
+        try:
+            period['since'] = timezone.localdate() - timedelta(days=days)
+        except OverflowError:
+            # Una ventana más larga que el calendario es lo mismo que no filtrar
+            period.pop('since', None)
+    return period
+
+def _heatmap_bbox(value):
+    west, south, east, north = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox')
+    return west, south, east, north
+
+@login_required
+@require_http_methods(["GET"])
+def report_heatmap(request):
+    """
+    Raster de densidad de reportes dentro de ``bbox`` (oeste,sur,este,norte),
+    ponderado por severidad y recurrencia, a partir de los recuentos por
+    celda que se mantienen al guardar los reportes.
+    """
+    try:
+        bbox = _heatmap_bbox(request.GET['bbox'])
+        period = _heatmap_period(request.GET)
+    except (KeyError, TypeError, ValueError):
+        return HttpResponseBadRequest('Parámetros bbox, days, since o until inválidos')
+
+    return JsonResponse(heatmap.density(*bbox, **period))
+
+@login_required
+@require_http_methods(["GET"])
+def report_hotspots(request):
+    """Las celdas con más peso de reportes, en todo el mapa o dentro de ``bbox``."""
+    try:
+        bbox = _heatmap_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+        period = _heatmap_period(request.GET)
+        limit = min(int(request.GET.get('limit', 10)), getattr(settings, 'HEATMAP_HOTSPOTS_MAX', 100))
+        if limit < 1:
+            raise ValueError('limit')
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest('Parámetros bbox, limit, days, since o until inválidos')
+
+    return JsonResponse({
+        'cell_size': heatmap.cell_degrees(),
+        'hotspots': heatmap.hotspots(limit, bbox, **period),
+    })
+
 @login_required
 @require_http_methods(["POST"])
 def change_report_status(request, pk):
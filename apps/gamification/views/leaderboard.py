@@ -0,0 +1,63 @@
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from apps.gamification.leaderboard import GLOBAL_BOARD, category_board, leaderboard, weekly_board
+from apps.security.models import User
+from apps.waste.models import WasteCategory
+
+LEADERBOARD_MAX_LIMIT = 100
+
+
+def _display_name(user):
+    if user is None:
+        return ''
+    return user.get_full_name() or user.username or ''
+
+
+@login_required
+@require_http_methods(["GET"])
+def leaderboard_view(request):
+    """Top N de una tabla (global, weekly o category) y la posición del usuario actual."""
+    board_type = request.GET.get('board', 'global')
+    if board_type == 'global':
+        board = GLOBAL_BOARD
+    elif board_type == 'weekly':
+        board = weekly_board()
+    elif board_type == 'category':
+        try:
+            category_id = int(request.GET['category'])
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest('Categoría no válida')
+        if not WasteCategory.objects.filter(pk=category_id).exists():
+            return HttpResponseBadRequest('Categoría no válida')
+        board = category_board(category_id)
+    else:
+        return HttpResponseBadRequest('Tabla no válida')
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), LEADERBOARD_MAX_LIMIT)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        return HttpResponseBadRequest('Parámetros de paginación inválidos')
+
+    entries = leaderboard.top(board, limit, offset)
+    users = {
+        str(user.pk): user
+        for user in User.objects.filter(pk__in=[user_id for _, user_id, _ in entries])
+    }
+    rank, points = leaderboard.position(board, request.user.pk)
+
+    return JsonResponse({
+        'board': board,
+        'entries': [
+            {
+                'rank': position,
+                'user_id': user_id,
+                'name': _display_name(users.get(user_id)),
+                'points': score,
+            }
+            for position, user_id, score in entries
+        ],
+        'me': {'rank': rank, 'points': points},
+    })
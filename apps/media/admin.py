@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from apps.media.models import StoredBlob
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name', 'digest')
+    ordering = ('-created_at',)
+    readonly_fields = ('name', 'digest', 'size', 'refcount', 'created_at')
@@ -0,0 +1,112 @@
+# apps/media/management/commands/migrate_media_storage.py
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from apps.media.models import StoredBlob
+from apps.media.storage import ContentAddressedStorage, content_addressed_fields, hash_file
+
+
+def format_size(size):
+    return f'{size / 2**20:.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Move existing media files into content-addressed storage and report the space saved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only hash the files and report the savings')
+        parser.add_argument('--keep-originals', action='store_true', help='Do not delete the old files after moving them')
+        parser.add_argument('--recount', action='store_true', help='Rebuild reference counts from the model fields and drop orphan blobs')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage; check STORAGES in settings.')
+
+        if options['recount']:
+            self.recount()
+            return
+
+        storage = default_storage
+        moved = {}  # nombre anterior -> blob
+        blob_sizes = {}
+        bytes_before = 0
+        rows = 0
+        missing = 0
+
+        for model, field in content_addressed_fields():
+            queryset = model._base_manager.exclude(**{f'{field.attname}__isnull': True}).exclude(
+                **{field.attname: ''}
+            ).exclude(**{f'{field.attname}__startswith': f'{storage.prefix}/'})
+
+            for pk, name in queryset.values_list('pk', field.attname).iterator():
+                if name not in moved:
+                    if not storage.backend.exists(name):
+                        missing += 1
+                        self.stderr.write(f'{model._meta.label}.{field.name} #{pk}: {name} not found')
+                        continue
+                    with storage.backend.open(name, 'rb') as content:
+                        if options['dry_run']:
+                            digest, size = hash_file(content)
+                            moved[name] = storage.blob_name(digest, name)
+                        else:
+                            size = content.size
+                            moved[name] = storage.save(name, content)
+                    bytes_before += size
+                    blob_sizes[moved[name]] = size
+                elif not options['dry_run']:
+                    storage.retain(moved[name])
+
+                if not options['dry_run']:
+                    model._base_manager.filter(pk=pk).update(**{field.attname: moved[name]})
+                rows += 1
+
+        if not options['dry_run'] and not options['keep_originals']:
+            # storage.delete no toca las rutas anteriores al almacenamiento por contenido
+            for name in moved:
+                storage.backend.delete(name)
+
+        bytes_after = sum(blob_sizes.values())
+        saved = bytes_before - bytes_after
+        ratio = saved / bytes_before * 100 if bytes_before else 0
+        prefix = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {rows} references to {len(moved)} files into {len(blob_sizes)} blobs: '
+            f'{format_size(bytes_before)} -> {format_size(bytes_after)}, '
+            f'saved {format_size(saved)} ({ratio:.1f}%), {missing} missing'
+        ))
+
+    def recount(self):
+        storage = default_storage
+        counts = Counter()
+        for model, field in content_addressed_fields():
+            references = model._base_manager.filter(
+                **{f'{field.attname}__startswith': f'{storage.prefix}/'}
+            ).values(field.attname).annotate(total=Count('pk')).values_list(field.attname, 'total')
+            for name, total in references:
+                counts[name] += total
+
+        fixed = 0
+        removed = 0
+        for blob in StoredBlob.objects.iterator():
+            references = counts.pop(blob.name, 0)
+            if not references:
+                blob.delete()
+                storage.backend.delete(blob.name)
+                removed += 1
+            elif references != blob.refcount:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=references)
+                fixed += 1
+
+        # Archivos referenciados que no tienen fila (p. ej. restaurados de una copia de seguridad)
+        for name, references in counts.items():
+            if storage.backend.exists(name):
+                digest = name.rsplit('/', 1)[-1].split('.')[0]
+                StoredBlob.objects.create(
+                    name=name, digest=digest, size=storage.backend.size(name), refcount=references
+                )
+                fixed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} reference counts, removed {removed} orphan blobs'))
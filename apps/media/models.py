@@ -0,0 +1,18 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class StoredBlob(models.Model):
+    """Archivo almacenado una sola vez por contenido, con el número de campos que lo referencian"""
+    name = models.CharField(_('name'), max_length=255, unique=True)
+    digest = models.CharField(_('SHA-256 digest'), max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(_('size'))
+    refcount = models.PositiveIntegerField(_('reference count'), default=0)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('stored blob')
+        verbose_name_plural = _('stored blobs')
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount} refs)'
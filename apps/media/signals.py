@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from apps.media.storage import content_addressed_fields
+
+_fields_by_model = defaultdict(list)
+
+
+def connect_file_fields():
+    """Libera las referencias de los archivos al borrar o reemplazar los campos que los usan."""
+    for model, field in content_addressed_fields():
+        _fields_by_model[model].append(field)
+    for model in _fields_by_model:
+        pre_save.connect(remember_replaced_files, sender=model, dispatch_uid=f'media-pre-save-{model._meta.label}')
+        post_save.connect(release_replaced_files, sender=model, dispatch_uid=f'media-post-save-{model._meta.label}')
+        post_delete.connect(release_deleted_files, sender=model, dispatch_uid=f'media-delete-{model._meta.label}')
+
+
+def _release(field, name):
+    if name:
+        transaction.on_commit(lambda: field.storage.delete(name))
+
+
+def remember_replaced_files(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    fields = [
+        field for field in _fields_by_model[sender]
+        if update_fields is None or field.name in update_fields
+    ]
+    if not fields:
+        return
+    previous = sender._base_manager.filter(pk=instance.pk).values(*[field.attname for field in fields]).first()
+    if previous:
+        instance._replaced_files = [
+            (field, previous[field.attname]) for field in fields
+            if previous[field.attname] != getattr(instance, field.attname).name
+        ]
+
+
+def release_replaced_files(sender, instance, **kwargs):
+    for field, name in instance.__dict__.pop('_replaced_files', []):
+        _release(field, name)
+
+
+def release_deleted_files(sender, instance, **kwargs):
+    for field in _fields_by_model[sender]:
+        _release(field, getattr(instance, field.attname).name)
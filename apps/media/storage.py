@@ -0,0 +1,143 @@
+"""
+Content-addressed media storage.
+
+Uploads are hashed while streaming through them in chunks and stored once
+under their SHA-256 digest (``cas/ab/cd/<digest>.<ext>``) in the wrapped
+backend, the local filesystem by default or any django-storages backend.
+Every ``save`` adds a reference to the ``StoredBlob`` row and every ``delete``
+drops one; the bytes are removed when the count reaches zero. Files stored
+before this backend are never deleted through it.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from typing import List, Tuple
+
+from django.apps import apps
+from django.core.files.storage import Storage
+from django.db import models, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+CHUNK_SIZE = 64 * 1024
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def hash_file(content, chunk_size: int = CHUNK_SIZE) -> Tuple[str, int]:
+    """SHA-256 hex digest and size of a Django ``File``, without reading it whole into memory."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in content.chunks(chunk_size):
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    def __init__(self, backend='django.core.files.storage.FileSystemStorage', options=None, prefix='cas'):
+        self.backend_path = backend
+        self.backend = import_string(backend)(**(options or {}))
+        self.prefix = prefix
+
+    def blob_name(self, digest: str, name: str) -> str:
+        extension = os.path.splitext(name)[1].lower()
+        extension = EXTENSION_ALIASES.get(extension, extension)
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def is_blob(self, name: str) -> bool:
+        return bool(name) and name.startswith(f'{self.prefix}/')
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo depende del contenido y se decide en _save
+        return name
+
+    def _save(self, name, content):
+        from apps.media.models import StoredBlob
+
+        digest, size = hash_file(content)
+        blob_name = self.blob_name(digest, name)
+        with transaction.atomic():
+            blob, created = StoredBlob.objects.select_for_update().get_or_create(
+                name=blob_name, defaults={'digest': digest, 'size': size}
+            )
+            if created or not self.backend.exists(blob_name):
+                saved = self.backend.save(blob_name, content)
+                if saved != blob_name:
+                    # Otro proceso escribió el mismo blob a la vez: conservar el suyo
+                    self.backend.delete(saved)
+            StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+        return blob_name
+
+    def retain(self, name: str, count: int = 1) -> None:
+        """Add ``count`` references to an existing blob, e.g. when several rows share one upload."""
+        from apps.media.models import StoredBlob
+
+        if count > 0 and self.is_blob(name):
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+    def delete(self, name):
+        """
+        Drop one reference to ``name`` and delete the bytes once the count
+        reaches zero. Paths outside the blob prefix are left untouched.
+        """
+        from apps.media.models import StoredBlob
+
+        if not self.is_blob(name):
+            return
+
+        with transaction.atomic():
+            if StoredBlob.objects.filter(name=name, refcount__gt=1).update(refcount=F('refcount') - 1):
+                return
+            if not StoredBlob.objects.filter(name=name).delete()[0]:
+                return
+            transaction.on_commit(lambda: self._delete_orphan(name))
+
+    def _delete_orphan(self, name):
+        from apps.media.models import StoredBlob
+
+        # Un save concurrente del mismo contenido puede haber vuelto a crear la fila
+        if not StoredBlob.objects.filter(name=name).exists():
+            self.backend.delete(name)
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+@lru_cache(maxsize=None)
+def content_addressed_fields() -> List[Tuple[type, models.FileField]]:
+    """Every concrete ``FileField`` (including ``ImageField``) stored through this backend."""
+    fields = []
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                fields.append((model, field))
+    return fields
+
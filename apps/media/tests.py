@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from apps.gamification.models import TrashReport
+from apps.media.models import StoredBlob
+from apps.media.storage import ContentAddressedStorage
+from apps.security.models import User
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.storage = ContentAddressedStorage(options={'location': self.root})
+
+    def save(self, name, content):
+        return self.storage.save(name, ContentFile(content))
+
+    def delete(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(name)
+
+    def refcount(self, name):
+        return StoredBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.save('fotos/a.JPEG', b'misma foto')
+        second = self.save('otras/b.jpg', b'misma foto')
+        digest = hashlib.sha256(b'misma foto').hexdigest()
+        self.assertEqual(first, f'cas/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertEqual(self.refcount(first), 2)
+        self.assertEqual(StoredBlob.objects.get(name=first).size, len(b'misma foto'))
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(first))), [os.path.basename(first)])
+        self.assertNotEqual(self.save('c.jpg', b'otra foto'), first)
+
+    def test_retain_and_delete_adjust_the_count(self):
+        name = self.save('a.jpg', b'foto')
+        self.storage.retain(name, 2)
+        self.assertEqual(self.refcount(name), 3)
+        self.delete(name)
+        self.delete(name)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_bytes_are_deleted_at_zero(self):
+        name = self.save('a.jpg', b'foto')
+        self.delete(name)
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+        # Borrar de nuevo un blob ya liberado no hace nada
+        self.delete(name)
+
+    def test_deletion_waits_for_the_commit(self):
+        name = self.save('a.jpg', b'foto')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.storage.delete(name)
+            self.assertTrue(self.storage.exists(name))
+        # El mismo contenido se vuelve a subir antes de que corra el callback
+        self.save('b.jpg', b'foto')
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.refcount(name), 1)
+
+    def test_legacy_paths_are_left_alone(self):
+        legacy = self.storage.backend.save('trash_reports/antigua.jpg', ContentFile(b'antes'))
+        self.delete(legacy)
+        self.assertTrue(self.storage.exists(legacy))
+
+
+class FileFieldReferenceTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+
+    def create_report(self, content):
+        report = TrashReport(user=self.user, latitude=-0.18, longitude=-78.48, description='-', severity=2)
+        report.image.save('foto.jpg', ContentFile(content), save=False)
+        report.save()
+        return report
+
+    def test_rows_hold_references_until_deleted_or_replaced(self):
+        self.assertIsInstance(default_storage, ContentAddressedStorage)
+        first = self.create_report(b'foto')
+        second = self.create_report(b'foto')
+        name = first.image.name
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image.save('nueva.jpg', ContentFile(b'otra'), save=True)
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
@@ -7,9 +7,10 @@ class RecyclingPointAdmin(admin.ModelAdmin):
     search_fields = ('name', 'address')  # Campos por los cuales se puede buscar
     ordering = ('name',)  # Orden de la lista por defecto
     filter_horizontal = ('accepted_categories',)  # Para ManyToManyField, un selector más limpio
+    readonly_fields = ('osm_id',)  # Lo asigna la importación desde OpenStreetMap
     fieldsets = (
         (None, {
-            'fields': ('name', 'address', 'latitude', 'longitude', 'is_active')
+            'fields': ('name', 'address', 'latitude', 'longitude', 'is_active', 'osm_id')
         }),
         ('Hours and Contact', {
             'fields': ('opening_hours', 'contact_info')
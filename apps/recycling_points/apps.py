@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecyclingPointsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.recycling_points'
+
+    def ready(self):
+        from apps.recycling_points import signals  # noqa: F401
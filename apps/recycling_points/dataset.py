@@ -0,0 +1,20 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+
+DATASET_VERSION_KEY = 'recycling_points:dataset_version'
+
+
+def get_dataset_version() -> str:
+    """Return the current version token of the active recycling point set."""
+    version = cache.get(DATASET_VERSION_KEY)
+    if version is None:
+        version = bump_dataset_version()
+    return version
+
+
+def bump_dataset_version() -> str:
+    """Mark every derived copy of the recycling point set as stale."""
+    version = uuid4().hex
+    cache.set(DATASET_VERSION_KEY, version, None)
+    return version
@@ -1,11 +1,13 @@
 # apps/recycling_points/management/commands/populate_recycling_points.py
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from apps.recycling_points.models import RecyclingPoint
-from apps.waste.models import WasteCategory
-import requests
+import json
 import logging
-from time import sleep
+import os
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.recycling_points.osm import CategoryMatcher, import_places, iter_elements, iter_places, read_chunks
+from apps.waste.models import WasteCategory
 
 logger = logging.getLogger(__name__)
 
@@ -15,32 +17,89 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--area', type=str, help='Area to search (e.g., "Guayaquil, Ecuador")')
         parser.add_argument('--radius', type=float, default=10.0, help='Search radius in km')
-        
+        parser.add_argument('--input', type=str, help='Import a saved Overpass JSON file instead of querying the API')
+        parser.add_argument('--save-response', type=str, help='Also write the raw Overpass response to this file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Points saved per transaction')
+        parser.add_argument('--resume', action='store_true', help='Skip the points already saved by an interrupted --input import')
+
     def handle(self, *args, **options):
-        area = options['area']
-        radius = options['radius']
-        
-        # First, get area coordinates using Nominatim
-        area_coords = self.get_area_coordinates(area)
-        if not area_coords:
-            self.stdout.write(self.style.ERROR(f'Could not find coordinates for {area}'))
-            return
-            
-        # Search for recycling points using Overpass API
-        points = self.get_recycling_points(area_coords, radius)
-        
+        if not options['input'] and not options['area']:
+            raise CommandError('Pass --area to query Overpass or --input to import a saved response.')
+        if options['resume'] and not options['input']:
+            raise CommandError('--resume needs --input: a live query may return different elements.')
+
+        checkpoint = f"{options['input']}.progress" if options['input'] else None
+        skip = self.read_checkpoint(checkpoint) if options['resume'] else 0
+
         # Create default waste categories if they don't exist
-        waste_categories = self.ensure_waste_categories()
-        
-        # Save points to database
-        created_count = self.save_points(points, waste_categories)
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'Successfully created {created_count} recycling points')
-        )
-    
+        matcher = CategoryMatcher(self.ensure_waste_categories())
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            if options['input']:
+                chunks = read_chunks(stack.enter_context(open(options['input'], 'rb')))
+            else:
+                # First, get area coordinates using Nominatim
+                area_coords = self.get_area_coordinates(options['area'])
+                if not area_coords:
+                    self.stdout.write(self.style.ERROR(f"Could not find coordinates for {options['area']}"))
+                    return
+                chunks = self.get_recycling_points(area_coords, options['radius'])
+                if options['save_response']:
+                    chunks = self.tee(chunks, stack.enter_context(open(options['save_response'], 'wb')))
+
+            def on_chunk(done):
+                if checkpoint:
+                    self.write_checkpoint(checkpoint, done)
+                self.stdout.write(f'  {done} points saved')
+
+            try:
+                stats = import_places(
+                    iter_places(iter_elements(chunks)),
+                    matcher,
+                    chunk_size=options['chunk_size'],
+                    skip=skip,
+                    on_chunk=on_chunk,
+                )
+            except Exception:
+                hint = f"--input {options['input']} --resume" if checkpoint else 'the same options'
+                self.stderr.write(self.style.ERROR(f'Import interrupted; committed chunks are kept, rerun with {hint}'))
+                raise
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - started
+        rate = stats.points / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully imported {stats.points} recycling points ({stats.kinds['node']} nodes, "
+            f"{stats.kinds['way']} ways; {stats.created} new, {stats.skipped} skipped) "
+            f'in {elapsed:.1f}s ({rate:.0f} points/s)'
+        ))
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path) as file:
+                return json.load(file)['points']
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def write_checkpoint(path, points):
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump({'points': points}, file)
+        os.replace(f'{path}.tmp', path)
+
+    @staticmethod
+    def tee(chunks, file):
+        for chunk in chunks:
+            file.write(chunk)
+            yield chunk
+
     def get_area_coordinates(self, area):
         """Get coordinates for an area using Nominatim"""
+        import requests
+
         nominatim_url = f"https://nominatim.openstreetmap.org/search"
         params = {
             'q': area,
@@ -48,12 +107,12 @@ class Command(BaseCommand):
             'limit': 1
         }
         headers = {'User-Agent': 'RecyclingPointsPopulator/1.0'}
-        
+
         try:
             response = requests.get(nominatim_url, params=params, headers=headers)
             response.raise_for_status()
             data = response.json()
-            
+
             if data:
                 return {
                     'lat': float(data[0]['lat']),
@@ -61,13 +120,15 @@ class Command(BaseCommand):
                 }
         except Exception as e:
             logger.error(f"Error getting coordinates for {area}: {str(e)}")
-        
+
         return None
-    
+
     def get_recycling_points(self, coords, radius):
-        """Get recycling points using Overpass API"""
+        """Stream the Overpass API response for recycling points as byte chunks"""
+        import requests
+
         overpass_url = "http://overpass-api.de/api/interpreter"
-        
+
         # Query for recycling points and industrial facilities that might handle recycling
         query = f"""
             [out:json][timeout:25];
@@ -80,17 +141,15 @@ class Command(BaseCommand):
             out skel qt;
             """
 
-        
         try:
-            response = requests.post(overpass_url, data={'data': query})
+            response = requests.post(overpass_url, data={'data': query}, stream=True)
             response.raise_for_status()
-            data = response.json()
-            
-            return data.get('elements', [])
         except Exception as e:
-            logger.error(f"Error fetching recycling points: {str(e)}")
-            return []
-    
+            raise CommandError(f"Error fetching recycling points: {str(e)}")
+
+        with response:
+            yield from response.iter_content(chunk_size=64 * 1024)
+
     def ensure_waste_categories(self):
         """Ensure default waste categories exist"""
         default_categories = [
@@ -120,7 +179,7 @@ class Command(BaseCommand):
                 'recycling_instructions': 'Remove batteries and personal data'
             }
         ]
-        
+
         categories = {}
         for cat_data in default_categories:
             cat, _ = WasteCategory.objects.get_or_create(
@@ -131,66 +190,5 @@ class Command(BaseCommand):
                 }
             )
             categories[cat.name.lower()] = cat
-        
+
         return categories
-    
-    @transaction.atomic
-    def save_points(self, points, waste_categories):
-        """Save recycling points to database"""
-        created_count = 0
-        
-        for point in points:
-            if point.get('type') != 'node':
-                continue
-                
-            tags = point.get('tags', {})
-            if not tags:
-                continue
-            
-            # Extract point data
-            name = tags.get('name', f"Recycling Point {point['id']}")
-            
-            # Create or update recycling point
-            try:
-                recycling_point, created = RecyclingPoint.objects.get_or_create(
-                    latitude=point['lat'],
-                    longitude=point['lon'],
-                    defaults={
-                        'name': name,
-                        'address': tags.get('addr:full', tags.get('addr:street', '')),
-                        'is_active': True
-                    }
-                )
-                
-                # Assign waste types based on tags
-                if created:
-                    self.assign_waste_types(recycling_point, tags, waste_categories)
-                    created_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error saving recycling point {name}: {str(e)}")
-                continue
-                
-            # Respect API rate limits
-            sleep(0.1)
-        
-        return created_count
-    
-    def assign_waste_types(self, point, tags, waste_categories):
-        """Assign waste types to recycling point based on OSM tags"""
-        materials = {
-            'plastic': ['plastic'],
-            'glass': ['glass', 'bottles'],
-            'paper': ['paper', 'newspaper', 'cardboard'],
-            'metal': ['metal', 'scrap_metal', 'cans'],
-            'electronics': ['electronics', 'e-waste', 'batteries']
-        }
-        
-        # Check tags for recycling materials
-        for category, keywords in materials.items():
-            if category in waste_categories:
-                # Check if any keyword is in the tags
-                for tag, value in tags.items():
-                    if any(keyword in tag.lower() or keyword in value.lower() for keyword in keywords):
-                        point.waste_types.add(waste_categories[category])
-                        break
\ No newline at end of file
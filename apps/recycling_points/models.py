@@ -19,6 +19,8 @@ class RecyclingPoint(models.Model):
     is_active = models.BooleanField(_('is active'), default=True)
     opening_hours = models.JSONField(_('opening hours'), default=dict)
     contact_info = models.JSONField(_('contact info'), default=dict)
+    # Elemento de OpenStreetMap del que se importó ("node/123", "way/456")
+    osm_id = models.CharField(_('OSM id'), max_length=32, unique=True, null=True, blank=True, editable=False)
     
     class Meta:
         verbose_name = _('recycling point')
@@ -0,0 +1,333 @@
+"""
+Streaming import of OpenStreetMap recycling points from Overpass JSON.
+
+``iter_elements`` decodes the ``elements`` array one object at a time from
+any iterable of byte chunks (an HTTP response or a local file), so memory
+stays flat however large the extract is. ``iter_places`` turns tagged nodes
+into places as they arrive and resolves ways to the centroid of their
+member nodes, which Overpass emits afterwards through ``>; out skel``.
+``import_places`` upserts the places in chunks keyed on ``osm_id``; chunks
+are written by a single background thread while the next one is parsed, and
+every committed chunk is reported through ``on_chunk`` so an interrupted
+import can be resumed by skipping what was already written. Accepted
+categories come from ``CategoryMatcher`` and are inserted into the through
+table once per chunk.
+"""
+import codecs
+import json
+import logging
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection, transaction
+
+from apps.recycling_points.dataset import bump_dataset_version
+from apps.recycling_points.models import RecyclingPoint
+from apps.tiles.cache import bump_layer
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+COORDINATE_PLACES = Decimal('0.0000001')  # decimal_places de RecyclingPoint.latitude/longitude
+UPDATE_FIELDS = ['name', 'address', 'latitude', 'longitude']
+RECYCLING_PREFIX = 'recycling:'
+
+MATERIALS = {
+    'plastic': ['plastic'],
+    'glass': ['glass', 'bottles'],
+    'paper': ['paper', 'newspaper', 'cardboard'],
+    'metal': ['metal', 'scrap_metal', 'cans'],
+    'electronics': ['electronics', 'e-waste', 'batteries'],
+}
+
+
+class OverpassFormatError(ValueError):
+    pass
+
+
+def read_chunks(file, size=READ_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = file.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_elements(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Yield each object of the top-level ``elements`` array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    exhausted = False
+
+    def fill():
+        nonlocal buffer, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer += text.decode(b'', final=True)
+            exhausted = True
+        else:
+            buffer += text.decode(chunk)
+
+    # Avanzar hasta el '[' que abre "elements"
+    while True:
+        key = buffer.find('"elements"')
+        start = buffer.find('[', key) if key >= 0 else -1
+        if start >= 0:
+            buffer = buffer[start + 1:]
+            break
+        if exhausted:
+            raise OverpassFormatError('No "elements" array in Overpass response')
+        fill()
+
+    while True:
+        position = 0
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        buffer = buffer[position:]
+        if buffer.startswith(']'):
+            break
+        try:
+            element, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise OverpassFormatError('Truncated Overpass response') from None
+            fill()
+            continue
+        yield element
+        buffer = buffer[end:]
+
+    rest = buffer[1:]
+    while not exhausted:
+        fill()
+        rest = buffer[1:]
+    if '"remark"' in rest:
+        # Overpass devuelve los errores de ejecución (p. ej. timeout) tras un resultado parcial
+        logger.warning('Overpass remark: %s', rest.strip(' ,}\r\n')[:500])
+
+
+@dataclass
+class Place:
+    osm_id: str
+    lat: float
+    lon: float
+    tags: Dict[str, str]
+
+
+def _node_place(element) -> Optional[Place]:
+    if not element.get('tags') or 'lat' not in element:
+        return None
+    return Place(f"node/{element['id']}", element['lat'], element['lon'], element['tags'])
+
+
+def iter_places(elements: Iterable[dict]) -> Iterator[Place]:
+    """
+    Tagged nodes are yielded as soon as they are read. Ways are held until
+    the end of the stream, when the coordinates of their member nodes are
+    known, and yielded at the centroid of those nodes (the closing node of a
+    closed way is counted once). Ways that already carry a ``center`` (``out
+    center``) do not wait.
+    """
+    ways = []
+    wanted = set()
+    coordinates = {}
+    for element in elements:
+        kind = element.get('type')
+        if kind == 'node':
+            if element['id'] in wanted:
+                coordinates[element['id']] = (element['lat'], element['lon'])
+            place = _node_place(element)
+            if place is not None:
+                yield place
+        elif kind == 'way' and element.get('tags'):
+            center = element.get('center')
+            if center:
+                yield Place(f"way/{element['id']}", center['lat'], center['lon'], element['tags'])
+                continue
+            nodes = element.get('nodes', [])
+            if len(nodes) > 1 and nodes[0] == nodes[-1]:
+                nodes = nodes[:-1]
+            ways.append((element['id'], element['tags'], nodes))
+            wanted.update(nodes)
+
+    for way_id, tags, nodes in ways:
+        points = [coordinates[node] for node in nodes if node in coordinates]
+        if not points:
+            logger.warning('Way %s has no resolved nodes, skipped', way_id)
+            continue
+        lat = sum(point[0] for point in points) / len(points)
+        lon = sum(point[1] for point in points) / len(points)
+        yield Place(f'way/{way_id}', lat, lon, tags)
+
+
+class CategoryMatcher:
+    """
+    Maps the ``recycling:*`` tags of a point to waste categories.
+
+    The ``MATERIALS`` keyword table is compiled once into a single regular
+    expression with one named group per category, and the result for each
+    distinct tag is memoized, so matching a point costs one dictionary
+    lookup per tag instead of categories x tags x keywords substring checks.
+    Tags set to ``no`` (``recycling:glass=no``) are ignored.
+    """
+
+    def __init__(self, waste_categories, materials=MATERIALS):
+        self.categories = {}
+        alternatives = []
+        for index, (name, keywords) in enumerate(materials.items()):
+            if name not in waste_categories:
+                continue
+            group = f'c{index}'
+            self.categories[group] = waste_categories[name]
+            keywords = sorted(keywords, key=len, reverse=True)
+            alternatives.append(f"(?P<{group}>{'|'.join(re.escape(keyword) for keyword in keywords)})")
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+        self._memo: Dict[Tuple[str, str], Tuple] = {}
+
+    def _match_tag(self, key, value) -> Tuple:
+        memo = self._memo.get((key, value))
+        if memo is None:
+            text = key[len(RECYCLING_PREFIX):].lower()
+            if value.lower() not in ('yes', 'no'):
+                text = f'{text}={value.lower()}'
+            groups = {match.lastgroup for match in self.pattern.finditer(text)}
+            memo = self._memo[(key, value)] = tuple(self.categories[group] for group in sorted(groups))
+        return memo
+
+    def match(self, tags) -> List:
+        """Distinct categories accepted by a point with these OSM tags."""
+        if self.pattern is None:
+            return []
+        matched = {}
+        for key, value in tags.items():
+            if key.startswith(RECYCLING_PREFIX) and value.lower() != 'no':
+                for category in self._match_tag(key, value):
+                    matched[category.pk] = category
+        return list(matched.values())
+
+
+def _coordinate(value) -> Decimal:
+    return Decimal(str(value)).quantize(COORDINATE_PLACES)
+
+
+def _claim_legacy(chunk, latitudes, longitudes):
+    """Link points imported before ``osm_id`` existed to their element, matching on coordinates."""
+    legacy = RecyclingPoint.objects.filter(
+        osm_id__isnull=True, latitude__in=set(latitudes.values()), longitude__in=set(longitudes.values())
+    ).only('pk', 'latitude', 'longitude')
+    by_position = {(point.latitude, point.longitude): point for point in legacy}
+    claimed = []
+    for place in chunk:
+        point = by_position.pop((latitudes[place.osm_id], longitudes[place.osm_id]), None)
+        if point is not None:
+            point.osm_id = place.osm_id
+            claimed.append(point)
+    RecyclingPoint.objects.bulk_update(claimed, ['osm_id'])
+
+
+def save_chunk(chunk: List[Place], matcher: CategoryMatcher) -> int:
+    """Upsert one chunk of places and their categories; returns how many points were new."""
+    latitudes = {place.osm_id: _coordinate(place.lat) for place in chunk}
+    longitudes = {place.osm_id: _coordinate(place.lon) for place in chunk}
+    keys = list(latitudes)
+    with transaction.atomic():
+        _claim_legacy(chunk, latitudes, longitudes)
+        existing = set(RecyclingPoint.objects.filter(osm_id__in=keys).values_list('osm_id', flat=True))
+        RecyclingPoint.objects.bulk_create(
+            [
+                RecyclingPoint(
+                    osm_id=place.osm_id,
+                    name=place.tags.get('name', f'Recycling Point {place.osm_id.split("/")[1]}')[:100],
+                    address=place.tags.get('addr:full', place.tags.get('addr:street', ''))[:255],
+                    latitude=latitudes[place.osm_id],
+                    longitude=longitudes[place.osm_id],
+                    is_active=True,
+                )
+                for place in {place.osm_id: place for place in chunk}.values()
+            ],
+            update_conflicts=True,
+            unique_fields=['osm_id'],
+            update_fields=UPDATE_FIELDS,
+        )
+        # bulk_create con update_conflicts no devuelve las claves en Django 4.2
+        ids = dict(RecyclingPoint.objects.filter(osm_id__in=keys).values_list('osm_id', 'pk'))
+        through = RecyclingPoint.accepted_categories.through
+        through.objects.bulk_create(
+            [
+                through(recyclingpoint_id=ids[place.osm_id], wastecategory_id=category.pk)
+                for place in chunk
+                for category in matcher.match(place.tags)
+            ],
+            ignore_conflicts=True,
+        )
+    return len(set(keys) - existing)
+
+
+@dataclass
+class ImportStats:
+    points: int = 0
+    created: int = 0
+    skipped: int = 0
+    kinds: Dict[str, int] = field(default_factory=lambda: {'node': 0, 'way': 0})
+
+
+def import_places(
+    places: Iterable[Place],
+    matcher: CategoryMatcher,
+    chunk_size: int = 1000,
+    skip: int = 0,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> ImportStats:
+    """
+    Save ``places`` in chunks of ``chunk_size``, skipping the first ``skip``
+    (already imported by an interrupted run). ``on_chunk`` receives the total
+    number of places written after each committed chunk. At most two chunks
+    are in flight, so parsing never runs far ahead of the database.
+    """
+    stats = ImportStats()
+    pending = deque()
+
+    def write(chunk):
+        return save_chunk(chunk, matcher), len(chunk)
+
+    def collect(future):
+        created, size = future.result()
+        stats.created += created
+        stats.points += size
+        if on_chunk is not None:
+            on_chunk(skip + stats.points)
+
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='osm-import') as executor:
+            try:
+                chunk = []
+                for place in places:
+                    if stats.skipped < skip:
+                        stats.skipped += 1
+                        continue
+                    stats.kinds[place.osm_id.split('/')[0]] += 1
+                    chunk.append(place)
+                    if len(chunk) >= chunk_size:
+                        pending.append(executor.submit(write, chunk))
+                        chunk = []
+                        while len(pending) > 1:
+                            collect(pending.popleft())
+                if chunk:
+                    pending.append(executor.submit(write, chunk))
+                while pending:
+                    collect(pending.popleft())
+            finally:
+                for future in pending:
+                    future.cancel()
+                executor.submit(connection.close)
+    finally:
+        if stats.points:
+            # bulk_create no emite post_save: invalidar a mano las copias derivadas
+            bump_dataset_version()
+            bump_layer('recycling-points')
+    return stats
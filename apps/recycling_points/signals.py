@@ -0,0 +1,20 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.recycling_points.dataset import bump_dataset_version
+from apps.recycling_points.models import RecyclingPoint
+from apps.waste.models import WasteCategory
+
+
+@receiver(post_save, sender=RecyclingPoint)
+@receiver(post_delete, sender=RecyclingPoint)
+@receiver(post_save, sender=WasteCategory)
+@receiver(post_delete, sender=WasteCategory)
+def recycling_point_changed(sender, **kwargs):
+    bump_dataset_version()
+
+
+@receiver(m2m_changed, sender=RecyclingPoint.accepted_categories.through)
+def recycling_point_categories_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_dataset_version()
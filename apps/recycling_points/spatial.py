@@ -0,0 +1,104 @@
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from apps.recycling_points.dataset import get_dataset_version
+from apps.recycling_points.models import RecyclingPoint
+from apps.utils.geo import EARTH_RADIUS_KM
+
+
+def to_unit_vectors(lats, lngs) -> np.ndarray:
+    """Project coordinates onto the unit sphere as (x, y, z) rows."""
+    phi = np.radians(np.asarray(lats, dtype=np.float64))
+    lam = np.radians(np.asarray(lngs, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.column_stack((cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)))
+
+
+def chord_to_km(chord) -> np.ndarray:
+    """Convert a chord length on the unit sphere to a great circle distance."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+
+class RecyclingPointIndex:
+    """
+    In-memory KD-tree over the active recycling points.
+
+    Points are indexed as 3D unit vectors, where euclidean (chord) distance
+    grows monotonically with great circle distance, so nearest neighbours in
+    the tree are nearest on the globe. One tree covers every point and one
+    more is kept per waste category. The trees are rebuilt lazily whenever
+    the dataset version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._trees: Dict[Optional[int], Tuple['cKDTree', np.ndarray]] = {}
+
+    def nearest(self, lat: float, lng: float, k: int, category_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (point id, distance in km) pairs, closest first."""
+        trees = self._get_trees()
+        if category_id not in trees or k < 1:
+            return []
+
+        tree, ids = trees[category_id]
+        k = min(k, len(ids))
+        chords, positions = tree.query(to_unit_vectors([lat], [lng])[0], k=k)
+        chords = np.atleast_1d(chords)
+        positions = np.atleast_1d(positions)
+        distances = chord_to_km(chords)
+        return [(int(ids[position]), float(distance)) for position, distance in zip(positions, distances)]
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._trees = {}
+
+    def _get_trees(self):
+        version = get_dataset_version()
+        if version == self._version:
+            return self._trees
+
+        with self._lock:
+            if version != self._version:
+                self._trees = self._build()
+                self._version = version
+            return self._trees
+
+    @staticmethod
+    def _build():
+        # scipy adds ~100 ms to startup; only pay for it once a query needs the tree
+        from scipy.spatial import cKDTree
+
+        rows = list(
+            RecyclingPoint.objects.filter(
+                is_active=True, latitude__isnull=False, longitude__isnull=False
+            ).values_list('id', 'latitude', 'longitude')
+        )
+        if not rows:
+            return {}
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = to_unit_vectors([row[1] for row in rows], [row[2] for row in rows])
+        trees = {None: (cKDTree(vectors), ids)}
+
+        position_by_id = {point_id: position for position, point_id in enumerate(ids.tolist())}
+        positions_by_category = defaultdict(list)
+        through = RecyclingPoint.accepted_categories.through.objects.filter(
+            recyclingpoint__is_active=True
+        ).values_list('recyclingpoint_id', 'wastecategory_id')
+        for point_id, category_id in through:
+            position = position_by_id.get(point_id)
+            if position is not None:
+                positions_by_category[category_id].append(position)
+
+        for category_id, positions in positions_by_category.items():
+            positions = np.array(positions, dtype=np.int64)
+            trees[category_id] = (cKDTree(vectors[positions]), ids[positions])
+
+        return trees
+
+
+recycling_point_index = RecyclingPointIndex()
@@ -1,3 +1,235 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from apps.recycling_points.models import RecyclingPoint
+from apps.recycling_points.osm import CategoryMatcher, OverpassFormatError, iter_elements, iter_places
+from apps.utils.geo import haversine
+from apps.waste.models import WasteCategory
+
+
+class ConfiguredCacheTests(TestCase):
+    """Sin override de CACHES: ejercita la caché tal como la configura settings.py."""
+
+    def test_feed_is_served_and_revalidated(self):
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        point = RecyclingPoint.objects.create(name='Punto limpio', address='-', latitude=-0.18, longitude=-78.48)
+        point.accepted_categories.add(category)
+        url = reverse('recycling_points:api-points')
+
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['waste_types'] for row in response.json()], [['Vidrio']])
+
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_category_rename_refreshes_the_feed(self):
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        point = RecyclingPoint.objects.create(name='Punto limpio', address='-', latitude=-0.18, longitude=-78.48)
+        point.accepted_categories.add(category)
+        url = reverse('recycling_points:api-points')
+        etag = self.client.get(url, secure=True)['ETag']
+
+        category.name = 'Vidrio y cristal'
+        category.save()
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['waste_types'] for row in response.json()], [['Vidrio y cristal']])
+
+
+class NearestRecyclingPointsTests(TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        self.glass = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        self.paper = WasteCategory.objects.create(name='Papel', description='-', recycling_instructions='-')
+        for index in range(60):
+            point = RecyclingPoint.objects.create(
+                name=f'Punto {index}', address='-',
+                latitude=round(-0.18 + rng.uniform(-0.3, 0.3), 6),
+                longitude=round(-78.48 + rng.uniform(-0.3, 0.3), 6),
+                is_active=index % 10 != 0,
+            )
+            point.accepted_categories.add(self.glass if index % 2 else self.paper)
+
+    def nearest(self, **params):
+        return self.client.get(reverse('recycling_points:api-nearest'), params, secure=True)
+
+    def brute_force(self, lat, lng, k, category=None):
+        points = RecyclingPoint.objects.filter(is_active=True)
+        if category is not None:
+            points = points.filter(accepted_categories=category)
+        ranked = sorted(
+            (haversine(lat, lng, float(point.latitude), float(point.longitude)), point.pk) for point in points
+        )
+        return [point_id for _, point_id in ranked[:k]]
+
+    def test_matches_a_full_scan(self):
+        response = self.nearest(lat=-0.2, lng=-78.5, k=7)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()], self.brute_force(-0.2, -78.5, 7))
+
+    def test_category_filter_by_name_or_id(self):
+        expected = self.brute_force(-0.2, -78.5, 5, self.glass)
+        for category in ('vidrio', str(self.glass.pk)):
+            rows = self.nearest(lat=-0.2, lng=-78.5, k=5, category=category).json()
+            self.assertEqual([row['id'] for row in rows], expected)
+            self.assertTrue(all(row['waste_types'] == ['Vidrio'] for row in rows))
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.nearest(lat=-0.2, lng=-78.5, category='Metal').status_code, 404)
+        self.assertEqual(self.nearest(lat='x', lng=-78.5).status_code, 400)
+        self.assertEqual(self.nearest(lat=95, lng=-78.5).status_code, 400)
+        self.assertEqual(self.nearest(lat=-0.2, lng=-78.5, k=0).status_code, 400)
+
+    def test_index_follows_point_changes(self):
+        first = self.nearest(lat=-0.2, lng=-78.5, k=1).json()[0]['id']
+        RecyclingPoint.objects.filter(pk=first).first().delete()
+        self.assertEqual([row['id'] for row in self.nearest(lat=-0.2, lng=-78.5, k=1).json()], self.brute_force(-0.2, -78.5, 1))
+
+
+OVERPASS_RESPONSE = json.dumps({
+    'version': 0.6,
+    'elements': [
+        {'type': 'node', 'id': 1, 'lat': -0.18, 'lon': -78.48,
+         'tags': {'amenity': 'recycling', 'name': 'Punto Ñuñoa', 'recycling:glass_bottles': 'yes', 'recycling:plastic': 'no'}},
+        {'type': 'node', 'id': 2, 'lat': -0.2, 'lon': -78.5, 'tags': {'amenity': 'recycling', 'recycling:paper': 'yes'}},
+        {'type': 'way', 'id': 10, 'nodes': [101, 102, 103, 101], 'tags': {'amenity': 'recycling', 'recycling:cans': 'yes'}},
+        # Nodos de la vía, emitidos después por ">; out skel"
+        {'type': 'node', 'id': 101, 'lat': -0.3, 'lon': -78.6},
+        {'type': 'node', 'id': 102, 'lat': -0.3, 'lon': -78.3},
+        {'type': 'node', 'id': 103, 'lat': 0.0, 'lon': -78.6},
+    ],
+    'remark': 'runtime error: Query timed out',
+}, ensure_ascii=False).encode()
+
+
+def split(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class OverpassParserTests(TestCase):
+    def test_elements_are_decoded_across_chunk_boundaries(self):
+        # Trozos de 7 bytes cortan las cadenas y los caracteres UTF-8 de varios bytes
+        with self.assertLogs('apps.recycling_points.osm', 'WARNING') as logs:
+            elements = list(iter_elements(split(OVERPASS_RESPONSE, 7)))
+        self.assertEqual(elements, json.loads(OVERPASS_RESPONSE)['elements'])
+        self.assertIn('Query timed out', logs.output[0])
+
+    def test_ways_are_placed_at_the_centroid_of_their_nodes(self):
+        places = list(iter_places(json.loads(OVERPASS_RESPONSE)['elements']))
+        self.assertEqual([place.osm_id for place in places], ['node/1', 'node/2', 'way/10'])
+        # El nodo que cierra la vía cuenta una sola vez
+        self.assertAlmostEqual(places[2].lat, -0.2)
+        self.assertAlmostEqual(places[2].lon, -78.5)
+
+    def test_malformed_responses(self):
+        with self.assertRaisesMessage(OverpassFormatError, 'Truncated'):
+            list(iter_elements(split(OVERPASS_RESPONSE[:200], 64)))
+        with self.assertRaisesMessage(OverpassFormatError, 'No "elements"'):
+            list(iter_elements([b'{"version": 0.6}']))
+
+
+class PopulateRecyclingPointsTests(TransactionTestCase):
+    """Los trozos se escriben desde otro hilo, que no ve la transacción de un TestCase."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'overpass.json')
+        self.checkpoint = f'{self.path}.progress'
+
+    def populate(self, data=OVERPASS_RESPONSE, **options):
+        with open(self.path, 'wb') as file:
+            file.write(data)
+        out = StringIO()
+        call_command('populate_recycling_points', input=self.path, chunk_size=1, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def points(self):
+        return {
+            point.osm_id: sorted(category.name for category in point.accepted_categories.all())
+            for point in RecyclingPoint.objects.prefetch_related('accepted_categories')
+        }
+
+    def test_import_is_an_upsert(self):
+        out = self.populate()
+        self.assertIn('3 recycling points (2 nodes, 1 ways; 3 new, 0 skipped)', out)
+        self.assertEqual(self.points(), {'node/1': ['Glass'], 'node/2': ['Paper'], 'way/10': ['Metal']})
+        way = RecyclingPoint.objects.get(osm_id='way/10')
+        self.assertEqual((str(way.latitude), str(way.longitude)), ('-0.2000000', '-78.5000000'))
+        self.assertEqual(RecyclingPoint.objects.get(osm_id='node/1').name, 'Punto Ñuñoa')
+
+        self.assertIn('0 new', self.populate())
+        self.assertEqual(RecyclingPoint.objects.count(), 3)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resume_skips_the_saved_points(self):
+        with open(self.checkpoint, 'w') as file:
+            json.dump({'points': 2}, file)
+        self.assertIn('1 recycling points (0 nodes, 1 ways; 1 new, 2 skipped)', self.populate(resume=True))
+        self.assertEqual(list(self.points()), ['way/10'])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_truncated_file_keeps_its_progress(self):
+        cut = OVERPASS_RESPONSE.index(b'"type": "way"')
+        with self.assertRaises(OverpassFormatError):
+            self.populate(OVERPASS_RESPONSE[:cut])
+        with open(self.checkpoint) as file:
+            saved = json.load(file)['points']
+        self.assertGreaterEqual(saved, 1)
+        self.assertEqual(RecyclingPoint.objects.filter(osm_id='way/10').count(), 0)
+
+        # Con el fichero completo la importación continúa donde quedó
+        self.assertIn(f'{saved} skipped', self.populate(resume=True))
+        self.assertEqual(self.points(), {'node/1': ['Glass'], 'node/2': ['Paper'], 'way/10': ['Metal']})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class CategoryMatcherTests(SimpleTestCase):
+    def setUp(self):
+        names = ('plastic', 'glass', 'paper', 'metal', 'electronics')
+        self.categories = {name: WasteCategory(pk=pk, name=name.title()) for pk, name in enumerate(names, 1)}
+        self.matcher = CategoryMatcher(self.categories)
+
+    def names(self, tags, matcher=None):
+        return sorted(category.name for category in (matcher or self.matcher).match(tags))
+
+    def test_recycling_tags_select_categories(self):
+        self.assertEqual(self.names({
+            'recycling:glass_bottles': 'yes',
+            'recycling:newspaper': 'yes',
+            'recycling:cardboard': 'yes',
+            'recycling:scrap_metal': 'YES',
+        }), ['Glass', 'Metal', 'Paper'])
+        # El material también puede venir en el valor
+        self.assertEqual(self.names({'recycling:type': 'batteries'}), ['Electronics'])
+
+    def test_refused_and_unrelated_tags_are_ignored(self):
+        self.assertEqual(self.names({
+            'name': 'Plastic Center',
+            'recycling_type': 'centre',
+            'recycling:glass': 'no',
+            'recycling:paper': 'No',
+            'recycling:clothes': 'yes',
+        }), [])
+
+    def test_only_known_categories_are_matched(self):
+        matcher = CategoryMatcher({'glass': self.categories['glass']})
+        self.assertEqual(self.names({'recycling:glass': 'yes', 'recycling:plastic': 'yes'}, matcher), ['Glass'])
+        self.assertEqual(CategoryMatcher({}).match({'recycling:glass': 'yes'}), [])
+
+    def test_tags_are_matched_once(self):
+        tags = {'recycling:glass': 'yes', 'recycling:plastic': 'yes'}
+        first = self.names(tags)
+        self.matcher.pattern = mock.Mock(wraps=self.matcher.pattern)
+        self.assertEqual(self.names(tags), first)
+        self.matcher.pattern.finditer.assert_not_called()
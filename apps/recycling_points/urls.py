@@ -1,9 +1,10 @@
 from django.urls import path
-from apps.recycling_points.views.points import RecyclingMapView, RecyclingPointsAPIView
+from apps.recycling_points.views.points import RecyclingMapView, RecyclingPointsAPIView, NearestRecyclingPointsAPIView
 
 app_name = 'recycling_points'
 
 urlpatterns = [
     path('points/', RecyclingMapView.as_view(), name='points'),
     path('api/recycling-points/', RecyclingPointsAPIView.as_view(), name='api-points'),
+    path('api/nearest/', NearestRecyclingPointsAPIView.as_view(), name='api-nearest'),
 ]
\ No newline at end of file
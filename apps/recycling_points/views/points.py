@@ -1,16 +1,23 @@
+import json
 from datetime import datetime
-from math import radians, sin, cos, sqrt, atan2
 from typing import List, Dict, Optional, Union
 from urllib.parse import urljoin
 
 from django.views.generic import TemplateView
 from django.views import View
-from django.http import JsonResponse, HttpRequest
+from django.http import HttpResponse, JsonResponse, HttpRequest
 from django.db.models import Q, QuerySet
 from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
+from apps.recycling_points.dataset import get_dataset_version
 from apps.recycling_points.models import RecyclingPoint
+from apps.recycling_points.spatial import recycling_point_index
+from apps.utils.db import GroupConcat, split_group_concat
 from apps.waste.models import WasteCategory
 
 class RecyclingMapView(TemplateView):
@@ -39,7 +46,7 @@ class RecyclingMapView(TemplateView):
         context['maptiler_key'] = "eOJz2rYdmVnQEiFjpgcP" # Mejor mover esto a settings.py
         return context
 
-class RecyclingPointsAPIView(View):
+class SecureAPIView(View):
     def dispatch(self, request, *args, **kwargs):
         """Ensure HTTPS in production"""
         if not settings.DEBUG and not request.is_secure():
@@ -50,38 +57,139 @@ class RecyclingPointsAPIView(View):
             }, status=403)
         return super().dispatch(request, *args, **kwargs)
 
-    def get(self, request) -> JsonResponse:
+def current_weekday() -> str:
+    return datetime.now().strftime('%A').lower()
+
+
+def feed_etag(request, *args, **kwargs) -> str:
+    """ETag of the map feed: dataset version plus the projected weekday."""
+    return f'{get_dataset_version()}-{current_weekday()}'
+
+
+class RecyclingPointsAPIView(SecureAPIView):
+    """
+    Full map feed of active recycling points.
+
+    The serialized payload is cached per dataset version and weekday, so it
+    is only rebuilt after the points change or the day rolls over, and
+    clients holding the current ETag get an empty 304.
+    """
+
+    cache_timeout = 60 * 60 * 24
+
+    @method_decorator(condition(etag_func=feed_etag))
+    def get(self, request) -> HttpResponse:
         try:
-            # Get all active recycling points
-            points = RecyclingPoint.objects.filter(is_active=True)
-            
-            # Format points for response
-            formatted_points = []
-            for point in points:
-                if point.latitude and point.longitude:
-                    try:
-                        formatted_points.append({
-                            'id': point.id,
-                            'name': point.name,
-                            'latitude': float(point.latitude),
-                            'longitude': float(point.longitude),
-                            'address': point.address,
-                            'waste_types': list(point.accepted_categories.values_list('name', flat=True)),
-                            'contact_info': point.contact_info,
-                            'opening_hours': point.opening_hours.get(
-                                datetime.now().strftime('%A').lower(), 
-                                'closed'
-                            )
-                        })
-                    except (ValueError, TypeError, AttributeError) as e:
-                        # Log error but continue processing other points
-                        print(f"Error processing point {point.id}: {str(e)}")
-                        continue
-
-            return JsonResponse(formatted_points, safe=False)
+            weekday = current_weekday()
+            cache_key = f'recycling_points:feed:{get_dataset_version()}:{weekday}'
+            payload = cache.get(cache_key)
+            if payload is None:
+                payload = json.dumps(self.build_feed(weekday), cls=DjangoJSONEncoder)
+                cache.set(cache_key, payload, self.cache_timeout)
+
+            return HttpResponse(payload, content_type='application/json')
 
         except Exception as e:
             return JsonResponse({
                 'error': 'An error occurred while retrieving recycling points',
                 'details': str(e)
-            }, status=500)
\ No newline at end of file
+            }, status=500)
+
+    @staticmethod
+    def build_feed(weekday: str) -> List[Dict]:
+        # Get all active recycling points with their category names in a single query
+        points = RecyclingPoint.objects.filter(
+            is_active=True, latitude__isnull=False, longitude__isnull=False
+        ).values(
+            'id', 'name', 'latitude', 'longitude', 'address', 'contact_info', 'opening_hours'
+        ).annotate(
+            category_names=GroupConcat('accepted_categories__name')
+        ).order_by('id')
+
+        # Format points for response
+        formatted_points = []
+        for point in points:
+            try:
+                formatted_points.append({
+                    'id': point['id'],
+                    'name': point['name'],
+                    'latitude': float(point['latitude']),
+                    'longitude': float(point['longitude']),
+                    'address': point['address'],
+                    'waste_types': sorted(split_group_concat(point['category_names'])),
+                    'contact_info': point['contact_info'],
+                    'opening_hours': point['opening_hours'].get(weekday, 'closed')
+                })
+            except (ValueError, TypeError, AttributeError) as e:
+                # Log error but continue processing other points
+                print(f"Error processing point {point['id']}: {str(e)}")
+                continue
+
+        return formatted_points
+
+class NearestRecyclingPointsAPIView(SecureAPIView):
+    """Return the k active recycling points closest to a location."""
+
+    default_k = 5
+    max_k = 50
+
+    def get(self, request) -> JsonResponse:
+        try:
+            lat = float(request.GET['lat'])
+            lng = float(request.GET['lng'])
+            k = int(request.GET.get('k', self.default_k))
+        except (KeyError, TypeError, ValueError):
+            return JsonResponse({
+                'error': 'Invalid parameters',
+                'details': 'lat and lng must be numbers and k an integer'
+            }, status=400)
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or k < 1:
+            return JsonResponse({
+                'error': 'Invalid parameters',
+                'details': 'Coordinates out of range or k lower than 1'
+            }, status=400)
+        k = min(k, self.max_k)
+
+        category_id = None
+        category = request.GET.get('category')
+        if category:
+            category_id = self.resolve_category(category)
+            if category_id is None:
+                return JsonResponse({
+                    'error': 'Unknown category',
+                    'details': f'No waste category matches "{category}"'
+                }, status=404)
+
+        nearest = recycling_point_index.nearest(lat, lng, k, category_id)
+        points = RecyclingPoint.objects.filter(
+            id__in=[point_id for point_id, _ in nearest]
+        ).prefetch_related('accepted_categories').in_bulk()
+
+        weekday = current_weekday()
+        formatted_points = []
+        for point_id, distance in nearest:
+            point = points.get(point_id)
+            if point is None:
+                continue
+            formatted_points.append({
+                'id': point.id,
+                'name': point.name,
+                'latitude': float(point.latitude),
+                'longitude': float(point.longitude),
+                'address': point.address,
+                'waste_types': [category.name for category in point.accepted_categories.all()],
+                'contact_info': point.contact_info,
+                'opening_hours': point.opening_hours.get(weekday, 'closed'),
+                'distance': round(distance, 2),
+            })
+
+        return JsonResponse(formatted_points, safe=False)
+
+    @staticmethod
+    def resolve_category(value: str) -> Optional[int]:
+        """Accept either a category id or its name (case insensitive)."""
+        lookup = Q(name__iexact=value)
+        if value.isdigit():
+            lookup |= Q(pk=int(value))
+        return WasteCategory.objects.filter(lookup).values_list('pk', flat=True).first()
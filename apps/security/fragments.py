@@ -0,0 +1,31 @@
+"""
+Per-user versions for the cached fragments of the profile pages.
+
+Fragments are cached under the user's current version token, so any write
+that changes what they show only has to replace the token: the stale
+fragments are never read again and expire on their own.
+"""
+from uuid import uuid4
+
+from django.core.cache import cache
+
+PROFILE_FRAGMENT_TIMEOUT = 60 * 10
+VERSION_TIMEOUT = 60 * 60 * 24
+
+
+def _version_key(user_id):
+    return f'profile_fragments:{user_id}'
+
+
+def profile_fragment_version(user_id):
+    """Current token to include in the ``{% cache %}`` key of the user's fragments."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid4().hex
+        cache.set(_version_key(user_id), version, VERSION_TIMEOUT)
+    return version
+
+
+def invalidate_profile_fragments(*user_ids):
+    if user_ids:
+        cache.set_many({_version_key(user_id): uuid4().hex for user_id in user_ids}, VERSION_TIMEOUT)
@@ -113,11 +113,14 @@ class User(AbstractUser):
         return None
     
     def increment_login_count(self, ip_address=None):
-        """Increment login count and update last login IP."""
+        """Increment login count and update last login IP with a single atomic UPDATE."""
+        changes = {'login_count': models.F('login_count') + 1}
+        if ip_address:
+            changes['last_login_ip'] = ip_address
+        type(self).objects.filter(pk=self.pk).update(**changes)
         self.login_count += 1
         if ip_address:
             self.last_login_ip = ip_address
-        self.save(update_fields=['login_count', 'last_login_ip'])
     
     def update_password(self, password):
         """Update user password and record the change time."""
@@ -133,6 +136,10 @@ class User(AbstractUser):
         """Get total points from user profile."""
         return self.profile.points if hasattr(self, 'profile') else 0
     
+    def get_total_detections(self):
+        """Get the number of detections counted in the user profile."""
+        return self.profile.total_detections if hasattr(self, 'profile') else 0
+    
     def get_active_badges(self):
         """Get user's earned badges."""
         return self.profile.badges if hasattr(self, 'profile') else []
\ No newline at end of file
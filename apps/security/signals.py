@@ -0,0 +1,37 @@
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.gamification.models import UserProfile
+from apps.security.fragments import invalidate_profile_fragments
+from apps.security.models import User
+from apps.security.telemetry import login_telemetry
+
+# Campos que no aparecen en los fragmentos del perfil
+UNCACHED_USER_FIELDS = {'last_login', 'login_count', 'last_login_ip', 'password', 'last_password_change'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= UNCACHED_USER_FIELDS:
+        return
+    invalidate_profile_fragments(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def user_stats_changed(sender, instance, **kwargs):
+    invalidate_profile_fragments(instance.user_id)
+
+
+# La telemetría escribe last_login junto con el contador y la IP, en lote
+user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+
+
+@receiver(user_logged_in)
+def user_logged_in_telemetry(sender, request, user, **kwargs):
+    user.last_login = timezone.now()
+    ip_address = request.META.get('REMOTE_ADDR') if request is not None else None
+    login_telemetry.record(user.pk, ip_address, user.last_login)
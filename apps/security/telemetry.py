@@ -0,0 +1,142 @@
+"""
+Login telemetry (login count, last IP, last login time).
+
+Logins are recorded in an in-process buffer that coalesces repeated logins
+of the same user, and a background thread writes everything pending in one
+``UPDATE`` every ``LOGIN_TELEMETRY_FLUSH_INTERVAL`` seconds, or sooner when
+``LOGIN_TELEMETRY_MAX_PENDING`` users are waiting. Counts are applied as
+``F('login_count') + n``, so concurrent writers never lose increments, and a
+burst of logins costs one write transaction instead of one per request.
+The stored ``last_login`` therefore trails the request that logged in by up
+to one interval. ``close`` flushes what is pending on worker and interpreter
+exit; a hard crash loses at most one interval of telemetry. Logins recorded inside a transaction are written
+in it directly, so they commit or roll back with the caller.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, DateTimeField, F, GenericIPAddressField, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LoginTelemetry:
+    def __init__(self, buffered=True, flush_interval=5.0, max_pending=500):
+        self.buffered = buffered
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}  # user_id -> [count, ip, last_login]
+        self._lock = threading.Lock()
+        # Serializa las escrituras, para que el cierre espere a la que esté en curso
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._wake = threading.Event()
+        self._pid = None
+
+    def record(self, user_id, ip_address=None, when=None):
+        entry = [1, ip_address, when or timezone.now()]
+        # Dentro de una transacción (p. ej. pruebas o ATOMIC_REQUESTS) se escribe en ella
+        # Tras el cierre ya no queda quien vacíe el buffer
+        if not self.buffered or self._closed or connection.in_atomic_block:
+            self.write({user_id: entry})
+            return
+        self._ensure_worker()
+        with self._lock:
+            self._merge(user_id, entry)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _merge(self, user_id, entry):
+        current = self._pending.get(user_id)
+        if current is None:
+            self._pending[user_id] = entry
+            return
+        current[0] += entry[0]
+        current[1] = entry[1] or current[1]
+        current[2] = max(current[2], entry[2])
+
+    def flush(self):
+        """Write every pending entry now; returns the number of users written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                self.write(pending)
+            except Exception:
+                # Devolver las entradas al buffer para reintentarlas en el siguiente ciclo
+                with self._lock:
+                    for user_id, entry in pending.items():
+                        self._merge(user_id, entry)
+                raise
+            return len(pending)
+
+    def close(self):
+        """Stop buffering and flush what is pending; later logins are written synchronously."""
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception:
+            # La base de datos puede no estar disponible al salir (p. ej. tras destruir la de pruebas)
+            logger.exception('Login telemetry lost %d pending users at exit', len(self._pending))
+
+    @staticmethod
+    def write(pending):
+        """Apply coalesced entries for many users in a single UPDATE."""
+        from apps.security.models import User
+
+        with_ip = {user_id: entry for user_id, entry in pending.items() if entry[1]}
+        with transaction.atomic():
+            User.objects.filter(pk__in=list(pending)).update(
+                login_count=F('login_count') + Case(
+                    *[When(pk=user_id, then=Value(entry[0])) for user_id, entry in pending.items()],
+                    default=Value(0), output_field=PositiveIntegerField(),
+                ),
+                last_login_ip=Case(
+                    *[When(pk=user_id, then=Value(entry[1])) for user_id, entry in with_ip.items()],
+                    default=F('last_login_ip'), output_field=GenericIPAddressField(),
+                ),
+                last_login=Case(
+                    *[When(pk=user_id, then=Value(entry[2])) for user_id, entry in pending.items()],
+                    default=F('last_login'), output_field=DateTimeField(),
+                ),
+            )
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # Tras un fork el hilo del padre no existe y su buffer no es nuestro
+            self._pending = {}
+            self._pid = pid
+            threading.Thread(target=self._worker, name='login-telemetry', daemon=True).start()
+            atexit.register(self.close)
+
+    def _worker(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Login telemetry flush failed')
+            finally:
+                close_old_connections()
+
+
+login_telemetry = LoginTelemetry(
+    buffered=getattr(settings, 'LOGIN_TELEMETRY_BUFFERED', True),
+    flush_interval=getattr(settings, 'LOGIN_TELEMETRY_FLUSH_INTERVAL', 5.0),
+    max_pending=getattr(settings, 'LOGIN_TELEMETRY_MAX_PENDING', 500),
+)
@@ -1,3 +1,131 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.gamification.models import UserProfile
+from apps.gamification.points import award_points
+from apps.security.models import User
+from apps.security.telemetry import LoginTelemetry
+from apps.waste.models import ImpactMetric, WasteCategory
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, LEADERBOARD_BACKEND='memory')
+class ProfilePageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        UserProfile.objects.update_or_create(user=self.user, defaults={'points': 40, 'total_detections': 7})
+        self.client.force_login(self.user)
+
+    def profile(self):
+        response = self.client.get(reverse('security:profile'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_profile_costs_one_user_query(self):
+        self.profile()
+        # Sesión, usuario autenticado y usuario con su perfil; el fragmento sale de la caché
+        with self.assertNumQueries(3):
+            response = self.profile()
+        self.assertEqual(response.context['impact_metrics'], {'total_scans': 7})
+
+    def test_fragment_is_rendered_again_after_points_change(self):
+        self.assertContains(self.profile(), '>40<')
+        with self.captureOnCommitCallbacks(execute=True):
+            award_points(self.user, 25)
+        self.assertContains(self.profile(), '>65<')
+
+    def test_impact_metrics_do_not_invalidate_the_fragment(self):
+        self.profile()
+        version = self.profile().context['fragment_version']
+        category = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        ImpactMetric.objects.create(user=self.user, waste_category=category, quantity=1, co2_saved=1, water_saved=1)
+        self.assertEqual(self.profile().context['fragment_version'], version)
+
+    def test_login_fields_do_not_invalidate_the_fragment(self):
+        version = self.profile().context['fragment_version']
+        self.user.bio = 'Recicladora'
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.profile().context['fragment_version'], version)
+        self.user.save()
+        self.assertNotEqual(self.profile().context['fragment_version'], version)
+
+
+class LoginTelemetryTests(TransactionTestCase):
+    def setUp(self):
+        self.ana = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.luis = User.objects.create_user(username='luis', password='secret', email='luis@example.com')
+        self.telemetry = LoginTelemetry(flush_interval=3600, max_pending=2)
+        # Sin hilo de fondo: las pruebas vacían el buffer a mano
+        patcher = mock.patch.object(LoginTelemetry, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = timezone.now()
+
+    def stored(self, user):
+        user.refresh_from_db()
+        return user.login_count, user.last_login_ip, user.last_login
+
+    def test_logins_are_coalesced_into_one_update(self):
+        self.telemetry.record(self.ana.pk, '10.0.0.1', self.now)
+        self.telemetry.record(self.ana.pk, None, self.now - timedelta(minutes=1))
+        self.telemetry.record(self.luis.pk, '10.0.0.2', self.now)
+        # last_login se escribe fuera de la petición
+        self.assertEqual(self.stored(self.ana), (0, None, None))
+
+        # BEGIN, un único UPDATE para los dos usuarios y COMMIT
+        with self.assertNumQueries(3):
+            self.assertEqual(self.telemetry.flush(), 2)
+        self.assertEqual(self.stored(self.ana), (2, '10.0.0.1', self.now))
+        self.assertEqual(self.stored(self.luis), (1, '10.0.0.2', self.now))
+        self.assertEqual(self.telemetry.flush(), 0)
+
+    def test_full_buffer_wakes_the_writer(self):
+        self.telemetry.record(self.ana.pk, None, self.now)
+        self.telemetry.record(self.ana.pk, None, self.now)
+        self.assertFalse(self.telemetry._wake.is_set())
+        self.telemetry.record(self.luis.pk, None, self.now)
+        self.assertTrue(self.telemetry._wake.is_set())
+
+    def test_failed_writes_are_retried(self):
+        self.telemetry.record(self.ana.pk, '10.0.0.1', self.now)
+        with mock.patch.object(LoginTelemetry, 'write', side_effect=RuntimeError('base de datos caída')):
+            with self.assertRaises(RuntimeError):
+                self.telemetry.flush()
+        self.telemetry.record(self.ana.pk, None, self.now)
+        self.telemetry.flush()
+        self.assertEqual(self.stored(self.ana), (2, '10.0.0.1', self.now))
+
+    def test_close_flushes_and_writes_later_logins_directly(self):
+        self.telemetry.record(self.ana.pk, None, self.now)
+        self.telemetry.close()
+        self.assertEqual(self.stored(self.ana)[0], 1)
+        self.telemetry.record(self.ana.pk, None, self.now)
+        self.assertEqual(self.stored(self.ana)[0], 2)
+
+    def test_close_logs_what_it_could_not_write(self):
+        self.telemetry.record(self.ana.pk, None, self.now)
+        with mock.patch.object(LoginTelemetry, 'write', side_effect=RuntimeError('base de datos caída')):
+            with self.assertLogs('apps.security.telemetry', 'ERROR') as logs:
+                self.telemetry.close()
+        self.assertIn('lost 1 pending users', logs.output[0])
+
+    def test_logins_inside_a_transaction_are_written_in_it(self):
+        with transaction.atomic():
+            self.telemetry.record(self.ana.pk, '10.0.0.1', self.now)
+            self.assertEqual(self.stored(self.ana), (1, '10.0.0.1', self.now))
+        self.assertEqual(self.telemetry._pending, {})
+
+
+class LoginSignalTests(TestCase):
+    def test_login_updates_the_telemetry(self):
+        user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.assertTrue(self.client.login(email='ana@example.com', password='secret'))
+        user.refresh_from_db()
+        self.assertEqual(user.login_count, 1)
+        self.assertIsNotNone(user.last_login)
@@ -7,13 +7,13 @@ from django.contrib import messages
 from django.urls import reverse_lazy
 from django.views.generic import DetailView, UpdateView, View
 from django.utils.translation import gettext_lazy as _
-from torch import layout
 from apps.security.forms.auth import UserRegistrationForm
 from django.contrib.auth.decorators import login_required
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 import os
 from apps.security.forms.profileForm import UserProfileForm
+from apps.security.fragments import PROFILE_FRAGMENT_TIMEOUT, profile_fragment_version
 from apps.security.models import User
 
 class LoginView(View):
@@ -31,7 +31,6 @@ class LoginView(View):
         user = authenticate(email=email, password=password)
         if user is not None:
             login(request, user)
-            user.increment_login_count(request.META.get('REMOTE_ADDR'))
             messages.success(request, _('¡Bienvenido de nuevo!'))
             return redirect('home')
         else:
@@ -69,25 +68,29 @@ class ProfileView(LoginRequiredMixin, DetailView):
         """
         Get the user profile to display. If a username is provided in the URL,
         show that user's profile (if public). Otherwise, show the current user's profile.
+        The gamification profile is fetched in the same query.
         """
+        users = self.model.objects.select_related('profile')
         if self.kwargs.get('username'):
-            user = self.model.objects.filter(username=self.kwargs['username']).first()
+            user = users.filter(username=self.kwargs['username']).first()
             if user and user.privacy_settings.get('public_profile', False):
                 return user
             raise Http404(_("Profile not found or is private"))
-        return self.request.user
+        return users.get(pk=self.request.user.pk)
 
     def get_context_data(self, **kwargs):
         """Add additional context data for the template."""
         context = super().get_context_data(**kwargs)
-        user = self.get_object()
+        user = self.object
         
-        # Add impact metrics and other relevant data
+        # Everything the stats fragment shows comes from the user/profile query
         context.update({
-            'impact_metrics': user.get_impact_metrics(),
+            'impact_metrics': {'total_scans': user.get_total_detections()},
             'total_points': user.get_total_points(),
             'active_badges': user.get_active_badges(),
             'is_own_profile': user == self.request.user,
+            'fragment_version': profile_fragment_version(user.pk),
+            'fragment_timeout': PROFILE_FRAGMENT_TIMEOUT,
         })
         
         return context
@@ -100,8 +103,8 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy('security:profile')
     
     def get_object(self, queryset=None):
-        """Retorna el usuario actual"""
-        return self.request.user
+        """Retorna el usuario actual junto con su perfil de gamificación"""
+        return self.model.objects.select_related('profile').get(pk=self.request.user.pk)
     
     def form_valid(self, form):
         """Si el formulario es válido, guarda los cambios y muestra un mensaje"""
@@ -117,8 +120,10 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
         """Añade datos adicionales al contexto"""
         context = super().get_context_data(**kwargs)
         context['title'] = 'Actualizar Perfil'
-        context['user_points'] = self.request.user.get_total_points()
-        context['active_badges'] = self.request.user.get_active_badges()
+        context['user_points'] = self.object.get_total_points()
+        context['active_badges'] = self.object.get_active_badges()
+        context['fragment_version'] = profile_fragment_version(self.object.pk)
+        context['fragment_timeout'] = PROFILE_FRAGMENT_TIMEOUT
         return context
     
 class LogoutView(View):
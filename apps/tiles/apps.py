@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class TilesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.tiles'
+
+    def ready(self):
+        from apps.tiles import signals  # noqa: F401
@@ -0,0 +1,101 @@
+"""
+Rendered tile cache with per-tile invalidation.
+
+Every tile has a version token in the cache, and the rendered payload is
+stored under a key that includes it. Once the transaction that changes a
+point commits, the tokens of the tiles containing it are replaced at every
+zoom level, so only those tiles are rendered again; a render racing with the
+change stores its result under the old token, where nobody looks. Bulk writes that skip model signals replace
+the layer generation instead, which is part of every token of the layer.
+"""
+import json
+from typing import Iterable, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.tiles.layers import LAYERS, max_zoom, tile_coordinates, tile_for
+from apps.tiles.mvt import EXTENT, encode_tile
+
+FORMATS = {'geojson': 'application/geo+json', 'mvt': 'application/vnd.mapbox-vector-tile'}
+
+
+def cache_timeout() -> int:
+    return getattr(settings, 'TILES_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _generation_key(layer: str) -> str:
+    return f'tiles:{layer}:generation'
+
+
+def _token_key(layer: str, z: int, x: int, y: int) -> str:
+    return f'tiles:{layer}:{z}/{x}/{y}:token'
+
+
+def bump_layer(layer: str):
+    """Mark every tile of ``layer`` as stale."""
+    cache.set(_generation_key(layer), uuid4().hex, None)
+
+
+def tile_version(layer: str, z: int, x: int, y: int) -> str:
+    generation_key = _generation_key(layer)
+    token_key = _token_key(layer, z, x, y)
+    found = cache.get_many([generation_key, token_key])
+    generation = found.get(generation_key)
+    if generation is None:
+        generation = uuid4().hex
+        cache.add(generation_key, generation, None)
+        generation = cache.get(generation_key, generation)
+    token = found.get(token_key)
+    if token is None:
+        # Sin token no hay copia válida: uno nuevo, que caduca junto con las teselas
+        token = uuid4().hex
+        cache.add(token_key, token, cache_timeout())
+        token = cache.get(token_key, token)
+    return f'{generation}.{token}'
+
+
+def invalidate_points(layer: str, locations: Iterable[Tuple[float, float]]):
+    """Replace the tokens of the tiles containing ``(lat, lng)`` at every zoom level."""
+    keys = set()
+    for lat, lng in locations:
+        if lat is None or lng is None:
+            continue
+        for z in range(max_zoom() + 1):
+            keys.add(_token_key(layer, z, *tile_for(float(lat), float(lng), z)))
+    if keys:
+        cache.set_many({key: uuid4().hex for key in keys}, cache_timeout())
+
+
+def render(layer: str, z: int, x: int, y: int, fmt: str):
+    features = LAYERS[layer].features(z, x, y)
+    if fmt == 'mvt':
+        tx, ty = tile_coordinates([lat for _, lat, _, _ in features], [lng for lng, _, _, _ in features], z)
+        return encode_tile({layer: [
+            (int((px - x) * EXTENT), int((py - y) * EXTENT), properties, feature_id)
+            for (_, _, properties, feature_id), px, py in zip(features, tx.tolist(), ty.tolist())
+        ]})
+    return json.dumps({
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                **({'id': feature_id} if feature_id is not None else {}),
+                'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+                'properties': properties,
+            }
+            for lng, lat, properties, feature_id in features
+        ],
+    }, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def get_tile(layer: str, z: int, x: int, y: int, fmt: str, version: str) -> bytes:
+    """Rendered tile for ``version`` (see ``tile_version``), from the cache when possible."""
+    key = f'tiles:{layer}:{z}/{x}/{y}:{fmt}:{version}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = render(layer, z, x, y, fmt)
+        cache.set(key, payload, cache_timeout())
+    return payload
@@ -0,0 +1,191 @@
+"""
+Map layers served as XYZ tiles (Web Mercator).
+
+Each layer selects the rows inside a tile and turns them into point
+features. Below ``TILES_CLUSTER_MAX_ZOOM`` points are grouped on a fixed
+grid aligned to the tile, so clusters never straddle tile borders; each
+cluster carries its count and a histogram (severity for reports, accepted
+category for recycling points). Above it every point is sent as is.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.utils.text import slugify
+
+from apps.gamification.models import TrashReport
+from apps.recycling_points.models import RecyclingPoint
+from apps.utils.db import GroupConcat, split_group_concat
+
+MAX_LATITUDE = 85.05112878  # límite de la proyección Web Mercator
+
+# (lng, lat, properties, id)
+Feature = Tuple[float, float, Dict[str, object], Optional[int]]
+
+
+def max_zoom() -> int:
+    return getattr(settings, 'TILES_MAX_ZOOM', 20)
+
+
+def cluster_max_zoom() -> int:
+    return getattr(settings, 'TILES_CLUSTER_MAX_ZOOM', 15)
+
+
+def cluster_grid() -> int:
+    return getattr(settings, 'TILES_CLUSTER_GRID', 8)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """``(west, south, east, north)`` of a tile in degrees."""
+    n = 2 ** z
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def tile_coordinates(lats, lngs, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fractional tile coordinates of each point at zoom ``z``."""
+    n = 2 ** z
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    tx = (lngs + 180) / 360 * n
+    ty = (1 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2 * n
+    # El borde este/sur del mapa pertenece a la última tesela
+    return np.minimum(tx, np.nextafter(n, 0)), np.minimum(ty, np.nextafter(n, 0))
+
+
+def tile_for(lat: float, lng: float, z: int) -> Tuple[int, int]:
+    tx, ty = tile_coordinates([lat], [lng], z)
+    return int(tx[0]), int(ty[0])
+
+
+def cluster_points(
+    tx: np.ndarray,
+    ty: np.ndarray,
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    x: int,
+    y: int,
+    grid: int,
+    labels: Sequence[str],
+    members: Tuple[np.ndarray, np.ndarray],
+) -> Tuple[List[Feature], np.ndarray]:
+    """
+    Group the points of tile ``(x, y)`` into ``grid`` x ``grid`` cells.
+
+    ``members`` pairs point positions with label positions (a point may have
+    several labels, or none). Returns the clusters of cells holding more than
+    one point, with centroid, ``count`` and one ``<label>`` count per label,
+    and the positions of the points left alone in their cell.
+    """
+    cx = np.clip(((tx - x) * grid).astype(np.int64), 0, grid - 1)
+    cy = np.clip(((ty - y) * grid).astype(np.int64), 0, grid - 1)
+    cells, inverse, counts = np.unique(cy * grid + cx, return_inverse=True, return_counts=True)
+    size = len(cells)
+    lat_sums = np.bincount(inverse, weights=lats, minlength=size)
+    lng_sums = np.bincount(inverse, weights=lngs, minlength=size)
+    points, label_positions = members
+    histogram = np.bincount(
+        inverse[points] * len(labels) + label_positions, minlength=size * len(labels)
+    ).reshape(size, len(labels))
+
+    clusters = []
+    for cell in np.flatnonzero(counts > 1):
+        properties = {'cluster': True, 'count': int(counts[cell])}
+        properties.update({label: int(total) for label, total in zip(labels, histogram[cell])})
+        clusters.append((lng_sums[cell] / counts[cell], lat_sums[cell] / counts[cell], properties, None))
+    singles = np.flatnonzero(counts[inverse] == 1)
+    return clusters, singles
+
+
+class Layer:
+    name = ''
+    login_required = False
+
+    def rows(self, west, south, east, north) -> List[dict]:
+        raise NotImplementedError
+
+    def labels(self, rows) -> Tuple[List[str], Tuple[np.ndarray, np.ndarray]]:
+        """Histogram labels and ``(point position, label position)`` pairs."""
+        raise NotImplementedError
+
+    def properties(self, row) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def features(self, z: int, x: int, y: int) -> List[Feature]:
+        west, south, east, north = tile_bounds(z, x, y)
+        # Las teselas de los extremos también cubren las latitudes fuera de la proyección
+        rows = self.rows(west, -90 if y == 2 ** z - 1 else south, east, 90 if y == 0 else north)
+        if not rows:
+            return []
+        lats = np.array([row['latitude'] for row in rows], dtype=np.float64)
+        lngs = np.array([row['longitude'] for row in rows], dtype=np.float64)
+        tx, ty = tile_coordinates(lats, lngs, z)
+        # La consulta incluye los bordes; cada punto pertenece a una sola tesela
+        inside = np.flatnonzero((tx.astype(np.int64) == x) & (ty.astype(np.int64) == y))
+        rows = [rows[position] for position in inside]
+        lats, lngs, tx, ty = lats[inside], lngs[inside], tx[inside], ty[inside]
+
+        if z > cluster_max_zoom() or len(rows) < 2:
+            clusters, singles = [], range(len(rows))
+        else:
+            labels, members = self.labels(rows)
+            clusters, singles = cluster_points(tx, ty, lats, lngs, x, y, cluster_grid(), labels, members)
+        return clusters + [
+            (float(lngs[position]), float(lats[position]), self.properties(rows[position]), rows[position]['id'])
+            for position in singles
+        ]
+
+
+class ReportLayer(Layer):
+    name = 'reports'
+    login_required = True
+    severities = [value for value, _ in TrashReport.SEVERITY_CHOICES]
+
+    def rows(self, west, south, east, north):
+        return list(TrashReport.objects.filter(
+            latitude__range=(south, north), longitude__range=(west, east)
+        ).values('id', 'latitude', 'longitude', 'severity', 'status'))
+
+    def labels(self, rows):
+        positions = {severity: index for index, severity in enumerate(self.severities)}
+        members = np.array(
+            [(index, positions[row['severity']]) for index, row in enumerate(rows) if row['severity'] in positions],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return [f'severity_{severity}' for severity in self.severities], (members[:, 0], members[:, 1])
+
+    def properties(self, row):
+        return {'severity': row['severity'], 'status': row['status']}
+
+
+class RecyclingPointLayer(Layer):
+    name = 'recycling-points'
+
+    def rows(self, west, south, east, north):
+        rows = list(RecyclingPoint.objects.filter(
+            is_active=True, latitude__range=(south, north), longitude__range=(west, east)
+        ).values('id', 'name', 'latitude', 'longitude').annotate(
+            category_names=GroupConcat('accepted_categories__name')
+        ).order_by('id'))
+        for row in rows:
+            row['categories'] = sorted(split_group_concat(row.pop('category_names')))
+        return rows
+
+    def labels(self, rows):
+        names = sorted({name for row in rows for name in row['categories']})
+        positions = {name: index for index, name in enumerate(names)}
+        members = np.array(
+            [(index, positions[name]) for index, row in enumerate(rows) for name in row['categories']],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return [f'category_{slugify(name).replace("-", "_")}' for name in names], (members[:, 0], members[:, 1])
+
+    def properties(self, row):
+        return {'name': row['name'], 'categories': ','.join(row['categories'])}
+
+
+LAYERS: Dict[str, Layer] = {layer.name: layer for layer in (ReportLayer(), RecyclingPointLayer())}
@@ -0,0 +1,94 @@
+"""
+Minimal Mapbox Vector Tile (v2) encoder for point layers.
+
+Only what the tile endpoint needs is implemented: one or more layers of
+``POINT`` features with scalar properties, written straight to protobuf
+wire format so no vector tile library is required.
+"""
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EXTENT = 4096
+POINT = 1
+MOVE_TO_ONE = (1 & 0x7) | (1 << 3)  # comando MoveTo con un solo punto
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+# (x, y, properties, id) con x, y en coordenadas de la tesela [0, EXTENT)
+TileFeature = Tuple[int, int, Dict[str, object], Optional[int]]
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _tag(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes(field: int, payload: bytes) -> bytes:
+    return _tag(field, LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _bytes(field, b''.join(_varint(value) for value in values))
+
+
+def _value(value) -> bytes:
+    if isinstance(value, bool):
+        return _tag(7, VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return _tag(5, VARINT) + _varint(value)
+        return _tag(6, VARINT) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _tag(3, FIXED64) + struct.pack('<d', value)
+    return _bytes(1, str(value).encode('utf-8'))
+
+
+def encode_layer(name: str, features: List[TileFeature], extent: int = EXTENT) -> bytes:
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, object], int] = {}
+    encoded = []
+    for x, y, properties, feature_id in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        feature = b''
+        if feature_id is not None:
+            feature += _tag(1, VARINT) + _varint(feature_id)
+        feature += _packed(2, tags)
+        feature += _tag(3, VARINT) + _varint(POINT)
+        feature += _packed(4, (MOVE_TO_ONE, _zigzag(x), _zigzag(y)))
+        encoded.append(_bytes(2, feature))
+
+    layer = _tag(15, VARINT) + _varint(2) + _bytes(1, name.encode('utf-8'))
+    layer += b''.join(encoded)
+    layer += b''.join(_bytes(3, key.encode('utf-8')) for key in keys)
+    layer += b''.join(_bytes(4, _value(value)) for _, value in values)
+    layer += _tag(5, VARINT) + _varint(extent)
+    return layer
+
+
+def encode_tile(layers: Dict[str, List[TileFeature]], extent: int = EXTENT) -> bytes:
+    """Encode ``{layer name: features}`` as one tile; empty layers are omitted."""
+    return b''.join(
+        _bytes(3, encode_layer(name, features, extent)) for name, features in layers.items() if features
+    )
@@ -0,0 +1,80 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.gamification.models import TrashReport
+from apps.recycling_points.models import RecyclingPoint
+from apps.tiles.cache import bump_layer, invalidate_points
+from apps.tiles.layers import RecyclingPointLayer, ReportLayer
+from apps.waste.models import WasteCategory
+
+# Campos que aparecen en las teselas de cada capa
+TILE_FIELDS = {
+    TrashReport: {'latitude', 'longitude', 'severity', 'status'},
+    RecyclingPoint: {'latitude', 'longitude', 'is_active', 'name'},
+}
+LAYER_NAMES = {TrashReport: ReportLayer.name, RecyclingPoint: RecyclingPointLayer.name}
+
+
+def _touches_tiles(sender, update_fields):
+    return update_fields is None or bool(TILE_FIELDS[sender] & set(update_fields))
+
+
+def _invalidate_on_commit(layer, locations, using=None):
+    # Cambiar los tokens antes del commit dejaría que una tesela renderizada
+    # con las filas antiguas se guardara bajo el token nuevo
+    transaction.on_commit(partial(invalidate_points, layer, list(locations)), using=using)
+
+
+@receiver(pre_save, sender=TrashReport)
+@receiver(pre_save, sender=RecyclingPoint)
+def remember_tile_location(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Al mover un punto también cambia la tesela de la que sale
+    instance._tile_origin = None
+    if instance.pk and not raw and _touches_tiles(sender, update_fields):
+        instance._tile_origin = sender._base_manager.filter(pk=instance.pk).values_list(
+            'latitude', 'longitude'
+        ).first()
+
+
+@receiver(post_save, sender=TrashReport)
+@receiver(post_save, sender=RecyclingPoint)
+def point_saved(sender, instance, using=None, update_fields=None, **kwargs):
+    if not _touches_tiles(sender, update_fields):
+        return
+    locations = [(instance.latitude, instance.longitude)]
+    origin = getattr(instance, '_tile_origin', None)
+    if origin and origin != locations[0]:
+        locations.append(origin)
+    _invalidate_on_commit(LAYER_NAMES[sender], locations, using)
+
+
+@receiver(post_delete, sender=TrashReport)
+@receiver(post_delete, sender=RecyclingPoint)
+def point_deleted(sender, instance, using=None, **kwargs):
+    _invalidate_on_commit(LAYER_NAMES[sender], [(instance.latitude, instance.longitude)], using)
+
+
+@receiver(m2m_changed, sender=RecyclingPoint.accepted_categories.through)
+def recycling_point_categories_changed(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _invalidate_on_commit(RecyclingPointLayer.name, [(instance.latitude, instance.longitude)], using)
+    elif pk_set:
+        _invalidate_on_commit(
+            RecyclingPointLayer.name,
+            RecyclingPoint.objects.using(using).filter(pk__in=pk_set).values_list('latitude', 'longitude'),
+            using,
+        )
+    else:
+        transaction.on_commit(partial(bump_layer, RecyclingPointLayer.name), using=using)
+
+
+@receiver(post_save, sender=WasteCategory)
+@receiver(post_delete, sender=WasteCategory)
+def waste_category_changed(sender, using=None, **kwargs):
+    # Los nombres de categoría aparecen en los histogramas de todas las teselas
+    transaction.on_commit(partial(bump_layer, RecyclingPointLayer.name), using=using)
@@ -0,0 +1,25 @@
+from django.test import TestCase, override_settings
+
+from apps.recycling_points.models import RecyclingPoint
+from apps.tiles.cache import tile_version
+from apps.tiles.layers import RecyclingPointLayer, tile_for
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TileInvalidationTests(TestCase):
+    layer = RecyclingPointLayer.name
+
+    def version(self, z=12):
+        return tile_version(self.layer, z, *tile_for(-0.18, -78.48, z))
+
+    def test_tokens_change_only_after_commit(self):
+        before = self.version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            RecyclingPoint.objects.create(name='Punto limpio', latitude=-0.18, longitude=-78.48)
+            # Una tesela renderizada antes del commit debe quedar bajo el token antiguo
+            self.assertEqual(self.version(), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(self.version(), before)
@@ -0,0 +1,9 @@
+from django.urls import path
+from apps.tiles.views.tiles import tile_view
+
+app_name = 'tiles'
+
+urlpatterns = [
+    path('<slug:layer>/<int:z>/<int:x>/<int:y>', tile_view, name='tile'),
+    path('<slug:layer>/<int:z>/<int:x>/<int:y>.<slug:fmt>', tile_view, name='tile-format'),
+]
@@ -0,0 +1,42 @@
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_http_methods
+
+from apps.tiles.cache import FORMATS, get_tile, tile_version
+from apps.tiles.layers import LAYERS, max_zoom
+
+FORMAT_ALIASES = {'json': 'geojson', 'pbf': 'mvt'}
+
+
+@require_http_methods(["GET"])
+def tile_view(request, layer, z, x, y, fmt=None):
+    """
+    Tesela ``z/x/y`` de una capa (``reports`` o ``recycling-points``) en
+    GeoJSON o Mapbox Vector Tile, según la extensión o ``?format=``. A zoom
+    bajo los puntos llegan agrupados con su recuento e histograma.
+    """
+    tile_layer = LAYERS.get(layer)
+    if tile_layer is None:
+        return JsonResponse({'error': 'Unknown layer', 'details': f'Available layers: {", ".join(LAYERS)}'}, status=404)
+
+    fmt = fmt or request.GET.get('format', 'geojson')
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in FORMATS:
+        return JsonResponse({'error': 'Unknown format', 'details': f'Available formats: {", ".join(FORMATS)}'}, status=400)
+    if z > max_zoom() or x >= 2 ** z or y >= 2 ** z:
+        return JsonResponse({'error': 'Tile out of range', 'details': f'Zoom levels go from 0 to {max_zoom()}'}, status=404)
+
+    if tile_layer.login_required and not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    version = tile_version(layer, z, x, y)
+    etag = f'"{fmt}-{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(get_tile(layer, z, x, y, fmt, version), content_type=FORMATS[fmt])
+        response['ETag'] = etag
+    # Los clientes revalidan cada vez; una tesela sin cambios cuesta un 304 vacío
+    if tile_layer.login_required:
+        patch_cache_control(response, private=True)
+    patch_cache_control(response, no_cache=True)
+    return response
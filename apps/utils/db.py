@@ -0,0 +1,25 @@
+"""Expresiones de base de datos compartidas entre aplicaciones."""
+from django.db.models import Aggregate, CharField, Value
+
+GROUP_CONCAT_SEPARATOR = '\x1f'
+
+
+class GroupConcat(Aggregate):
+    """
+    Concatenate the non-null values of a group into one string, joined by
+    ``GROUP_CONCAT_SEPARATOR``. Renders as GROUP_CONCAT on SQLite and
+    STRING_AGG on PostgreSQL. Use ``split_group_concat`` to read it back.
+    """
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, Value(GROUP_CONCAT_SEPARATOR), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+def split_group_concat(value):
+    """Turn a GroupConcat result back into a list of strings."""
+    return value.split(GROUP_CONCAT_SEPARATOR) if value else []
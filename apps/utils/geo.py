@@ -0,0 +1,201 @@
+"""Utilidades geoespaciales compartidas entre aplicaciones."""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Radio de la Tierra en km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_PRECISION = 12
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_GEOHASH_DECODE = {char: index for index, char in enumerate(_GEOHASH_BASE32)}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Calculate the great circle distance between two points on Earth."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_many(lat, lng, lats, lngs) -> np.ndarray:
+    """
+    Vectorized great circle distance in km from one point to many.
+    ``lats``/``lngs`` are array-likes of the same shape; the result is a
+    float64 array of that shape.
+    """
+    phi1 = np.radians(float(lat))
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(np.asarray(lngs, dtype=np.float64) - float(lng))
+
+    a = np.sin(delta_phi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """
+    Vectorized pairwise great circle distances in km. Returns an array of
+    shape ``(len(lats1), len(lats2))``.
+    """
+    phi1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, np.newaxis]
+    lambda1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, np.newaxis]
+    phi2 = np.radians(np.asarray(lats2, dtype=np.float64))[np.newaxis, :]
+    lambda2 = np.radians(np.asarray(lngs2, dtype=np.float64))[np.newaxis, :]
+
+    a = np.sin((phi2 - phi1) / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin((lambda2 - lambda1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geohash_encode(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Encode a coordinate pair as a geohash string of the given precision."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) for a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _GEOHASH_DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """Return the (height, width) in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def _longitude_extent(lat: float, radius_km: float) -> Optional[float]:
+    """Half-width in degrees of longitude of a circle, or ``None`` if it covers a pole."""
+    sin_radius = math.sin(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    if radius_km / EARTH_RADIUS_KM >= math.pi / 2 or sin_radius >= cos_lat:
+        return None
+    return math.degrees(math.asin(sin_radius / cos_lat))
+
+
+def geohash_precision_for_radius(lat: float, radius_km: float) -> int:
+    """
+    Largest geohash precision whose cells are at least ``radius_km`` tall and
+    wide at the given latitude, so a search circle always fits inside the
+    3x3 neighbourhood of the cell containing its centre. Returns 0 when no
+    precision is coarse enough.
+    """
+    lat_extent = radius_km / KM_PER_DEGREE
+    lng_extent = _longitude_extent(lat, radius_km)
+    if lng_extent is None:
+        return 0
+
+    precision = 0
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        height, width = geohash_cell_size(candidate)
+        if height < lat_extent or width < lng_extent:
+            break
+        precision = candidate
+    return precision
+
+
+def geohash_neighbourhood(lat: float, lng: float, precision: int) -> List[str]:
+    """Return the geohash cell containing the point plus its eight neighbours."""
+    center = geohash_encode(lat, lng, precision)
+    min_lat, max_lat, min_lng, max_lng = geohash_bounds(center)
+    height = max_lat - min_lat
+    width = max_lng - min_lng
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+
+    cells = []
+    for d_lat in (-1, 0, 1):
+        cell_lat = center_lat + d_lat * height
+        if not -90.0 < cell_lat < 90.0:
+            continue
+        for d_lng in (-1, 0, 1):
+            cell_lng = (center_lng + d_lng * width + 180.0) % 360.0 - 180.0
+            cell = geohash_encode(cell_lat, cell_lng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def geohash_range(prefix: str) -> Tuple[str, str]:
+    """
+    Half-open string range ``[start, end)`` matching every geohash that starts
+    with ``prefix``. Range lookups use a plain B-tree index on every backend,
+    unlike ``LIKE 'prefix%'``.
+    """
+    return prefix, prefix + '~'
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, Optional[float], Optional[float]]:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of
+    ``radius_km``. Longitude bounds are ``None`` when the box would wrap
+    around a pole or the antimeridian.
+    """
+    lat_extent = radius_km / KM_PER_DEGREE
+    min_lat = max(lat - lat_extent, -90.0)
+    max_lat = min(lat + lat_extent, 90.0)
+
+    lng_extent = _longitude_extent(lat, radius_km)
+    if lng_extent is None:
+        return min_lat, max_lat, None, None
+
+    min_lng = lng - lng_extent
+    max_lng = lng + lng_extent
+    if min_lng < -180.0 or max_lng > 180.0:
+        return min_lat, max_lat, None, None
+    return min_lat, max_lat, min_lng, max_lng
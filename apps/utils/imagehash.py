@@ -0,0 +1,197 @@
+"""Hashes perceptuales de imágenes y búsqueda de casi duplicados por zona."""
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Tuple
+from uuid import uuid4
+
+import numpy as np
+from django.core.cache import cache
+from PIL import Image
+
+from apps.utils.geo import geohash_encode, geohash_neighbourhood, haversine
+
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+PHASH_SIZE = 32  # lado de la imagen reducida sobre la que se calcula la DCT
+PHASH_LOW_FREQ = 8
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    k = np.arange(size)[:, np.newaxis]
+    n = np.arange(size)[np.newaxis, :]
+    return np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in np.asarray(bits).ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash(image: Image.Image) -> int:
+    """
+    64-bit perceptual hash: the sign of the 8x8 lowest DCT frequencies of a
+    32x32 grayscale copy relative to their median. Robust to rescaling,
+    recompression and small colour changes.
+    """
+    pixels = np.asarray(
+        image.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float64
+    )
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_LOW_FREQ, :PHASH_LOW_FREQ].ravel()
+    # El coeficiente DC solo refleja el brillo medio y sesgaría la mediana
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 thumbnail is brighter than its left neighbour."""
+    pixels = np.asarray(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit hash into the range of a ``BigIntegerField``."""
+    value &= HASH_MASK
+    return value - (1 << HASH_BITS) if value >> (HASH_BITS - 1) else value
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits; works for signed and unsigned representations."""
+    return ((a ^ b) & HASH_MASK).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over a metric, here the Hamming distance between
+    hashes. Each child edge is labelled with its distance to the parent, so
+    by the triangle inequality a search for ``radius`` only descends into
+    edges labelled within ``[d - radius, d + radius]``.
+    """
+
+    def __init__(self, distance: Callable[[int, int], int] = hamming):
+        self.distance = distance
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key: int, value) -> None:
+        node = (key, value, {})
+        self._size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            d = self.distance(key, current[0])
+            child = current[2].get(d)
+            if child is None:
+                current[2][d] = node
+                return
+            current = child
+
+    def search(self, key: int, radius: int) -> List[Tuple[int, int, object]]:
+        """Return ``(distance, key, value)`` for every entry within ``radius`` of ``key``."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            d = self.distance(key, node_key)
+            if d <= radius:
+                found.append((d, node_key, value))
+            for edge, child in children.items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return found
+
+
+class CellHashIndex:
+    """
+    Near-duplicate image lookup keyed by location.
+
+    Hashes are grouped by geohash cell (precision 7, about 150 m) with one
+    BK-tree per cell, built lazily from ``load_cell(cell)``, which yields
+    ``(item_id, image_hash, lat, lng)`` rows. A query only touches the cell of
+    the point and its eight neighbours. Each cell carries a version token in
+    the shared cache; ``invalidate`` bumps it so every process reloads that
+    cell.
+    """
+
+    def __init__(self, name: str, load_cell: Callable[[str], Iterable], precision: int = 7, max_cells: int = 1024):
+        self.name = name
+        self.load_cell = load_cell
+        self.precision = precision
+        self.max_cells = max_cells
+        self._cells = OrderedDict()  # cell -> (version, BKTree)
+        self._lock = threading.Lock()
+
+    def cell_for(self, lat: float, lng: float) -> str:
+        return geohash_encode(lat, lng, self.precision)
+
+    def _version_key(self, cell: str) -> str:
+        return f'{self.name}:cell:{cell}'
+
+    def _tree(self, cell: str, version: str) -> BKTree:
+        with self._lock:
+            entry = self._cells.get(cell)
+            if entry is not None and entry[0] == version:
+                self._cells.move_to_end(cell)
+                return entry[1]
+        tree = BKTree()
+        for item_id, image_hash, lat, lng in self.load_cell(cell):
+            tree.add(image_hash, (item_id, float(lat), float(lng)))
+        with self._lock:
+            self._cells[cell] = (version, tree)
+            self._cells.move_to_end(cell)
+            while len(self._cells) > self.max_cells:
+                self._cells.popitem(last=False)
+        return tree
+
+    def _versions(self, cells: List[str]) -> dict:
+        keys = {self._version_key(cell): cell for cell in cells}
+        stored = cache.get_many(list(keys))
+        missing = {key: uuid4().hex for key in keys if key not in stored}
+        if missing:
+            cache.set_many(missing, None)
+            stored.update(missing)
+        return {cell: stored[key] for key, cell in keys.items()}
+
+    def near_duplicates(
+        self, lat: float, lng: float, image_hash: int, max_distance: int, radius_km: float, exclude=None
+    ) -> List[Tuple[object, int, float]]:
+        """
+        Items within ``radius_km`` whose hash differs in at most
+        ``max_distance`` bits, as ``(item_id, bits, km)`` sorted by bits then km.
+        """
+        cells = geohash_neighbourhood(lat, lng, self.precision)
+        matches = []
+        for cell, version in self._versions(cells).items():
+            for bits, _, (item_id, item_lat, item_lng) in self._tree(cell, version).search(image_hash, max_distance):
+                if item_id == exclude:
+                    continue
+                km = haversine(lat, lng, item_lat, item_lng)
+                if km <= radius_km:
+                    matches.append((item_id, bits, km))
+        matches.sort(key=lambda match: (match[1], match[2]))
+        return matches
+
+    def invalidate(self, lat: float, lng: float) -> None:
+        """
+        Mark the cell containing a new or changed item as stale in every
+        process. The cell is reloaded on its next query, which also picks up
+        items other processes added concurrently.
+        """
+        cell = self.cell_for(lat, lng)
+        cache.set(self._version_key(cell), uuid4().hex, None)
+        with self._lock:
+            self._cells.pop(cell, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells.clear()
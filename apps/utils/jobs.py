@@ -0,0 +1,68 @@
+"""Cola local de trabajos en segundo plano, sin broker externo."""
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Ejecuta funciones en un pool de hilos del propio proceso.
+
+    El pool se crea en el primer ``submit`` y se vuelve a crear si el proceso
+    fue bifurcado (workers de gunicorn), ya que los hilos no sobreviven al
+    ``fork``. Con ``run_async=False`` los trabajos corren en línea, lo que es
+    útil en pruebas y comandos de gestión.
+    """
+
+    def __init__(self, name, max_workers=2, run_async=True):
+        self.name = name
+        self.max_workers = max_workers
+        self.run_async = run_async
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        if not self.run_async:
+            future = Future()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                logger.exception('Job %s failed in queue %s', func.__name__, self.name)
+                future.set_exception(e)
+            return future
+        return self._get_executor().submit(self._run, func, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
+
+    def _get_executor(self):
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+                    self._pid = pid
+        return self._executor
+
+    def _run(self, func, *args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception('Job %s failed in queue %s', func.__name__, self.name)
+            raise
+        finally:
+            # Cada hilo abre su propia conexión; se cierra al terminar el trabajo
+            connections.close_all()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.waste.models import WasteCategory, ImpactMetric
+from apps.waste.models import WasteCategory, ImpactMetric, ImpactRollup
 
 @admin.register(WasteCategory)
 class WasteCategoryAdmin(admin.ModelAdmin):
@@ -24,3 +24,11 @@ class ImpactMetricAdmin(admin.ModelAdmin):
             'fields': ('user', 'waste_category', 'quantity', 'co2_saved', 'water_saved', 'date')
         }),
     )
+
+@admin.register(ImpactRollup)
+class ImpactRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'waste_category', 'date', 'entries', 'quantity', 'co2_saved', 'water_saved')
+    search_fields = ('user__username', 'waste_category__name')
+    list_filter = ('waste_category', 'date')
+    ordering = ['-date']
+    readonly_fields = ('user', 'waste_category', 'date', 'entries', 'quantity', 'co2_saved', 'water_saved')
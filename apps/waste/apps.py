@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class WasteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.waste'
+
+    def ready(self):
+        from apps.waste import signals  # noqa: F401
+
+        if getattr(settings, 'WASTE_DETECTION_WARMUP', False):
+            from apps.waste.inference import registry
+
+            registry.warm_up()
@@ -0,0 +1,169 @@
+"""
+Local waste detection inference.
+
+Uploads are scored by a YOLO model loaded in-process. Concurrent requests are
+coalesced by ``MicroBatcher`` into a single forward pass: the first request
+in an empty queue waits at most ``max_latency`` seconds for company, then up
+to ``max_batch_size`` images go through the model together.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import List
+
+from django.conf import settings
+from PIL import Image
+
+from apps.waste.registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Prediction:
+    label: str
+    confidence: float
+    x: float
+    y: float
+    width: float
+    height: float
+
+    def as_dict(self):
+        """Roboflow-compatible prediction shape, as consumed by camera.js."""
+        return {
+            'class': self.label,
+            'confidence': round(self.confidence, 4),
+            'x': round(self.x, 1),
+            'y': round(self.y, 1),
+            'width': round(self.width, 1),
+            'height': round(self.height, 1),
+        }
+
+
+class YOLODetector:
+    """Thin wrapper around an ultralytics YOLO model."""
+
+    def __init__(self, weights, confidence=0.25, image_size=640, device='cpu'):
+        from ultralytics import YOLO
+
+        self.model = YOLO(str(weights))
+        self.confidence = confidence
+        self.image_size = image_size
+        self.device = device
+
+    def predict(self, images) -> List[List[Prediction]]:
+        """Run one forward pass over a batch of PIL images."""
+        results = self.model.predict(
+            images, conf=self.confidence, imgsz=self.image_size, device=self.device, verbose=False
+        )
+        batch = []
+        for result in results:
+            names = result.names
+            predictions = []
+            for box in result.boxes:
+                x, y, width, height = box.xywh[0].tolist()
+                predictions.append(Prediction(
+                    label=names[int(box.cls[0])],
+                    confidence=float(box.conf[0]),
+                    x=x, y=y, width=width, height=height,
+                ))
+            batch.append(predictions)
+        return batch
+
+
+class MicroBatcher:
+    """
+    Collect concurrent ``submit`` calls into batches for ``predict_batch``.
+
+    The worker thread starts on first use and again after a fork, since
+    threads do not survive ``os.fork`` in gunicorn workers.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_latency=0.01):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, image) -> Future:
+        future = Future()
+        self._get_queue().put((image, future))
+        return future
+
+    def predict(self, image, timeout=None):
+        return self.submit(image).result(timeout=timeout)
+
+    def _get_queue(self):
+        pid = os.getpid()
+        if self._queue is None or self._pid != pid:
+            with self._lock:
+                if self._queue is None or self._pid != pid:
+                    self._queue = queue.Queue()
+                    self._pid = pid
+                    threading.Thread(
+                        target=self._worker, args=(self._queue,), name='waste-inference', daemon=True
+                    ).start()
+        return self._queue
+
+    def _worker(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        images = [image for image, _ in batch]
+        try:
+            results = self.predict_batch(images)
+        except Exception as e:
+            logger.exception('Waste detection batch of %d images failed', len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+DETECTOR_NAME = 'waste-detector'
+
+
+def load_detector():
+    return YOLODetector(
+        settings.WASTE_DETECTION_MODEL,
+        confidence=settings.WASTE_DETECTION_CONFIDENCE,
+        image_size=settings.WASTE_DETECTION_IMAGE_SIZE,
+    )
+
+
+def warm_up_detector(detector):
+    size = settings.WASTE_DETECTION_IMAGE_SIZE
+    detector.predict([Image.new('RGB', (size, size))])
+
+
+registry.register(DETECTOR_NAME, load_detector, warm_up_detector)
+
+
+def get_detector():
+    """Return the detector, loading it on first use."""
+    return registry.get(DETECTOR_NAME)
+
+
+batcher = MicroBatcher(
+    lambda images: get_detector().predict(images),
+    max_batch_size=getattr(settings, 'WASTE_DETECTION_MAX_BATCH', 8),
+    max_latency=getattr(settings, 'WASTE_DETECTION_MAX_LATENCY', 0.01),
+)
@@ -0,0 +1,24 @@
+# apps/waste/management/commands/backfill_impact_rollups.py
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from apps.waste.models import ImpactMetric, ImpactRollup
+from apps.waste.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily impact rollups from the raw ImpactMetric table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Only rebuild buckets from this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        metrics = ImpactMetric.objects.all()
+        rollups = ImpactRollup.objects.all()
+        if options['since']:
+            metrics = metrics.filter(date__gte=options['since'])
+            rollups = rollups.filter(date__gte=options['since'])
+
+        buckets = rebuild(metrics, rollups)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {buckets} rollup buckets'))
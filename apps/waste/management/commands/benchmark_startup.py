@@ -0,0 +1,82 @@
+# apps/waste/management/commands/benchmark_startup.py
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so every stage starts from a cold process
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+stage = sys.argv[1]
+import django
+django.setup()
+result = {'stage': stage, 'setup_s': time.perf_counter() - start}
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+result['urls_s'] = time.perf_counter() - start
+result['heavy_modules'] = sorted(m for m in ('torch', 'ultralytics', 'roboflow', 'cv2', 'matplotlib', 'pandas') if m in sys.modules)
+
+if stage in ('preload', 'warm_up'):
+    from apps.waste.inference import registry
+    getattr(registry, stage)()
+    result['model_s'] = time.perf_counter() - start
+
+result['total_s'] = time.perf_counter() - start
+result['rss_mb'] = rss_mb()
+print(json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start time and RSS with lazy, preloaded and warmed-up detection models'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stages', nargs='+', default=['lazy', 'preload', 'warm_up'],
+            choices=['lazy', 'preload', 'warm_up'],
+            help='lazy: no model; preload: load weights; warm_up: load and run one inference'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Cold starts per stage, the fastest is kept')
+        parser.add_argument('--json', action='store_true', help='Print machine-readable JSON')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, WASTE_DETECTION_WARMUP='0')
+        results = []
+        for stage in options['stages']:
+            runs = []
+            for _ in range(max(options['repeat'], 1)):
+                completed = subprocess.run(
+                    [sys.executable, '-c', PROBE, stage], capture_output=True, text=True, env=env,
+                    cwd=settings.BASE_DIR,
+                )
+                if completed.returncode != 0:
+                    self.stderr.write(f'{stage} failed:\n{completed.stderr.strip()}')
+                    break
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            if runs:
+                results.append(min(runs, key=lambda run: run['total_s']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'stage':<10} {'setup s':>8} {'urls s':>8} {'total s':>8} {'RSS MB':>8}  heavy modules")
+        for run in results:
+            self.stdout.write(
+                f"{run['stage']:<10} {run['setup_s']:>8.2f} {run['urls_s']:>8.2f} "
+                f"{run['total_s']:>8.2f} {run['rss_mb']:>8.1f}  {', '.join(run['heavy_modules']) or '-'}"
+            )
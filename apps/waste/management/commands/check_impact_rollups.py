@@ -0,0 +1,47 @@
+# apps/waste/management/commands/check_impact_rollups.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.waste.models import ImpactMetric, ImpactRollup
+from apps.waste.rollups import TOTAL_FIELDS, diff, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Compare the daily impact rollups with the raw ImpactMetric table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Only check buckets from this date (YYYY-MM-DD)')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the buckets of every user with a mismatch')
+        parser.add_argument('--limit', type=int, default=20, help='Mismatches to print')
+
+    def handle(self, *args, **options):
+        metrics = ImpactMetric.objects.all()
+        rollups = ImpactRollup.objects.all()
+        if options['since']:
+            metrics = metrics.filter(date__gte=options['since'])
+            rollups = rollups.filter(date__gte=options['since'])
+
+        mismatches = diff(metrics, rollups)
+        for (user_id, category_id, day), expected, stored in mismatches[:options['limit']]:
+            self.stdout.write(
+                f'user {user_id} category {category_id} {day}: '
+                f'expected {self.totals(expected)} stored {self.totals(stored)}'
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Rollups match the raw metrics'))
+            return
+
+        if not options['fix']:
+            raise CommandError(f'{len(mismatches)} rollup buckets differ from the raw metrics')
+
+        users = {user_id for (user_id, _, _), _, _ in mismatches}
+        rebuild(metrics.filter(user_id__in=users), rollups.filter(user_id__in=users))
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} buckets for {len(users)} users'))
+
+    @staticmethod
+    def totals(bucket):
+        if bucket is None:
+            return '-'
+        return ', '.join(f'{field}={bucket[field]}' for field in TOTAL_FIELDS)
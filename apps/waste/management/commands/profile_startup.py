@@ -0,0 +1,167 @@
+# apps/waste/management/commands/profile_startup.py
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs under ``python -X importtime`` in a fresh interpreter; the import tree
+# goes to stderr and the phase timings to stdout
+PROBE = r'''
+import json, os, sys, time
+timings = {}
+start = time.perf_counter()
+
+from django.conf import settings
+settings.INSTALLED_APPS
+timings['settings_s'] = time.perf_counter() - start
+
+import django
+django.setup()
+timings['app_registry_s'] = time.perf_counter() - start
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+timings['url_resolver_s'] = time.perf_counter() - start
+
+print(json.dumps(timings))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+DEFAULT_HEAVY = ['torch', 'torchvision', 'ultralytics', 'roboflow', 'cv2', 'matplotlib', 'pandas', 'scipy', 'sklearn']
+
+
+def parse_importtime(lines):
+    """
+    Build the import tree from ``-X importtime`` output.
+
+    Children are printed before their parent with one more level of
+    indentation, so nodes are collected per depth until the parent shows up.
+    """
+    pending = {}
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        depth = (len(indent) - 1) // 2
+        node = {
+            'module': name,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+            'children': pending.pop(depth + 1, []),
+        }
+        pending.setdefault(depth, []).append(node)
+    return pending.get(0, [])
+
+
+def walk(nodes, path=()):
+    for node in nodes:
+        chain = path + (node['module'],)
+        yield node, chain
+        yield from walk(node['children'], chain)
+
+
+def is_project_module(name):
+    return name.split('.')[0] in {'apps', settings.ROOT_URLCONF.split('.')[0]}
+
+
+class Command(BaseCommand):
+    help = 'Profile startup imports and settings/app registry/URL resolver phases, writing a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='startup_profile.json', help='Path of the JSON report ("-" for stdout)')
+        parser.add_argument('--top', type=int, default=25, help='Number of slowest modules to list')
+        parser.add_argument('--heavy', nargs='+', default=DEFAULT_HEAVY, help='Top-level packages considered heavy')
+        parser.add_argument('--fail-on-heavy', action='store_true', help='Exit with an error if a heavy package is imported')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, WASTE_DETECTION_WARMUP='0')
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE], capture_output=True, text=True, env=env,
+            cwd=settings.BASE_DIR,
+        )
+        stderr_lines = completed.stderr.splitlines()
+        if completed.returncode != 0:
+            errors = [line for line in stderr_lines if not line.startswith('import time:')]
+            raise CommandError('Startup failed:\n' + '\n'.join(errors[-20:]))
+
+        phases = json.loads(completed.stdout.strip().splitlines()[-1])
+        tree = parse_importtime(stderr_lines)
+        report = {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'settings_module': env['DJANGO_SETTINGS_MODULE'],
+            'phases': phases,
+            'import_total_us': sum(node['cumulative_us'] for node in tree),
+            'module_count': sum(1 for _ in walk(tree)),
+            'slowest_modules': self.slowest(tree, options['top']),
+            'heavy_imports': self.heavy_imports(tree, set(options['heavy'])),
+            'tree': tree,
+        }
+
+        payload = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as f:
+                f.write(payload)
+            self.print_summary(report, options['output'])
+
+        if options['fail_on_heavy'] and report['heavy_imports']:
+            raise CommandError(
+                'Heavy packages imported at startup: '
+                + ', '.join(item['package'] for item in report['heavy_imports'])
+            )
+
+    @staticmethod
+    def slowest(tree, top):
+        nodes = sorted(walk(tree), key=lambda item: item[0]['self_us'], reverse=True)
+        return [
+            {'module': node['module'], 'self_us': node['self_us'], 'cumulative_us': node['cumulative_us']}
+            for node, _ in nodes[:top]
+        ]
+
+    @staticmethod
+    def heavy_imports(tree, heavy):
+        """
+        Heavy packages loaded during startup, with the project module that
+        pulled each one in. Nothing in startup runs a model or plots, so any
+        hit here is an import that belongs inside the function that uses it.
+        """
+        found = {}
+        for node, chain in walk(tree):
+            package = node['module'].split('.')[0]
+            if package not in heavy or package in found:
+                continue
+            importer = next((name for name in reversed(chain[:-1]) if is_project_module(name)), None)
+            found[package] = {
+                'package': package,
+                'cumulative_us': node['cumulative_us'],
+                'imported_by': importer,
+                'chain': list(chain),
+            }
+        return sorted(found.values(), key=lambda item: item['cumulative_us'], reverse=True)
+
+    def print_summary(self, report, output):
+        phases = report['phases']
+        self.stdout.write(
+            f"settings {phases['settings_s']:.2f}s, app registry {phases['app_registry_s']:.2f}s, "
+            f"URL resolver {phases['url_resolver_s']:.2f}s, {report['module_count']} modules imported"
+        )
+        self.stdout.write(f"{'self ms':>9} {'cum ms':>9}  module")
+        for module in report['slowest_modules'][:10]:
+            self.stdout.write(f"{module['self_us'] / 1000:>9.1f} {module['cumulative_us'] / 1000:>9.1f}  {module['module']}")
+        for item in report['heavy_imports']:
+            self.stdout.write(self.style.WARNING(
+                f"{item['package']} ({item['cumulative_us'] / 1000:.0f} ms) imported by {item['imported_by'] or 'a dependency'}"
+            ))
+        self.stdout.write(self.style.SUCCESS(f'Report written to {output}'))
@@ -51,4 +51,32 @@ class ImpactMetric(models.Model):
     class Meta:
         verbose_name = _('impact metric')
         verbose_name_plural = _('impact metrics')
-        ordering = ['-date']
\ No newline at end of file
+        ordering = ['-date']
+
+class ImpactRollup(models.Model):
+    """Totales diarios de ImpactMetric por usuario y categoría, mantenidos al escribir las métricas"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='impact_rollups',
+        verbose_name=_('user')
+    )
+    waste_category = models.ForeignKey(
+        WasteCategory,
+        on_delete=models.CASCADE,
+        related_name='impact_rollups',
+        verbose_name=_('waste category')
+    )
+    date = models.DateField(_('date'))
+    entries = models.PositiveIntegerField(_('entries'), default=0)
+    quantity = models.PositiveIntegerField(_('quantity'), default=0)
+    co2_saved = models.DecimalField(_('CO2 saved (kg)'), max_digits=12, decimal_places=2, default=0)
+    water_saved = models.DecimalField(_('water saved (L)'), max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('impact rollup')
+        verbose_name_plural = _('impact rollups')
+        # La restricción única también sirve de índice (user, date) para leer los últimos días
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'waste_category'], name='impactrollup_bucket_unique'),
+        ]
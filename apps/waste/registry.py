@@ -0,0 +1,97 @@
+"""
+Lazy, fork-aware registry for the ML models used by the app.
+
+Nothing heavy (torch, ultralytics, weights) is imported until a model is
+first requested, so management commands, tests and web processes that never
+run inference do not pay for it. Servers that do run inference can either:
+
+* call ``preload()`` in the master process before forking (gunicorn with
+  ``preload_app``), so workers share the weights copy-on-write, and then
+  ``post_fork()`` in each worker; or
+* call ``warm_up()`` once per worker (uvicorn, runserver) by setting
+  ``WASTE_DETECTION_WARMUP = True``.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._warmups = {}
+        self._models = {}
+        self._lock = threading.Lock()
+        self._warm_pid = None
+
+    def register(self, name, loader, warmup=None):
+        """Register ``loader()`` to build model ``name`` and an optional ``warmup(model)``."""
+        self._loaders[name] = loader
+        if warmup is not None:
+            self._warmups[name] = warmup
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    start = time.perf_counter()
+                    model = self._loaders[name]()
+                    self._models[name] = model
+                    logger.info('Loaded model %s in %.2fs', name, time.perf_counter() - start)
+        return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def preload(self, names=None):
+        """
+        Load weights in the current (master) process without running them.
+
+        Afterwards ``gc.freeze()`` moves every live object to the permanent
+        generation so the collector in the forked workers never writes to
+        their headers, keeping the shared pages clean. Inference is left for
+        ``post_fork`` because torch thread pools do not survive a fork.
+        """
+        for name in names or list(self._loaders):
+            self.get(name)
+        gc.freeze()
+
+    def post_fork(self, names=None):
+        """Per-worker initialisation after a fork: thread settings and warm-up."""
+        self._warm_pid = None
+        self.warm_up(names)
+
+    def warm_up(self, names=None):
+        """Load the models if needed and run one dummy inference, once per process."""
+        if self._warm_pid == os.getpid():
+            return
+        configure_torch_threads()
+        for name in names or list(self._loaders):
+            model = self.get(name)
+            warmup = self._warmups.get(name)
+            if warmup is not None:
+                start = time.perf_counter()
+                warmup(model)
+                logger.info('Warmed up model %s in %.2fs', name, time.perf_counter() - start)
+        self._warm_pid = os.getpid()
+
+
+def configure_torch_threads():
+    """Cap torch intra-op threads so forked workers do not oversubscribe the CPU."""
+    threads = getattr(settings, 'WASTE_DETECTION_TORCH_THREADS', None)
+    if not threads:
+        return
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,114 @@
+"""
+Daily per-user, per-category rollups of ``ImpactMetric``.
+
+Every write to ``ImpactMetric`` applies its delta to the matching
+``ImpactRollup`` bucket with ``F()`` expressions, so concurrent writers never
+lose updates. Buckets whose last entry is removed are deleted, which keeps
+the distinct category count correct. ``rebuild`` and ``diff`` recompute the
+buckets from the raw table for backfills and consistency checks.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from apps.waste.models import ImpactMetric, ImpactRollup
+
+STATS_DAYS = 30
+BUCKET_FIELDS = ('user_id', 'waste_category_id', 'date')
+TOTAL_FIELDS = ('entries', 'quantity', 'co2_saved', 'water_saved')
+
+
+def metric_totals(metric, sign=1):
+    return {
+        'entries': sign,
+        'quantity': sign * metric.quantity,
+        'co2_saved': sign * Decimal(metric.co2_saved),
+        'water_saved': sign * Decimal(metric.water_saved),
+    }
+
+
+def apply_delta(user_id, waste_category_id, date, totals):
+    """Add ``totals`` to one bucket, creating it on first use and dropping it when empty."""
+    bucket = ImpactRollup.objects.filter(user_id=user_id, waste_category_id=waste_category_id, date=date)
+    increments = {field: F(field) + value for field, value in totals.items()}
+    with transaction.atomic():
+        if not bucket.update(**increments):
+            if totals['entries'] <= 0:
+                return
+            try:
+                with transaction.atomic():
+                    ImpactRollup.objects.create(
+                        user_id=user_id, waste_category_id=waste_category_id, date=date, **totals
+                    )
+            except IntegrityError:
+                # Otro proceso creó el bucket entre el update y el insert
+                bucket.update(**increments)
+        if totals['entries'] < 0:
+            bucket.filter(entries__lte=0).delete()
+
+
+def user_stats(user, days=STATS_DAYS):
+    """
+    Impact totals for the last ``days`` days, or for all time with
+    ``days=None``, from a single aggregate over the user's buckets.
+    """
+    rollups = ImpactRollup.objects.filter(user=user)
+    if days is not None:
+        rollups = rollups.filter(date__gte=timezone.now().date() - timedelta(days=days))
+    totals = rollups.aggregate(
+        total_items=Sum('quantity'),
+        co2_saved=Sum('co2_saved'),
+        water_saved=Sum('water_saved'),
+        categories_recycled=Count('waste_category', distinct=True),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def raw_buckets(metrics=None):
+    """Bucket totals computed from ``ImpactMetric``, keyed by (user_id, waste_category_id, date)."""
+    metrics = ImpactMetric.objects.all() if metrics is None else metrics
+    rows = metrics.order_by().values(*BUCKET_FIELDS).annotate(
+        entries=Count('id'),
+        quantity=Sum('quantity'),
+        co2_saved=Sum('co2_saved'),
+        water_saved=Sum('water_saved'),
+    )
+    return {tuple(row[field] for field in BUCKET_FIELDS): row for row in rows}
+
+
+def stored_buckets(rollups=None):
+    rollups = ImpactRollup.objects.all() if rollups is None else rollups
+    rows = rollups.values(*BUCKET_FIELDS, *TOTAL_FIELDS)
+    return {tuple(row[field] for field in BUCKET_FIELDS): row for row in rows}
+
+
+def diff(metrics=None, rollups=None):
+    """
+    Buckets where the rollup disagrees with the raw table, as
+    ``(key, expected, stored)`` with ``None`` for a missing side.
+    """
+    expected = raw_buckets(metrics)
+    stored = stored_buckets(rollups)
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key)
+        have = stored.get(key)
+        if want is None or have is None or any(want[field] != have[field] for field in TOTAL_FIELDS):
+            mismatches.append((key, want, have))
+    return mismatches
+
+
+def rebuild(metrics=None, rollups=None, batch_size=1000):
+    """Replace the rollups covered by ``rollups`` with totals recomputed from ``metrics``."""
+    rollups = ImpactRollup.objects.all() if rollups is None else rollups
+    buckets = raw_buckets(metrics)
+    with transaction.atomic():
+        rollups.delete()
+        ImpactRollup.objects.bulk_create(
+            [ImpactRollup(**{field: row[field] for field in BUCKET_FIELDS + TOTAL_FIELDS}) for row in buckets.values()],
+            batch_size=batch_size,
+        )
+    return len(buckets)
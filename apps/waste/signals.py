@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.waste.models import ImpactMetric
+from apps.waste.rollups import apply_delta, metric_totals
+
+
+@receiver(pre_save, sender=ImpactMetric)
+def remember_previous_metric(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_metric = ImpactMetric.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ImpactMetric)
+def add_metric_to_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.pop('_previous_metric', None)
+    if previous is not None:
+        apply_delta(previous.user_id, previous.waste_category_id, previous.date, metric_totals(previous, -1))
+    apply_delta(instance.user_id, instance.waste_category_id, instance.date, metric_totals(instance))
+
+
+@receiver(post_delete, sender=ImpactMetric)
+def remove_metric_from_rollup(sender, instance, **kwargs):
+    apply_delta(instance.user_id, instance.waste_category_id, instance.date, metric_totals(instance, -1))
@@ -1,3 +1,251 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.security.models import User
+from apps.waste.inference import MicroBatcher, Prediction
+from apps.waste.management.commands.profile_startup import Command as ProfileStartupCommand, parse_importtime, walk
+from apps.waste.models import ImpactMetric, ImpactRollup, WasteCategory
+from apps.waste.registry import ModelRegistry
+from apps.waste.rollups import diff, user_stats
+from apps.waste_history.models import WasteDetection
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_requests_share_batches(self):
+        release = threading.Event()
+        batches = []
+
+        def predict_batch(images):
+            # El primer lote espera a que el resto de peticiones estén en cola
+            release.wait(5)
+            batches.append(list(images))
+            return [image * 10 for image in images]
+
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_latency=0.05)
+        futures = [batcher.submit(number) for number in range(10)]
+        release.set()
+        self.assertEqual([future.result(timeout=5) for future in futures], [number * 10 for number in range(10)])
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertLess(len(batches), 10)
+        self.assertEqual(sorted(image for batch in batches for image in batch), list(range(10)))
+
+    def test_failures_reach_every_request_of_the_batch(self):
+        def predict_batch(images):
+            raise RuntimeError('modelo no disponible')
+
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_latency=0.01)
+        futures = [batcher.submit(number) for number in range(3)]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, 'modelo no disponible'):
+                future.result(timeout=5)
+        # El worker sigue atendiendo después de un lote fallido
+        batcher.predict_batch = lambda images: images
+        self.assertEqual(batcher.predict('ok', timeout=5), 'ok')
+
+
+def photo(color=(20, 120, 40)):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, format='JPEG')
+    return SimpleUploadedFile('foto.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, WASTE_DETECTION_SKIP_DUPLICATES=False)
+class CaptureViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.client.force_login(self.user)
+
+    def capture(self, predictions, **data):
+        with mock.patch('apps.waste.views.capture.batcher.predict', return_value=predictions) as predict:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('waste:capture'), dict({'image': photo()}, **data))
+        return response, predict
+
+    def test_predictions_are_stored_as_detections(self):
+        predictions = [
+            Prediction('cardboard', 0.91, 10, 10, 5, 5),
+            Prediction('plastic', 0.62, 30, 20, 8, 8),
+        ]
+        response, predict = self.capture(predictions, latitude='-0.18', longitude='-78.48')
+        self.assertEqual(response.status_code, 200)
+        predict.assert_called_once()
+        body = response.json()
+        self.assertEqual([row['category'] for row in body['predictions']], ['Paper', 'Plastic'])
+        self.assertEqual(body['image'], {'width': 64, 'height': 48})
+        detections = WasteDetection.objects.filter(user=self.user).order_by('confidence_score')
+        self.assertEqual([detection.category.name for detection in detections], ['Plastic', 'Paper'])
+        self.assertEqual(len({detection.image.name for detection in detections}), 1)
+
+    def test_nothing_detected_stores_nothing(self):
+        response, _ = self.capture([])
+        self.assertEqual(response.json()['predictions'], [])
+        self.assertFalse(WasteDetection.objects.exists())
+
+    def test_model_failure_is_reported(self):
+        with mock.patch('apps.waste.views.capture.batcher.predict', side_effect=TimeoutError('lento')):
+            response = self.client.post(reverse('waste:capture'), {'image': photo()})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(WasteDetection.objects.exists())
+
+    def test_invalid_uploads(self):
+        self.assertEqual(self.client.post(reverse('waste:capture')).status_code, 400)
+        response = self.client.post(reverse('waste:capture'), {'image': SimpleUploadedFile('x.jpg', b'no es imagen')})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('waste:capture'), {'image': photo(), 'latitude': 'x', 'longitude': '1'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = ModelRegistry()
+        self.loads = []
+        self.warmups = []
+        self.registry.register('modelo', lambda: self.loads.append(object()) or self.loads[-1], self.warmups.append)
+
+    def test_models_load_once_on_first_use(self):
+        self.assertFalse(self.registry.is_loaded('modelo'))
+        threads = [threading.Thread(target=self.registry.get, args=('modelo',)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.loads), 1)
+        self.assertIs(self.registry.get('modelo'), self.loads[0])
+
+    def test_warm_up_runs_once_per_process(self):
+        self.registry.warm_up()
+        self.registry.warm_up()
+        self.assertEqual(self.warmups, self.loads)
+        # Tras un fork el worker vuelve a calentar el modelo ya cargado
+        self.registry.post_fork()
+        self.assertEqual(len(self.warmups), 2)
+        self.assertEqual(len(self.loads), 1)
+
+    def test_preload_does_not_run_inference(self):
+        with mock.patch('apps.waste.registry.gc.freeze') as freeze:
+            self.registry.preload()
+        freeze.assert_called_once()
+        self.assertEqual((len(self.loads), self.warmups), (1, []))
+
+
+class BenchmarkStartupCommandTests(SimpleTestCase):
+    def test_lazy_start_imports_no_model_code(self):
+        out = StringIO()
+        call_command('benchmark_startup', stages=['lazy'], repeat=1, json=True, stdout=out)
+        [run] = json.loads(out.getvalue())
+        self.assertEqual(run['stage'], 'lazy')
+        self.assertEqual(run['heavy_modules'], [])
+        self.assertGreater(run['total_s'], 0)
+
+
+IMPORTTIME_SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     torch._C
+import time:       400 |        520 |   torch
+import time:        30 |        550 | apps.waste.detector
+import time:        80 |         80 | json
+""".splitlines()
+
+
+class ProfileStartupCommandTests(SimpleTestCase):
+    def test_import_tree_is_rebuilt_from_importtime(self):
+        tree = parse_importtime(IMPORTTIME_SAMPLE)
+        self.assertEqual([node['module'] for node in tree], ['apps.waste.detector', 'json'])
+        self.assertEqual([chain for _, chain in walk(tree)][:3], [
+            ('apps.waste.detector',), ('apps.waste.detector', 'torch'), ('apps.waste.detector', 'torch', 'torch._C'),
+        ])
+
+    def test_heavy_imports_name_the_project_module(self):
+        [hit] = ProfileStartupCommand.heavy_imports(parse_importtime(IMPORTTIME_SAMPLE), {'torch'})
+        self.assertEqual((hit['package'], hit['imported_by'], hit['cumulative_us']), ('torch', 'apps.waste.detector', 520))
+        self.assertEqual([item['module'] for item in ProfileStartupCommand.slowest(parse_importtime(IMPORTTIME_SAMPLE), 2)],
+                         ['torch', 'torch._C'])
+
+    def test_report_of_a_real_startup(self):
+        out = StringIO()
+        call_command('profile_startup', output='-', top=5, fail_on_heavy=True, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['phases']), {'settings_s', 'app_registry_s', 'url_resolver_s'})
+        self.assertEqual(len(report['slowest_modules']), 5)
+        self.assertEqual(report['heavy_imports'], [])
+
+    def test_heavy_packages_can_fail_the_run(self):
+        with self.assertRaisesMessage(CommandError, 'django'):
+            call_command('profile_startup', output='-', heavy=['django'], fail_on_heavy=True, stdout=StringIO())
+
+
+class ImpactRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ana', password='secret', email='ana@example.com')
+        self.glass = WasteCategory.objects.create(name='Vidrio', description='-', recycling_instructions='-')
+        self.paper = WasteCategory.objects.create(name='Papel', description='-', recycling_instructions='-')
+
+    def add(self, category, quantity, co2='1.50', water='10.00', user=None):
+        return ImpactMetric.objects.create(
+            user=user or self.user, waste_category=category, quantity=quantity, co2_saved=co2, water_saved=water
+        )
+
+    def test_rollups_follow_creates_updates_and_deletes(self):
+        first = self.add(self.glass, 3)
+        self.add(self.glass, 2, co2='0.25')
+        paper = self.add(self.paper, 4)
+        self.add(self.paper, 7, user=User.objects.create_user(username='luis', password='secret', email='luis@example.com'))
+        self.assertEqual(diff(), [])
+        self.assertEqual(ImpactRollup.objects.get(user=self.user, waste_category=self.glass).entries, 2)
+
+        first.waste_category = self.paper
+        first.save()
+        self.assertEqual(diff(), [])
+        paper.delete()
+        self.assertEqual(diff(), [])
+        self.assertEqual(ImpactRollup.objects.filter(user=self.user).count(), 2)
+
+    def test_stats_come_from_one_query(self):
+        self.add(self.glass, 3, co2='1.50', water='10.00')
+        self.add(self.glass, 2, co2='0.25', water='5.50')
+        self.add(self.paper, 4, co2='2.00', water='1.00')
+        with self.assertNumQueries(1):
+            stats = user_stats(self.user)
+        self.assertEqual(stats, {
+            'total_items': 9, 'co2_saved': Decimal('3.75'), 'water_saved': Decimal('16.50'), 'categories_recycled': 2,
+        })
+
+    def test_stats_window_and_empty_user(self):
+        self.assertEqual(user_stats(self.user), {'total_items': 0, 'co2_saved': 0, 'water_saved': 0, 'categories_recycled': 0})
+        self.add(self.glass, 3)
+        old = self.add(self.paper, 5)
+        # Mover la métrica fuera de la ventana sin pasar por las señales deja el acumulado desfasado
+        ImpactMetric.objects.filter(pk=old.pk).update(date=timezone.now().date() - timedelta(days=40))
+        self.assertEqual(len(diff()), 2)
+        call_command('check_impact_rollups', fix=True, stdout=StringIO())
+        self.assertEqual(diff(), [])
+        self.assertEqual(user_stats(self.user)['total_items'], 3)
+        self.assertEqual(user_stats(self.user, days=None)['total_items'], 8)
+
+    def test_check_command_reports_mismatches(self):
+        self.add(self.glass, 3)
+        ImpactRollup.objects.update(quantity=99)
+        with self.assertRaisesMessage(CommandError, '1 rollup buckets differ'):
+            call_command('check_impact_rollups', stdout=StringIO())
+        call_command('backfill_impact_rollups', stdout=StringIO())
+        self.assertEqual(diff(), [])
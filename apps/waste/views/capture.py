@@ -2,28 +2,169 @@ from django.views import View
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.contrib.auth.mixins import LoginRequiredMixin
-import numpy as np
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from roboflow import Roboflow
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from PIL import Image
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+from dataclasses import asdict
 import logging
-import base64
+
+from apps.gamification.points import award_detections
+from apps.utils.geo import geohash_encode, geohash_range
+from apps.utils.imagehash import CellHashIndex, phash, to_signed
+from apps.waste.inference import Prediction, batcher
+from apps.waste.models import WasteCategory
+from apps.waste_history.models import WasteDetection
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Roboflow configuration
-rf = Roboflow(api_key="0r4klCQmalPo9Xw2xkj6")
-project = rf.workspace().project("recyclableitems")
-model = project.version(2).model
+
+def _load_detection_cell(cell):
+    start, end = geohash_range(cell)
+    return WasteDetection.objects.filter(
+        geohash__gte=start, geohash__lt=end, image_hash__isnull=False
+    ).values_list('image', 'image_hash', 'location_latitude', 'location_longitude').distinct()
+
+
+# Indexed by image name: every detection row of one upload shares it
+detection_hash_index = CellHashIndex('waste:detection_hashes', _load_detection_cell)
+
+
+def predictions_cache_key(image_name):
+    return f'waste:predictions:{image_name}'
 
 @method_decorator(csrf_exempt, name='dispatch')
 class WasteDetectionView(LoginRequiredMixin, View):
     template_name = 'capture.html'
-    
+
     def get(self, request):
         """Render the waste detection page."""
-        return render(request, self.template_name)
\ No newline at end of file
+        return render(request, self.template_name)
+
+    def post(self, request):
+        """Run the local detector on an uploaded image and store every detection."""
+        upload = request.FILES.get('image')
+        if not upload:
+            return JsonResponse({'error': 'La imagen es requerida'}, status=400)
+
+        try:
+            latitude, longitude = self.get_location(request)
+        except ValueError:
+            return JsonResponse({'error': 'Ubicación inválida'}, status=400)
+
+        try:
+            image = Image.open(upload)
+            image.load()
+            image = image.convert('RGB')
+        except (UnidentifiedImageError, OSError):
+            return JsonResponse({'error': 'El archivo no es una imagen válida'}, status=400)
+
+        image_hash = to_signed(phash(image))
+        predictions = None
+        if latitude is not None and settings.WASTE_DETECTION_SKIP_DUPLICATES:
+            predictions = self.reuse_predictions(latitude, longitude, image_hash, image.size)
+        reused = predictions is not None
+
+        if not reused:
+            try:
+                predictions = batcher.predict(image, timeout=settings.WASTE_DETECTION_TIMEOUT)
+            except Exception as e:
+                logger.exception('Waste detection failed')
+                return JsonResponse({'error': 'No se pudo analizar la imagen', 'details': str(e)}, status=503)
+
+        detections = []
+        if predictions:
+            upload.seek(0)
+            image_name = default_storage.save(
+                WasteDetection._meta.get_field('image').generate_filename(None, upload.name), upload
+            )
+            categories = self.get_categories({prediction.label for prediction in predictions})
+            geohash = geohash_encode(float(latitude), float(longitude)) if latitude is not None else ''
+            with transaction.atomic():
+                detections = WasteDetection.objects.bulk_create([
+                    WasteDetection(
+                        user=request.user,
+                        category=categories[prediction.label],
+                        image=image_name,
+                        confidence_score=prediction.confidence,
+                        location_latitude=latitude,
+                        location_longitude=longitude,
+                        image_hash=image_hash,
+                        geohash=geohash,
+                    )
+                    for prediction in predictions
+                ])
+                # Every detection of the photo shares the same stored file
+                if hasattr(default_storage, 'retain'):
+                    default_storage.retain(image_name, len(detections) - 1)
+                award_detections(WasteDetection.objects.filter(pk__in=[detection.pk for detection in detections]))
+            if latitude is not None:
+                cache.set(
+                    predictions_cache_key(image_name),
+                    {'size': image.size, 'predictions': [asdict(prediction) for prediction in predictions]},
+                    settings.WASTE_DETECTION_REUSE_TTL,
+                )
+                detection_hash_index.invalidate(float(latitude), float(longitude))
+
+        return JsonResponse({
+            'predictions': [
+                dict(prediction.as_dict(), detection_id=str(detection.id), category=detection.category.name)
+                for prediction, detection in zip(predictions, detections)
+            ],
+            'image': {'width': image.width, 'height': image.height},
+            'reused': reused,
+        })
+
+    @staticmethod
+    def reuse_predictions(latitude, longitude, image_hash, size):
+        """
+        Predictions of an earlier, nearly identical photo taken at the same
+        spot, with boxes rescaled to this image, or None to run the model.
+        """
+        matches = detection_hash_index.near_duplicates(
+            float(latitude), float(longitude), image_hash,
+            max_distance=settings.IMAGE_DEDUP_MAX_DISTANCE,
+            radius_km=settings.IMAGE_DEDUP_RADIUS_M / 1000,
+        )
+        for image_name, _, _ in matches:
+            previous = cache.get(predictions_cache_key(image_name))
+            if previous is None:
+                continue
+            scale_x = size[0] / previous['size'][0]
+            scale_y = size[1] / previous['size'][1]
+            return [
+                Prediction(
+                    label=stored['label'],
+                    confidence=stored['confidence'],
+                    x=stored['x'] * scale_x,
+                    y=stored['y'] * scale_y,
+                    width=stored['width'] * scale_x,
+                    height=stored['height'] * scale_y,
+                )
+                for stored in previous['predictions']
+            ]
+        return None
+
+    @staticmethod
+    def get_location(request):
+        latitude = request.POST.get('latitude')
+        longitude = request.POST.get('longitude')
+        if not latitude or not longitude:
+            return None, None
+        return round(float(latitude), 6), round(float(longitude), 6)
+
+    @staticmethod
+    def get_categories(labels):
+        """Map model labels to WasteCategory rows, creating missing ones."""
+        label_map = getattr(settings, 'WASTE_DETECTION_LABELS', {})
+        categories = {}
+        for label in labels:
+            name = label_map.get(label, label.replace('_', ' ').title())
+            categories[label], _ = WasteCategory.objects.get_or_create(
+                name=name, defaults={'description': name, 'recycling_instructions': ''}
+            )
+        return categories
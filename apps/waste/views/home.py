@@ -1,9 +1,7 @@
 from django.views.generic import TemplateView
-from django.db.models import Sum
-from django.utils import timezone
 from django.contrib.auth.mixins import LoginRequiredMixin
-from datetime import timedelta
-from apps.waste.models import WasteCategory, ImpactMetric
+from apps.waste.models import WasteCategory
+from apps.waste.rollups import user_stats
 from apps.recycling_points.models import RecyclingPoint
 from django.http import HttpResponseRedirect
 from django.urls import reverse
@@ -30,18 +28,7 @@ class HomeView(TemplateView, LoginRequiredMixin):
         
         # Solo si el usuario está logueado, obtén las métricas de impacto
         if self.request.user.is_authenticated:
-            # Get user's impact metrics for the last 30 days
-            thirty_days_ago = timezone.now().date() - timedelta(days=30)
-            user_metrics = ImpactMetric.objects.filter(
-                user=self.request.user,
-                date__gte=thirty_days_ago
-            )
-            
-            context['user_stats'] = {
-                'total_items': user_metrics.aggregate(total=Sum('quantity'))['total'] or 0,
-                'co2_saved': user_metrics.aggregate(total=Sum('co2_saved'))['total'] or 0,
-                'water_saved': user_metrics.aggregate(total=Sum('water_saved'))['total'] or 0,
-                'categories_recycled': user_metrics.values('waste_category').distinct().count()
-            }
+            # Totales de los últimos 30 días desde los acumulados diarios (una sola consulta)
+            context['user_stats'] = user_stats(self.request.user)
         
         return context
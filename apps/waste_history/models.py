@@ -42,9 +42,17 @@ class WasteDetection(models.Model):
         null=True,
         blank=True
     )
+    # Hash perceptual de la imagen y celda geohash, para reconocer fotos repetidas
+    image_hash = models.BigIntegerField(_('image hash'), null=True, blank=True, editable=False)
+    geohash = models.CharField(_('geohash'), max_length=12, db_index=True, blank=True, editable=False)
+    points_awarded = models.BooleanField(_('points awarded'), default=False, editable=False)
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     
     class Meta:
         verbose_name = _('waste detection')
         verbose_name_plural = _('waste detections')
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Detecciones pendientes de premiar, en orden de llegada
+            models.Index(fields=['points_awarded', 'created_at'], name='wastedetection_awarded_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,31 @@
+# Gunicorn configuration: load the detection model once in the master and
+# share it copy-on-write with the forked workers.
+# Usage: gunicorn waste_detection.wsgi
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'waste_detection.settings')
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def when_ready(server):
+    if os.environ.get('WASTE_DETECTION_PRELOAD', '1') == '1':
+        from apps.waste.inference import registry
+
+        registry.preload()
+
+
+def post_fork(server, worker):
+    if os.environ.get('WASTE_DETECTION_PRELOAD', '1') == '1':
+        from apps.waste.inference import registry
+
+        registry.post_fork()
+
+
+def worker_exit(server, worker):
+    # Write buffered login telemetry before the worker goes away
+    from apps.security.telemetry import login_telemetry
+
+    login_telemetry.close()
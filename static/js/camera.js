@@ -1,5 +1,4 @@
-const ROBOFLOW_API_KEY = "0r4klCQmalPo9Xw2xkj6";
-const ROBOFLOW_MODEL_ENDPOINT = "https://detect.roboflow.com/recyclableitems/2";
+const DETECTION_ENDPOINT = window.location.pathname;
 
 let currentStream = null;
 let camera = document.getElementById('camera');
@@ -76,7 +75,7 @@ const dropZone = document.getElementById('dropZone');
 const fileInput = document.getElementById('fileInput');
 
 // Function to process image through Roboflow API
-async function processImageWithRoboflow(imageFile) {
+async function processImageOnServer(imageFile) {
     try {
         // Show loading state
         Swal.fire({
@@ -88,21 +87,13 @@ async function processImageWithRoboflow(imageFile) {
             }
         });
 
-        // Convert image file to base64
-        const base64Image = await convertToBase64(imageFile);
-        const base64Data = base64Image.split(',')[1];
-
-        // Make API request to Roboflow
+        // Send the image to the server-side detector
+        const formData = new FormData();
+        formData.append('image', imageFile, imageFile.name || 'capture.jpg');
         const response = await axios({
             method: "POST",
-            url: ROBOFLOW_MODEL_ENDPOINT,
-            params: {
-                api_key: ROBOFLOW_API_KEY
-            },
-            data: base64Data,
-            headers: {
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
+            url: DETECTION_ENDPOINT,
+            data: formData
         });
 
         // Close loading dialog
@@ -125,16 +116,6 @@ async function processImageWithRoboflow(imageFile) {
     }
 }
 
-// Helper function to convert file to base64
-function convertToBase64(file) {
-    return new Promise((resolve, reject) => {
-        const reader = new FileReader();
-        reader.readAsDataURL(file);
-        reader.onload = () => resolve(reader.result);
-        reader.onerror = error => reject(error);
-    });
-}
-
 // Format detections to match our application's structure
 function formatDetections(predictions) {
     return predictions.map(prediction => ({
@@ -238,7 +219,7 @@ async function processFrame() {
     ctx.drawImage(camera, 0, 0);
     
     canvas.toBlob(async (blob) => {
-        await processImageWithRoboflow(blob);
+        await processImageOnServer(blob);
     }, 'image/jpeg', 0.8); // Added quality parameter for better performance
 }
 
@@ -303,14 +284,14 @@ dropZone.addEventListener('drop', async (e) => {
     dropZone.classList.remove('border-blue-500');
     const file = e.dataTransfer.files[0];
     if (file && file.type.startsWith('image/')) {
-        await processImageWithRoboflow(file);
+        await processImageOnServer(file);
     }
 });
 
 fileInput.addEventListener('change', async (e) => {
     const file = e.target.files[0];
     if (file) {
-        await processImageWithRoboflow(file);
+        await processImageOnServer(file);
         e.target.value = ''; // Reset file input
     }
 });
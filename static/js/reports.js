@@ -292,7 +292,7 @@ class TrashReportForm {
                             <p class="text-sm text-gray-600">Ubicación: ${report.location}</p>
                             <p class="text-sm text-gray-600">Severidad: ${report.severity}</p>
                             <p class="text-sm text-gray-600">Estado: ${report.status}</p>
-                            <img src="${report.image_url}" alt="Evidencia" class="max-h-32 mx-auto mt-2">
+                            <img src="${report.thumbnail_url || report.image_url}" alt="Evidencia" class="max-h-32 mx-auto mt-2">
                         </div>
                     `;
                 }).join('');
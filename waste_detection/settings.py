@@ -51,6 +51,8 @@ INSTALLED_APPS = [
     'apps.waste_history',
     'apps.recycling_points',
     'apps.gamification',
+    'apps.media',
+    'apps.tiles',
     
 ]
 
@@ -122,6 +124,19 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Los archivos subidos se guardan una sola vez por contenido (cas/<sha256>) sobre el backend real
+STORAGES = {
+    'default': {
+        'BACKEND': 'apps.media.storage.ContentAddressedStorage',
+        'OPTIONS': {
+            'backend': os.environ.get('MEDIA_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+        },
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -146,12 +161,89 @@ SIMPLE_JWT = {
 # Google Maps API settings
 GOOGLE_MAPS_API_KEY = 'your-google-maps-api-key'
 
-# Cache settings
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': 'redis://127.0.0.1:6379/1',
+# Cache settings: Redis cuando el cliente está instalado; si no, memoria del proceso
+try:
+    import redis  # noqa: F401
+except ImportError:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+        }
     }
+
+# Procesamiento de imágenes de reportes (miniaturas WebP, limpieza de EXIF)
+IMAGE_PIPELINE_ASYNC = True
+IMAGE_PIPELINE_WORKERS = 2
+# Fotos casi idénticas (hash perceptual) a menos de este radio se consideran el mismo punto
+IMAGE_DEDUP_RADIUS_M = 50
+IMAGE_DEDUP_MAX_DISTANCE = 8  # bits distintos de 64
+
+# Tablas de clasificación: 'auto' usa Redis si es la caché por defecto, si no memoria del proceso
+LEADERBOARD_BACKEND = 'auto'
+# Puntos por evento; el nivel sube cada 100 puntos. Los reportes recurrentes (marcados por el
+# usuario o con una foto casi idéntica a otra cercana) reciben recurring_report
+GAMIFICATION_POINTS = {'detection': 10, 'report': 20, 'recurring_report': 5}
+
+# Índice de agrupamiento de reportes (/gamification/reports/clusters/), estilo supercluster
+REPORT_CLUSTERS_MAX_ZOOM = 16  # por encima se devuelven los reportes sueltos
+REPORT_CLUSTERS_RADIUS = 40  # píxeles, sobre teselas de REPORT_CLUSTERS_EXTENT
+REPORT_CLUSTERS_EXTENT = 512
+REPORT_CLUSTERS_STATUSES = ('pending', 'in_review', 'verified')
+REPORT_CLUSTERS_REBUILD_AFTER = 1000  # cambios incrementales antes de reconstruir
+REPORT_CLUSTERS_REBUILD_INTERVAL = 60 * 60
+
+# Mapa de calor de reportes (/gamification/reports/heatmap/ y /hotspots/). Cambiar el
+# tamaño de celda o los pesos exige ejecutar backfill_report_heatmap
+HEATMAP_CELL_DEGREES = 0.002  # unos 220 m de latitud
+HEATMAP_RECURRING_WEIGHT = 2  # multiplica la severidad de los reportes recurrentes
+HEATMAP_EXCLUDED_STATUSES = ('rejected',)
+HEATMAP_MAX_RASTER_CELLS = 256 * 256  # por encima el raster agrupa bloques de celdas
+HEATMAP_HOTSPOTS_MAX = 100
+
+# Sincronización de reportes (/gamification/reports/changes/): cada sincronización vuelve a leer
+# este margen para recoger las escrituras que confirman después de otras más recientes
+REPORT_CHANGES_OVERLAP_SECONDS = 30
+
+# Teselas de mapa (/tiles/<capa>/<z>/<x>/<y>): por debajo de TILES_CLUSTER_MAX_ZOOM los puntos
+# se agrupan en una cuadrícula de TILES_CLUSTER_GRID x TILES_CLUSTER_GRID celdas por tesela
+TILES_MAX_ZOOM = 20
+TILES_CLUSTER_MAX_ZOOM = 15
+TILES_CLUSTER_GRID = 8
+TILES_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Telemetría de inicio de sesión (contador, última IP y fecha): se acumula en memoria y se
+# escribe en un solo UPDATE cada intervalo; desactivar para escribir en cada login
+LOGIN_TELEMETRY_BUFFERED = True
+LOGIN_TELEMETRY_FLUSH_INTERVAL = 5  # segundos
+LOGIN_TELEMETRY_MAX_PENDING = 500  # usuarios pendientes que fuerzan una escritura anticipada
+
+# Detección de residuos en el servidor (modelo YOLO local)
+WASTE_DETECTION_MODEL = BASE_DIR / 'ml_models' / 'waste_yolo.pt'
+WASTE_DETECTION_CONFIDENCE = 0.25
+WASTE_DETECTION_IMAGE_SIZE = 640
+WASTE_DETECTION_MAX_BATCH = 8
+WASTE_DETECTION_MAX_LATENCY = 0.01  # segundos que espera un lote para llenarse
+WASTE_DETECTION_TIMEOUT = 30
+# Cargar y calentar el modelo al iniciar cada proceso (uvicorn); con gunicorn usar gunicorn.conf.py
+WASTE_DETECTION_WARMUP = os.environ.get('WASTE_DETECTION_WARMUP') == '1'
+WASTE_DETECTION_TORCH_THREADS = int(os.environ.get('WASTE_DETECTION_TORCH_THREADS', 0)) or None
+# Reutilizar el resultado de una foto casi idéntica tomada en el mismo lugar en vez de volver a inferir
+WASTE_DETECTION_SKIP_DUPLICATES = True
+WASTE_DETECTION_REUSE_TTL = 60 * 60 * 24 * 7
+# Etiqueta del modelo -> nombre de WasteCategory
+WASTE_DETECTION_LABELS = {
+    'plastic': 'Plastic',
+    'glass': 'Glass',
+    'paper': 'Paper',
+    'cardboard': 'Paper',
+    'metal': 'Metal',
 }
 
 # Logging configuration
@@ -26,6 +26,7 @@ urlpatterns = [
     path('security/', include('apps.security.urls', namespace='security')),
     path('recycling_points/', include('apps.recycling_points.urls', namespace='recycling_points')),
     path('gamification/', include('apps.gamification.urls', namespace='gamification')),
+    path('tiles/', include('apps.tiles.urls', namespace='tiles')),
     path("", HomeView.as_view(), name="home")
 ]
 if settings.DEBUG: